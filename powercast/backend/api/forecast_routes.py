@@ -4,7 +4,8 @@ from . import api_bp
 from db import get_db, get_fs
 from bson import ObjectId
 from datetime import datetime
-from ml.predict import run_forecast
+from ml.predict import latest_model, run_forecast, run_forecast_regions
+from ml.train import GLOBAL_ALGO
 import io
 import pandas as pd
 
@@ -13,26 +14,60 @@ def _naive_utc(ts_like):
     t = pd.to_datetime(ts_like, utc=True)
     return t.tz_convert("UTC").tz_localize(None)
 
+def _save_forecast(db, region, start_date, ts_out, y_out, csv_id):
+    """
+    Snimi forecast dokument:
+    - start_date se bilježi kao NAIVE UTC
+    - 'values' je lista {ts, yhat}
+    Vraća id novog dokumenta.
+    """
+    start_naive = _naive_utc(start_date)
+    doc = {
+        "region": region,
+        "start_date": start_naive.to_pydatetime(),
+        "horizon_h": len(y_out),
+        "created_at": datetime.utcnow(),
+        "values": [{"ts": t, "yhat": float(v)} for t, v in zip(ts_out, y_out)],
+        "export_id": csv_id,   # CSV u GridFS (forecast_<...>.csv)
+        "is_latest": True      # obilježi kao najnoviji za taj start_date
+    }
+
+    # Prethodne prognoze za isti (region, start_date) označi kao ne-najnovije
+    db.forecasts.update_many(
+        {"region": region, "start_date": doc["start_date"]},
+        {"$set": {"is_latest": False}}
+    )
+
+    # Upis novog forecast dokumenta
+    return db.forecasts.insert_one(doc).inserted_id
+
 # POST /forecast/run
 # Pokreće prognozu za dati region od start_date, u trajanju 'days' (1..7),
 # učitava najnoviji model za region, generiše forecast i upisuje u kolekciju 'forecasts' + CSV u GridFS.
+# "regions": [...] umjesto "region" → svi regioni iz najnovijeg globalnog modela, jednim batched forward pass-om.
 @api_bp.post("/forecast/run")
 def forecast_run():
     data = request.get_json(force=True)
     region = data.get("region")
+    regions = data.get("regions")
     start_date = data.get("start_date")
     days = int(data.get("days", 1))
 
     # Validacije ulaza
-    if not region or not start_date:
+    if regions is not None and (not isinstance(regions, list) or not regions):
+        return jsonify({"ok": False, "error": "regions must be a non-empty list"}), 400
+    if not (region or regions) or not start_date:
         return jsonify({"ok": False, "error": "region and start_date required"}), 400
     if days < 1 or days > 7:
         return jsonify({"ok": False, "error": "days must be 1..7"}), 400
 
     db = get_db(); fs = get_fs()
 
+    if regions is not None:
+        return _forecast_run_global(db, fs, regions, start_date, days)
+
     # Uzmi najnoviji model za region (po created_at)
-    model_doc = db.models.find_one({"region": region}, sort=[("created_at", -1)])
+    model_doc = latest_model(db, region)
     if not model_doc:
         return jsonify({"ok": False, "error": "No model for region. Train first."}), 400
 
@@ -42,31 +77,29 @@ def forecast_run():
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
-    # Snimi forecast dokument:
-    # - start_date se bilježi kao NAIVE UTC
-    # - 'values' je lista {ts, yhat}
-    start_naive = _naive_utc(start_date)
-    doc = {
-        "region": region,
-        "start_date": start_naive.to_pydatetime(),
-        "horizon_h": len(y_out),
-        "created_at": datetime.utcnow(),
-        "values": [{"ts": t, "yhat": float(v)} for t, v in zip(ts_out, y_out)],
-        "export_id": csv_id,   # CSV u GridFS (forecast_<...>.csv)
-        "is_latest": True      # obilježi kao najnoviji za taj start_date
-    }
+    fid = _save_forecast(db, region, start_date, ts_out, y_out, csv_id)
 
-    # Prethodne prognoze za isti (region, start_date) označi kao ne-najnovije
-    db.forecasts.update_many(
-        {"region": region, "start_date": doc["start_date"]},
-        {"$set": {"is_latest": False}}
-    )
+    # Odgovor: id forecast dokumenta i id CSV fajla iz GridFS
+    return jsonify({"ok": True, "forecast_id": str(fid), "export_id": str(csv_id), "count": len(y_out)})
 
-    # Upis novog forecast dokumenta
-    ins = db.forecasts.insert_one(doc)
+def _forecast_run_global(db, fs, regions, start_date, days):
+    """Prognoza za listu regiona iz najnovijeg globalnog modela koji ih sve servira (jedan artefakt, jedan pass)."""
+    model_doc = db.models.find_one({"algo": GLOBAL_ALGO, "regions": {"$all": regions}},
+                                   sort=[("created_at", -1), ("_id", -1)])
+    if not model_doc:
+        return jsonify({"ok": False, "error": "No global model for these regions. Train with hyper.global_model first."}), 400
 
-    # Odgovor: id forecast dokumenta i id CSV fajla iz GridFS
-    return jsonify({"ok": True, "forecast_id": str(ins.inserted_id), "export_id": str(csv_id), "count": len(y_out)})
+    try:
+        out = run_forecast_regions(db, fs, model_doc, regions, start_date, days)
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    items = []
+    for region in regions:
+        ts_out, y_out, csv_id = out[region]
+        fid = _save_forecast(db, region, start_date, ts_out, y_out, csv_id)
+        items.append({"region": region, "forecast_id": str(fid), "export_id": str(csv_id), "count": len(y_out)})
+    return jsonify({"ok": True, "model_id": str(model_doc["_id"]), "items": items})
 
 # GET /forecast/<fid>
 # Vraća jedan forecast dokument po _id (string -> ObjectId), ili 404 ako ne postoji.
@@ -1,6 +1,10 @@
 from flask import jsonify
 from . import api_bp
+from schema import schema_status
+from storage.series import series_backend
+from storage.windowcache import CACHE
 
 @api_bp.get("/health")
 def health():
-    return jsonify({"status": "ok"})
+    return jsonify({"status": "ok", "schema": schema_status(), "series_backend": series_backend(),
+                    "series_cache": CACHE.stats()})
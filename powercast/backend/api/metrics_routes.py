@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from . import api_bp
 from db import get_db
+from storage.series import read_series
 from bson import ObjectId
 import pandas as pd
 import numpy as np
@@ -51,11 +52,7 @@ def mape_for_forecast():
     ts_to   = fdf['ts'].max()
 
     # učitaj actual u tom intervalu
-    cur = db.series_load_hourly.find(
-        {'region': region, 'ts': {'$gte': ts_from.to_pydatetime(), '$lte': ts_to.to_pydatetime()}},
-        {'_id': 0, 'ts': 1, 'load_mw': 1}
-    ).sort('ts', 1)
-    adf = pd.DataFrame(list(cur))
+    adf = read_series(db, "load", region, ts_from, ts_to, fields=["load_mw"])
     if adf.empty:
         return jsonify({"ok": True, "forecast_id": fid, "region": region, "points": 0, "mape": None})
 
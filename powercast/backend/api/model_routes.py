@@ -1,6 +1,7 @@
 from flask import jsonify, request, send_file
 from . import api_bp
 from db import get_db, get_fs
+from ml.predict import latest_model
 from bson import ObjectId
 import io
 
@@ -20,14 +21,14 @@ def model_list():
         # uklonjeno: d["local_path"]
     return jsonify({"ok": True, "models": docs})
 
-#najnoviji za region,
+#najnoviji za region (model regiona ili globalni model koji ga servira — isto kao /forecast/run),
 @api_bp.get("/model/latest")
 def model_latest():
     db = get_db()
     region = request.args.get("region")
     if not region:
         return jsonify({"ok": False, "error": "region required"}), 400
-    d = db.models.find_one({"region": region}, sort=[("created_at", -1)])
+    d = latest_model(db, region)
     if not d:
         return jsonify({"ok": False, "error": "no model for region"}), 404
     d["_id"] = str(d["_id"])
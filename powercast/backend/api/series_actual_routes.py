@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from . import api_bp
 from db import get_db
+from storage.windowcache import cached_read_series
 import pandas as pd
 
 def _to_naive_utc(ts_like):
@@ -19,10 +20,6 @@ def series_actual():
     dt = _to_naive_utc(date_to)
 
     db = get_db()
-    cur = db.series_load_hourly.find({
-        'region': region,
-        'ts': { '$gte': df.to_pydatetime(), '$lte': dt.to_pydatetime() }
-    }, { '_id': 0, 'ts': 1, 'load_mw': 1 }).sort('ts', 1)
-
-    items = list(cur)
+    s = cached_read_series(db, "load", region, df, dt, fields=["load_mw"])
+    items = [{"ts": t, "load_mw": v} for t, v in zip(pd.DatetimeIndex(s["ts"]).to_pydatetime(), s["load_mw"].tolist())]
     return jsonify({"ok": True, "region": region, "items": items})
@@ -1,46 +1,10 @@
 from flask import request, jsonify
 from . import api_bp
 from db import get_db
-from pymongo import ASCENDING
-
-# Cache-flagovi kako se ne bi kreirali indeksi više puta tokom istog procesa
-INDEXED = {
-    "series_load_hourly": False,
-    "series_weather_hourly": False,
-    "holidays": False,
-}
-
-def ensure_indexes(db):
-    """
-    Idempotentno kreiranje unikantnih indeksa po kolekcijama,
-    ali samo ako kolekcija postoji i indeks još nije kreiran u ovom procesu.
-    """
-    global INDEXED
-    try:
-        # LOAD kolekcija: jedinstven par (region, ts)
-        if not INDEXED["series_load_hourly"] and "series_load_hourly" in db.list_collection_names():
-            db.series_load_hourly.create_index([("region", ASCENDING), ("ts", ASCENDING)], unique=True)
-            INDEXED["series_load_hourly"] = True
-    except Exception:
-        # Ako dođe do greške (npr. indeks već postoji), pretpostavi da je sve ok
-        INDEXED["series_load_hourly"] = True
-
-    try:
-        # WEATHER kolekcija: jedinstven par (location, ts)
-        if not INDEXED["series_weather_hourly"] and "series_weather_hourly" in db.list_collection_names():
-            db.series_weather_hourly.create_index([("location", ASCENDING), ("ts", ASCENDING)], unique=True)
-            INDEXED["series_weather_hourly"] = True
-    except Exception:
-        INDEXED["series_weather_hourly"] = True
-
-    try:
-        # HOLIDAYS kolekcija: jedinstven par (Region, Date)
-        if not INDEXED["holidays"] and "holidays" in db.list_collection_names():
-            db.holidays.create_index([("Region", ASCENDING), ("Date", ASCENDING)], unique=True)
-            INDEXED["holidays"] = True
-    except Exception:
-        INDEXED["holidays"] = True
-
+import pandas as pd
+from storage.catalog import catalog_entries
+from storage.gaps import GAPS_COLL, clip_runs, forecast_starts, gaps_between
+from storage.series import collection_name
 
 @api_bp.get("/series/coverage")
 def coverage():
@@ -52,7 +16,6 @@ def coverage():
     Vraća po ključu (region/location/Region) minimalni i maksimalni datum i broj zapisa.
     """
     db = get_db()
-    ensure_indexes(db)  # osiguraj da postoje indeksi
 
     # Validacija tipa serije
     t = request.args.get("type", "").lower()
@@ -61,74 +24,35 @@ def coverage():
     if t not in ("load", "weather", "holidays"):
         return jsonify({"ok": False, "error": "param 'type' mora biti 'load', 'weather' ili 'holidays'"}), 400
 
-    # Odabir kolekcije i polja po tipu serije
+    # Odabir kolekcije (trenutni storage backend) i imena polja u izlazu
     if t == "load":
-        coll = db.series_load_hourly
-        group_key = "$region"          # grupišemo po regionu
-        out_key_name = "region"        # naziv izlaznog polja
-        time_field = "$ts"             # vremensko polje
-        count_field_name = "hours"     # naziv brojčanog polja u izlazu
-        # Opcioni $match filter po listi regiona
-        match = {"region": {"$in": [k.strip() for k in keys_param.split(",")]}} if keys_param else {}
+        coll_name, out_key_name, count_field_name = collection_name("load"), "region", "hours"
     elif t == "weather":
-        coll = db.series_weather_hourly
-        group_key = "$location"
-        out_key_name = "location"
-        time_field = "$ts"
-        count_field_name = "hours"
-        match = {"location": {"$in": [k.strip() for k in keys_param.split(",")]}} if keys_param else {}
+        coll_name, out_key_name, count_field_name = collection_name("weather"), "location", "hours"
     else:
         # holidays (dnevna serija)
-        coll = db.holidays
-        group_key = "$Region"
-        out_key_name = "region"
-        time_field = "$Date"
-        count_field_name = "days"
-        match = {"Region": {"$in": [k.strip() for k in keys_param.split(",")]}} if keys_param else {}
-
-    # Sastavi agregacioni pipeline:
-    pipeline = []
-    if match:
-        pipeline.append({"$match": match})  # filtriraj po ključevima ako su dati
-
-    pipeline += [
-        # Grupisanje po ključu uz minimalni i maksimalni datum i brojanje dokumenata
-        {"$group": {
-            "_id": group_key,
-            "from": {"$min": time_field},
-            "to": {"$max": time_field},
-            count_field_name: {"$sum": 1}
-        }},
-        # Project: preimenuj polja i formatiraj datume u ISO string (ako postoje)
-        {"$project": {
-            "_id": 0,
-            out_key_name: "$_id",
-            # Zaštita: ako from/to ne postoje, stavi None
-            "from": {
-                "$cond": [
-                    {"$ifNull": ["$from", False]},
-                    {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%SZ", "date": "$from"}},
-                    None
-                ]
-            },
-            "to": {
-                "$cond": [
-                    {"$ifNull": ["$to", False]},
-                    {"$dateToString": {"format": "%Y-%m-%dT%H:%M:%SZ", "date": "$to"}},
-                    None
-                ]
-            },
-            count_field_name: 1
-        }},
-        # Sortiraj po ključu radi urednog ispisa
-        {"$sort": {out_key_name: 1}}
+        coll_name, out_key_name, count_field_name = "holidays", "region", "days"
+
+    # Katalog pokrivenosti (storage.catalog): jedan dokument po ključu, održava ga svaki import
+    keys = [k.strip() for k in keys_param.split(",")] if keys_param else None
+    docs = [
+        {
+            out_key_name: e["key"],
+            "from": _iso_z(e.get("from")),
+            "to": _iso_z(e.get("to")),
+            count_field_name: e.get("count", 0),
+            "last_import": _iso_z(e.get("last_import")),
+        }
+        for e in catalog_entries(db, coll_name, keys)
     ]
-
-    # Izvrši agregaciju i vrati rezultat
-    docs = list(coll.aggregate(pipeline, allowDiskUse=True))
     return jsonify({"ok": True, "type": t, "coverage": docs})
 
 
+def _iso_z(dt):
+    """datetime (NAIVE UTC ili aware) → "YYYY-MM-DDTHH:MM:SSZ"; None ostaje None."""
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ") if dt else None
+
+
 @api_bp.get("/series/coverage/summary")
 def coverage_summary():
     """
@@ -140,57 +64,81 @@ def coverage_summary():
       - broj jedinstvenih ključeva (region/location/Region)
     """
     db = get_db()
-    ensure_indexes(db)
 
-    def summarize(coll_name, key_field, time_field, count_label):
+    def summarize(coll_name, count_label):
         """
-        Helper: za zadatu kolekciju vrati info:
+        Helper: za zadatu kolekciju iz kataloga vrati info:
           exists, from, to, total_count (count_label), keys (broj jedinstvenih ključeva)
         """
-        # Ako kolekcija ne postoji u bazi, vrati "prazan" sažetak
-        if coll_name not in db.list_collection_names():
-            return {"exists": False, "from": None, "to": None, count_label: 0, "keys": 0}
-
-        coll = db[coll_name]
-
-        # 1) Globalni raspon datuma i ukupan broj dokumenata
-        agg_range = list(coll.aggregate([
-            {"$group": {
-                "_id": None,
-                "from": {"$min": f"${time_field}"},
-                "to": {"$max": f"${time_field}"},
-                count_label: {"$sum": 1}
-            }},
-            {"$project": {"_id": 0, "from": 1, "to": 1, count_label: 1}}
-        ], allowDiskUse=True))
-
-        # 2) Broj jedinstvenih ključeva (npr. regiona/locations)
-        agg_keys = list(coll.aggregate([
-            {"$group": {"_id": f"${key_field}"}},
-            {"$count": "keys"}
-        ], allowDiskUse=True))
-
-        # Sastavi odgovor
-        res = {"exists": True}
-        if agg_range:
-            res.update({
-                # isoformat() pretvara Python datetime u ISO 8601 string; ako je None, vrati None
-                "from": agg_range[0]["from"].isoformat() if agg_range[0]["from"] else None,
-                "to": agg_range[0]["to"].isoformat() if agg_range[0]["to"] else None,
-                count_label: agg_range[0][count_label]
-            })
-        else:
-            # Ako agregacija ne vrati ništa (prazna kolekcija)
-            res.update({"from": None, "to": None, count_label: 0})
-
-        # Koliko ima jedinstvenih vrijednosti ključa
-        res["keys"] = (agg_keys[0]["keys"] if agg_keys else 0)
-        return res
+        entries = catalog_entries(db, coll_name)
+        froms = [e["from"] for e in entries if e.get("from")]
+        tos = [e["to"] for e in entries if e.get("to")]
+        return {
+            # "exists" znači da kolekcija ima podatke (kolekcije i indeksi postoje od starta — schema.py)
+            "exists": bool(entries),
+            # isoformat() pretvara Python datetime u ISO 8601 string; ako nema podataka, vrati None
+            "from": min(froms).isoformat() if froms else None,
+            "to": max(tos).isoformat() if tos else None,
+            count_label: sum(int(e.get("count", 0)) for e in entries),
+            "keys": len(entries),
+        }
 
     # Sažetak za sve tri serije (load/weather satni, holidays dnevni)
     return jsonify({
         "ok": True,
-        "load": summarize("series_load_hourly", "region", "ts", "hours"),
-        "weather": summarize("series_weather_hourly", "location", "ts", "hours"),
-        "holidays": summarize("holidays", "Region", "Date", "days"),
+        "load": summarize(collection_name("load"), "hours"),
+        "weather": summarize(collection_name("weather"), "hours"),
+        "holidays": summarize("holidays", "days"),
     })
+
+
+@api_bp.get("/series/gaps")
+def series_gaps():
+    """
+    API: GET /series/gaps
+    Query parametri (svi opcioni):
+      - region=N.Y.C.           (bez njega → svi regioni)
+      - from / to               (ISO UTC; ograniči run-ove i rupe na opseg)
+      - min_hours=1             (prikaži samo rupe od bar toliko sati)
+      - input_window=168        (ako je dat → intervali validnih start_date za prognozu)
+    Čita se samo indeks run-ova (storage.gaps), bez skeniranja satnih podataka.
+    """
+    db = get_db()
+    try:
+        ts_from = pd.to_datetime(request.args["from"], utc=True).tz_localize(None) if request.args.get("from") else None
+        ts_to = pd.to_datetime(request.args["to"], utc=True).tz_localize(None) if request.args.get("to") else None
+        min_hours = int(request.args.get("min_hours", 1))
+        input_window = int(request.args["input_window"]) if request.args.get("input_window") else None
+    except Exception as e:
+        return jsonify({"ok": False, "error": f"Invalid query parameter: {e}"}), 400
+
+    q = {"coll": collection_name("load")}
+    if request.args.get("region"):
+        q["key"] = request.args["region"]
+
+    def iso(a):
+        return pd.Timestamp(a).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    items = []
+    for doc in db[GAPS_COLL].find(q, {"_id": 0}).sort("key", 1):
+        runs = (pd.to_datetime([r["from"] for r in doc.get("runs", [])]).to_numpy(dtype="datetime64[ns]"),
+                pd.to_datetime([r["to"] for r in doc.get("runs", [])]).to_numpy(dtype="datetime64[ns]"))
+        runs = clip_runs(runs, ts_from, ts_to)
+        g_from, g_to = gaps_between(runs)
+        g_hours = ((g_to - g_from) // pd.Timedelta(hours=1).to_timedelta64() + 1).astype(int)
+        sel = g_hours >= min_hours
+        item = {
+            "region": doc["key"],
+            "runs": [{"from": iso(a), "to": iso(b)} for a, b in zip(*runs)],
+            "gaps": [{"from": iso(a), "to": iso(b), "hours": int(h)}
+                     for a, b, h in zip(g_from[sel], g_to[sel], g_hours[sel])],
+            "missing_hours": int(g_hours.sum()),
+        }
+        if input_window:
+            lo, hi = forecast_starts(runs, input_window)
+            item["forecast_starts"] = [{"from": iso(a), "to": iso(b)} for a, b in zip(lo, hi)]
+        items.append(item)
+
+    if q.get("key") and not items:
+        return jsonify({"ok": False, "error": f"No gap index for region {q['key']}"}), 404
+    return jsonify({"ok": True, "items": items})
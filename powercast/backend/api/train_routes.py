@@ -4,12 +4,13 @@ from . import api_bp
 from db import get_db, get_fs
 from datetime import datetime, timezone
 from ml.train import train_lstm_on_regions
+from ml.train_jobs import QueueFull, cancel_job, get_job, list_jobs, submit_train_job
 from bson import ObjectId
 
-# Lokalni folder za modele (može i iz ENV varijable)
+# Lokalni folder za modele (može i iz ENV varijable); podrazumijevano powercast/models u repozitorijumu
 MODEL_DIR = os.environ.get(
     "MODEL_DIR",
-    r"C:\Users\Lenovo\Documents\GitHub\ISIS\powercast\models"
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models"))
 )
 os.makedirs(MODEL_DIR, exist_ok=True)
 
@@ -31,11 +32,16 @@ def train_start():
           "epochs": 25,
           "batch_size": 64,
           "learning_rate": 1e-3,
-          "teacher_forcing": 0.2
+          "teacher_forcing": 0.2,
+          "region_workers": 4,                 # opcionalno: paralelni trening regiona (procesi)
+          "global_model": true,                # opcionalno: jedan model za sve regione (embedding regiona)
+          "global_baseline": true              # opcionalno: uz globalni i modeli po regionu + poređenje
         }
       }
 
     Vraća listu rezultata po regionu sa ID-jevima modela/artifakta i metrikama.
+    "async": true (ili ?async=1) → trening ide u pozadinski job: 202 + job_id
+    (429 ako je red pun, vidi TRAIN_JOB_QUEUE_LIMIT).
     """
     data = request.get_json(force=True)
     regions = data.get("regions") or []
@@ -49,15 +55,39 @@ def train_start():
     if not date_from or not date_to:
         return jsonify({"ok": False, "error": "date_from/date_to required"}), 400
 
-    # Konekcije na bazu i GridFS
     db = get_db()
-    fs = get_fs()
+
+    # async=true (JSON) ili ?async=1 → pozadinski job, odmah 202 sa job_id (napredak na GET /train/jobs/<id>)
+    if data.get("async") is True or str(request.args.get("async", "")).lower() in ("1", "true", "yes", "on"):
+        try:
+            job_id = submit_train_job(db, regions, date_from, date_to, hyper, persist=save_training_results)
+        except QueueFull as e:
+            return jsonify({"ok": False, "error": str(e)}), 429
+        return jsonify({
+            "ok": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/train/jobs/{job_id}",
+        }), 202
 
     # Pokreni trening; dobijamo listu rezultata po regionu.
     # Svaki rezultat (za ok=True) sadrži:
     #   - artifact_bytes: bajtovi torch.save paketa (state_dict + meta + scaler)
     #   - metrics: npr. {"val_loss": ..., "test_mape": ...}
     results = train_lstm_on_regions(db, regions, date_from, date_to, hyper)
+    out = save_training_results(db, results, hyper, date_from, date_to)
+
+    # Finalni odgovor za sve regione
+    return jsonify({"ok": True, "results": out})
+
+
+def save_training_results(db, results, hyper, date_from, date_to):
+    """
+    Snimi artefakte (lokalno + GridFS) i meta u 'models' za uspješne regione.
+    Vraća listu za odgovor (sa model_id / artifact_id); neuspješni regioni idu nepromijenjeni.
+    Koriste je sinhroni /train/start i trening job-ovi.
+    """
+    fs = get_fs()
     out = []
 
     # Tag za filename u GridFS (naivni UTC string, dovoljan za naziv)
@@ -87,17 +117,22 @@ def train_start():
         artifact_id = fs.put(r["artifact_bytes"], filename=filename)
 
         # (C) Upis meta u 'models' (dodaj i local_path da se vidi u UI/inspekciji)
+        #     globalni model: region="ALL" + "regions" (koje regione servira), per_region MAPE i poređenje
         doc = {
             "region": r["region"],
-            "algo": "LSTMSeq2Seq",
+            "algo": r.get("algo", "LSTMSeq2Seq"),
             "hyper": hyper,
             "train_range": {"from": date_from, "to": date_to},
             "metrics": r["metrics"],
+            "timing": r.get("timing"),
             "created_at": now_utc,                       # aware UTC
             "created_at_ms": int(now_utc.timestamp() * 1000),
             "artifact_id": artifact_id,
             "local_path": local_path                     # <— NOVO: putanja na disku
         }
+        for k in ("regions", "comparison", "feature_version"):
+            if r.get(k) is not None:
+                doc[k] = r[k]
         ins = db.models.insert_one(doc)
 
         out.append({
@@ -106,9 +141,41 @@ def train_start():
             "model_id": str(ins.inserted_id),
             "artifact_id": str(artifact_id),
             "metrics": r["metrics"],
+            "timing": r.get("timing"),                   # wall_s, fit_s, epochs_run, samples_per_s
             "created_at_ms": doc["created_at_ms"],
-            "local_path": local_path                     # <— po želji vrati i klijentu
+            "local_path": local_path,                    # <— po želji vrati i klijentu
+            **{k: r[k] for k in ("algo", "regions", "comparison", "skipped") if r.get(k) is not None},
         })
 
-    # Finalni odgovor za sve regione
-    return jsonify({"ok": True, "results": out})
+    return out
+
+
+# ---------- TRAIN JOBS (asinhroni trening) ----------
+
+@api_bp.get("/train/jobs/<job_id>")
+def train_job_status(job_id):
+    """Status job-a: napredak po regionu (epoha, batch, train/val loss, ETA), ETA job-a i rezultat kad završi."""
+    job = get_job(get_db(), job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    return jsonify({"ok": True, **job})
+
+
+@api_bp.delete("/train/jobs/<job_id>")
+def train_job_cancel(job_id):
+    """Otkaži job (queued → odmah; running → na sljedećem batch-u). Završen job se ne mijenja."""
+    status = cancel_job(get_db(), job_id)
+    if status is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    if status not in ("queued", "running", "cancelled"):
+        return jsonify({"ok": False, "error": f"Job already {status}"}), 409
+    return jsonify({"ok": True, "job_id": job_id, "status": "cancelled" if status == "cancelled" else "cancelling"})
+
+
+@api_bp.get("/train/jobs")
+def train_jobs_list():
+    """Posljednji trening job-ovi; opcioni filteri status=..., limit."""
+    limit = request.args.get("limit", "50")
+    jobs = list_jobs(get_db(), status=request.args.get("status"),
+                     limit=int(limit) if limit.isdigit() else 50)
+    return jsonify({"ok": True, "count": len(jobs), "jobs": jobs})
@@ -2,6 +2,10 @@ from flask import Flask
 from flask_cors import CORS
 from config import Config
 from db import get_db
+from schema import bootstrap_schema
+from ingest.jobs import init_jobs as init_import_jobs
+from ml.train_jobs import init_jobs as init_train_jobs
+from storage.series import ensure_series_backend
 from api import api_bp
 
 def create_app():
@@ -9,7 +13,18 @@ def create_app():
     
     CORS(app, resources={r"/*": {"origins": Config.CORS_ORIGINS.split(",")}}) #CORS standardno ali za sve rtue
 
-    _ = get_db()  # inicijalizacija konekcije ka Mongo
+    db = get_db()  # inicijalizacija konekcije ka Mongo
+    # indeksi + verzionisane migracije šeme, jednom po procesu (ne po request-u)
+    schema = bootstrap_schema(db)
+    if schema["error"]:
+        app.logger.warning("Schema migration failed: %s", schema["error"])
+    # job-ovi koje je prethodni proces ostavio u queued/running → failed ("interrupted")
+    try:
+        init_import_jobs(db)
+        init_train_jobs(db)
+    except Exception as e:
+        app.logger.warning("Job recovery failed: %s", e)
+    ensure_series_backend(db)  # SERIES_BACKEND=timeseries → time-series kolekcije moraju postojati prije upisa
     app.register_blueprint(api_bp, url_prefix="/api") # registrovanje Blueprint za aktiviranje importa ruta, sve imaju prefiks /api
 
     @app.get("/") # healt-check
@@ -9,3 +9,50 @@ class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     MONGO_DB = os.getenv("MONGO_DB", "powercast")
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*")
+
+    # Import: veličina jednog bulk_write batch-a i broj paralelnih writer niti
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+    IMPORT_WRITE_WORKERS = int(os.getenv("IMPORT_WRITE_WORKERS", "1"))
+    # Streaming import: broj CSV redova po chunk-u (gornja granica memorije po koraku)
+    IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "200000"))
+    # Bulk import arhiva: broj procesa za parsiranje i dozvoljeni root za server-side putanje (prazno = `path` isključen)
+    IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", str(os.cpu_count() or 1)))
+    IMPORT_ARCHIVE_ROOT = os.getenv("IMPORT_ARCHIVE_ROOT", "")
+    # Asinhroni import job-ovi: broj pozadinskih workera i folder za privremeno čuvanje upload-a
+    IMPORT_JOB_WORKERS = int(os.getenv("IMPORT_JOB_WORKERS", "2"))
+    IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", "")
+    # Backend satnih serija: "documents" (jedan dokument po satu) ili "timeseries" (MongoDB time-series)
+    SERIES_BACKEND = os.getenv("SERIES_BACKEND", "documents")
+    # Lokalni feature store (memory-mapped .npy kolone po ključu i mjesecu); prazno = isključen
+    FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "")
+    # In-process LRU keš prozora satnih serija (forecast / series actual), u bajtovima; 0 = isključen
+    SERIES_CACHE_BYTES = int(os.getenv("SERIES_CACHE_BYTES", str(64 * 1024 * 1024)))
+    # Perzistentna feature matrica po regionu za trening / prognozu ("0" = računaj feature-e iz početka)
+    FEATURE_MATRIX = os.getenv("FEATURE_MATRIX", "1")
+    # najduže trajanje lease-a za refresh feature matrice (s); istekao lease preuzima drugi proces
+    FEATURE_MATRIX_LEASE_S = int(os.getenv("FEATURE_MATRIX_LEASE_S", "600"))
+    # najduže čekanje (s) na tuđi refresh matrice prije greške (MatrixBusy)
+    FEATURE_MATRIX_WAIT_S = int(os.getenv("FEATURE_MATRIX_WAIT_S", "120"))
+    # koliko dugo (s) proces vjeruje keširanom kalendaru praznika prije ponovne provjere verzije u Mongo-u
+    HOLIDAY_CACHE_TTL_S = int(os.getenv("HOLIDAY_CACHE_TTL_S", "30"))
+    # Prekomputirana satna tabela NY kalendara (ml.calendar_table): opseg godina; satovi van njega se računaju direktno
+    CALENDAR_YEAR_FROM = int(os.getenv("CALENDAR_YEAR_FROM", "2010"))
+    CALENDAR_YEAR_TO = int(os.getenv("CALENDAR_YEAR_TO", "2035"))
+    # Trening: streaming iz lokalnog spool-a feature matrice ("1" = uključeno; "0" = sve u memoriji), DataLoader
+    # workeri (0 = u glavnom procesu), batch-evi unaprijed po workeru, startova po shard-u (jedinica rada workera),
+    # shard-ova koje worker miješa zajedno pri shuffle-u i folder za spool (prazno = tmp)
+    TRAIN_STREAMING = os.getenv("TRAIN_STREAMING", "0")
+    TRAIN_NUM_WORKERS = int(os.getenv("TRAIN_NUM_WORKERS", "0"))
+    TRAIN_PREFETCH = int(os.getenv("TRAIN_PREFETCH", "4"))
+    TRAIN_SHARD_HOURS = int(os.getenv("TRAIN_SHARD_HOURS", "720"))
+    TRAIN_SHUFFLE_SHARDS = int(os.getenv("TRAIN_SHUFFLE_SHARDS", "4"))
+    TRAIN_SPOOL_DIR = os.getenv("TRAIN_SPOOL_DIR", "")
+    # Paralelni trening regiona: broj procesa (1 = redom) i torch niti po procesu (0 = jezgra / procesi)
+    TRAIN_REGION_WORKERS = int(os.getenv("TRAIN_REGION_WORKERS", "1"))
+    TRAIN_THREADS_PER_WORKER = int(os.getenv("TRAIN_THREADS_PER_WORKER", "0"))
+    # Asinhroni trening job-ovi: broj job-ova koji rade istovremeno i max job-ova u redu + u radu
+    TRAIN_JOB_WORKERS = int(os.getenv("TRAIN_JOB_WORKERS", "1"))
+    TRAIN_JOB_QUEUE_LIMIT = int(os.getenv("TRAIN_JOB_QUEUE_LIMIT", "8"))
+    # Heartbeat asinhronih job-ova (import + trening, s) i starost heartbeat-a nakon koje je vlasnik mrtav
+    JOB_HEARTBEAT_S = int(os.getenv("JOB_HEARTBEAT_S", "10"))
+    JOB_STALE_S = int(os.getenv("JOB_STALE_S", "60"))
@@ -0,0 +1,4 @@
+# ingest/
+# Zajednički "engine" za import vremenskih serija (load / weather) u MongoDB.
+# Rute u api/import_routes.py parsiraju i agregiraju CSV, a ovdje je sve što
+# pretvara satni DataFrame u upise (batch-evi, paralelni bulk_write, tajminzi).
@@ -0,0 +1,184 @@
+# archive.py
+# Paralelni bulk import NYISO mjesečnih arhiva (npr. "20180101pal_csv/*.csv" ili .zip):
+# - skupi sve dnevne CSV fajlove iz foldera / zip-a (i zip-ova unutar foldera)
+# - raspodijeli ih na procesni pool: parsiranje, lokalizacija (NY → UTC) i satna agregacija
+# - spoji parcijalne sume/brojače svih fajlova, deduplikuj (region, ts) i uradi JEDAN bulk upsert
+#
+# CLI:
+#   python -m ingest.archive "Training Data/NYS Load  Data" --workers 8
+
+import argparse
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from config import Config
+from storage.series import series_collection
+from .tz import localize_to_utc, utc_floor_hour, aware_to_naive_utc
+from .writer import StageTimer, write_hourly
+
+REQUIRED_LOAD_COLS = ["Time Stamp", "Name", "Load"]
+
+
+def collect_sources(path):
+    """
+    Ulaz: putanja do foldera, .zip ili pojedinačnog .csv fajla.
+    Vraća sortiranu listu (ime, izvor) gdje je izvor ili putanja na disku ili bajtovi
+    (za članove zip arhive). Folderi se prolaze rekurzivno; zip-ovi u folderu se otvaraju.
+    """
+    sources = []
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for fn in sorted(files):
+                full = os.path.join(root, fn)
+                if fn.lower().endswith(".csv"):
+                    sources.append((full, full))
+                elif fn.lower().endswith(".zip"):
+                    sources.extend(zip_sources(full))
+    elif path.lower().endswith(".zip"):
+        sources.extend(zip_sources(path))
+    elif path.lower().endswith(".csv"):
+        sources.append((path, path))
+    else:
+        raise ValueError(f"Unsupported path (expected folder, .zip or .csv): {path}")
+    return sorted(sources, key=lambda s: s[0])
+
+
+def zip_sources(zip_like):
+    """Članovi .csv iz zip arhive (putanja ili file-like) kao (ime, bajtovi)."""
+    out = []
+    with zipfile.ZipFile(zip_like) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(".csv"):
+                continue
+            out.append((info.filename, zf.read(info)))
+    return out
+
+
+def aggregate_load_file(source):
+    """
+    Radnik procesnog pool-a (top-level funkcija → picklable).
+    Ulaz: (ime, putanja | bajtovi). Izlaz: (ime, DataFrame | None, greška | None)
+    DataFrame ima kolone region, ts (aware UTC sat), sum, count — parcijale za spajanje.
+    """
+    name, src = source
+    try:
+        buf = io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src
+        df = pd.read_csv(buf, usecols=lambda c: c in REQUIRED_LOAD_COLS or c == "Time Zone",
+                         dtype={"Time Stamp": str, "Time Zone": str, "Name": str}, engine="c")
+        missing = [c for c in REQUIRED_LOAD_COLS if c not in df.columns]
+        if missing:
+            return name, None, f"Missing columns: {missing}"
+
+        df = df.dropna(subset=REQUIRED_LOAD_COLS)
+        df["Load"] = pd.to_numeric(df["Load"], errors="coerce")
+        df = df.dropna(subset=["Load"])
+
+        ts_utc = localize_to_utc(df, "Time Stamp")
+        df = df.loc[ts_utc.index, ["Name", "Load"]]
+        df["ts"] = utc_floor_hour(ts_utc)
+
+        g = (
+            df.groupby(["Name", "ts"])["Load"]
+              .agg(["sum", "count"])
+              .reset_index()
+              .rename(columns={"Name": "region"})
+        )
+        return name, g, None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def import_load_archive(coll, sources, workers=None, write_opts=None, timer=None, diff=True):
+    """
+    Paralelno parsira/agregira sve izvore i upisuje rezultat jednim (batch-ovanim) upsert-om.
+    Sati koji se pojavljuju u više fajlova (npr. granica dana) spajaju se
+    kao ponderisani prosjek (sum/count), pa nema duplikata (region, ts).
+    Vraća sažetak (dict).
+    """
+    timer = timer or StageTimer()
+    workers = max(1, int(workers or Config.IMPORT_PARSE_WORKERS))
+
+    with timer.stage("parse_aggregate"):
+        if workers == 1 or len(sources) == 1:
+            results = [aggregate_load_file(s) for s in sources]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as ex:
+                results = list(ex.map(aggregate_load_file, sources, chunksize=4))
+
+    parts, failed = [], []
+    for name, g, err in results:
+        if err:
+            failed.append({"file": os.path.basename(name), "error": err})
+        elif not g.empty:
+            parts.append(g)
+
+    summary = {
+        "files": len(sources),
+        "files_ok": len(sources) - len(failed),
+        "failed": failed,
+        "regions": [],
+        "rows_hourly": 0,
+        "ts_range": None,
+        "upserts": 0,
+        "modified": 0,
+        "batches": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+    }
+    if not parts:
+        return summary
+
+    with timer.stage("merge"):
+        allp = pd.concat(parts, ignore_index=True)
+        g = allp.groupby(["region", "ts"], sort=True)[["sum", "count"]].sum().reset_index()
+        g["load_mw"] = g["sum"] / g["count"]
+
+    stats = write_hourly(coll, g, "region", ["load_mw"], diff=diff, write_opts=write_opts, timer=timer)
+
+    summary.update({
+        "regions": sorted(g["region"].unique().tolist()),
+        "rows_hourly": int(g.shape[0]),
+        "ts_range": {
+            "from": aware_to_naive_utc(g["ts"].min()).isoformat(),
+            "to": aware_to_naive_utc(g["ts"].max()).isoformat(),
+        },
+        **{k: stats[k] for k in ("upserts", "modified", "batches", "inserted", "updated", "unchanged")},
+    })
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import NYISO pal_csv arhiva (folder / zip) u load seriju.")
+    parser.add_argument("path", help="folder, .zip ili .csv")
+    parser.add_argument("--workers", type=int, default=None, help="broj procesa za parsiranje (default: IMPORT_PARSE_WORKERS)")
+    parser.add_argument("--batch-size", type=int, default=None, help="broj operacija po bulk_write pozivu")
+    parser.add_argument("--write-workers", type=int, default=None, help="broj paralelnih bulk_write niti")
+    parser.add_argument("--no-diff", action="store_true", help="upiši sve sate bez poređenja sa postojećim vrijednostima")
+    args = parser.parse_args(argv)
+
+    from db import get_db
+    # feature matrice regiona se označavaju kao zastarjele kroz post-write hook (storage.writehooks);
+    # Flask app ga registruje kroz rute, CLI ovdje
+    import ml.featurematrix  # noqa: F401
+    db = get_db()
+
+    timer = StageTimer()
+    with timer.stage("collect"):
+        sources = collect_sources(args.path)
+    summary = import_load_archive(
+        series_collection(db, "load"), sources, workers=args.workers,
+        write_opts={"batch_size": args.batch_size, "workers": args.write_workers},
+        timer=timer, diff=not args.no_diff,
+    )
+    summary["timings_ms"] = timer.as_dict()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
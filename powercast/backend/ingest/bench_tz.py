@@ -0,0 +1,51 @@
+# bench_tz.py
+# Benchmark: stara lokalizacija (sort + tz_localize(ambiguous="infer")) naspram
+# brzog puta preko NYISO "Time Zone" kolone (EST/EDT → fiksni UTC offset).
+#
+#   python -m ingest.bench_tz "../../Training Data/NYS Load  Data/20181101pal_csv" --repeat 3
+
+import argparse
+import time
+
+import pandas as pd
+
+from .archive import collect_sources
+from .tz import to_utc_series_localized, to_utc_from_tz_column
+
+
+def _best_of(fn, repeat):
+    best, out, err = None, None, None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        try:
+            out, err = fn(), None
+        except Exception as e:
+            out, err = None, str(e)
+        dt = time.perf_counter() - t
+        best = dt if best is None else min(best, dt)
+    return best * 1000.0, out, err
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark NY→UTC konverzije za NYISO load CSV-ove.")
+    parser.add_argument("path", help="folder, .zip ili .csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    frames = [pd.read_csv(src, dtype={"Time Stamp": str, "Time Zone": str, "Name": str})
+              for _, src in collect_sources(args.path)]
+    df = pd.concat(frames, ignore_index=True)
+    print(f"rows: {len(df)}  files: {len(frames)}")
+
+    t_old, old, err_old = _best_of(lambda: to_utc_series_localized(df["Time Stamp"]), args.repeat)
+    t_new, new, err_new = _best_of(lambda: to_utc_from_tz_column(df["Time Stamp"], df["Time Zone"]), args.repeat)
+
+    print(f"infer (postojeći put): {t_old:9.1f} ms" + (f"  GREŠKA: {err_old}" if err_old else ""))
+    print(f"Time Zone kolona:      {t_new:9.1f} ms" + (f"  GREŠKA: {err_new}" if err_new else ""))
+    if not err_old and not err_new:
+        same = old.sort_index().equals(new.sort_index())
+        print(f"ubrzanje: {t_old / max(t_new, 1e-9):.1f}x  identičan rezultat: {same}")
+
+
+if __name__ == "__main__":
+    main()
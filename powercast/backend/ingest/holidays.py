@@ -0,0 +1,149 @@
+# holidays.py
+# Vektorizovani parser kalendara praznika (xlsx/xls/csv, bez header-a):
+#
+#   kolona 0: red sa samo godinom (npr. "2018") otvara blok te godine
+#   kolona 1: dan u sedmici (ignoriše se)
+#   kolona 2: datum (MM/DD, MM-DD, MM/DD/YYYY, YYYY-MM-DD, Excel datetime ...)
+#   kolona 3: naziv praznika
+#
+# Godina iz datuma se ignoriše — važi godina iz posljednjeg "year" reda iznad (forward-fill).
+# Svaki sheet radne sveske je zaseban kalendar (region), pa se više država / regiona
+# i više decenija uvozi jednim upload-om i jednim bulk upsert-om.
+
+import json
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from .tz import NY_TZ
+
+YEAR_PAT = r"^(?:19|20)\d{2}$"
+MD_PAT = r"^(\d{1,2})[/-](\d{1,2})(?:[/-]\d{2,4})?$"        # MM/DD ili MM-DD (+ opcionalna godina)
+ISO_PAT = r"^\d{4}-(\d{1,2})-(\d{1,2})(?:[ T].*)?$"          # YYYY-MM-DD[ HH:MM:SS] (Excel datumi kao str)
+
+DEFAULT_REGION = "US"
+
+
+def parse_sheet_regions(value):
+    """
+    Mapiranje sheet → region iz form-data:
+      - JSON objekat: {"US Holidays": "US", "Canada": "CA"}
+      - ili lista parova: "US Holidays:US,Canada:CA"
+    """
+    if not value:
+        return {}
+    value = str(value).strip()
+    if value.startswith("{"):
+        return {str(k).strip(): str(v).strip() for k, v in json.loads(value).items()}
+    out = {}
+    for pair in value.split(","):
+        if ":" in pair:
+            sheet, region = pair.rsplit(":", 1)
+            out[sheet.strip()] = region.strip()
+    return out
+
+
+def read_holiday_sheets(fileobj, filename):
+    """Učitaj sve sheet-ove (xlsx/xls) ili jedan CSV kao {sheet_name: DataFrame(str)}."""
+    if filename.lower().endswith((".xlsx", ".xls")):
+        return pd.read_excel(fileobj, header=None, dtype=str, sheet_name=None)
+    return {"csv": pd.read_csv(fileobj, header=None, dtype=str)}
+
+
+def parse_holiday_sheet(df_raw, region):
+    """
+    Jedan sheet → DataFrame [Region, Date (naive lokalni dan), Name], bez petlji po redovima:
+      1) trim kolona 0–3 (str accessor)
+      2) year markeri → forward-fill aktivne godine
+      3) MM/DD izvučeni regex-om (MM/DD ili ISO), ostatak kroz jedan pd.to_datetime poziv
+      4) datumi konstruisani odjednom iz (year, month, day); nevažeći (npr. 29.02.) → NaT → odbačeni
+    """
+    df_raw = df_raw.reindex(columns=range(max(4, df_raw.shape[1])))
+    c = {i: df_raw[i].fillna("").astype(str).str.strip() for i in range(4)}
+
+    # 1) Header red: samo godina u prvoj koloni, ostalo prazno
+    is_year = c[0].str.match(YEAR_PAT) & (c[1] == "") & (c[2] == "") & (c[3] == "")
+    year = pd.to_numeric(c[0].where(is_year), errors="coerce").ffill()
+
+    # 2) Redovi sa datumom unutar nekog godišnjeg bloka (prije prvog header-a se ignoriše)
+    keep = ~is_year & year.notna() & (c[2] != "")
+    date_txt, name, year = c[2][keep], c[3][keep], year[keep]
+    if date_txt.empty:
+        return pd.DataFrame(columns=["Region", "Date", "Name"])
+
+    # 3) Mjesec/dan: MM/DD → ISO → generički parse (samo za ostatak)
+    md = date_txt.str.extract(MD_PAT)
+    iso = date_txt.str.extract(ISO_PAT)
+    month = pd.to_numeric(md[0].fillna(iso[0]), errors="coerce")
+    day = pd.to_numeric(md[1].fillna(iso[1]), errors="coerce")
+
+    rest = month.isna()
+    if rest.any():
+        parsed = pd.to_datetime(date_txt[rest], errors="coerce")
+        month[rest] = parsed.dt.month
+        day[rest] = parsed.dt.day
+
+    # 4) Godina iz datuma se ignoriše → koristi se godina bloka
+    date = pd.to_datetime(
+        pd.DataFrame({"year": year, "month": month, "day": day}),
+        errors="coerce",
+    )
+    ok = date.notna()
+    date, name = date[ok], name[ok]
+
+    return pd.DataFrame({
+        "Region": region,
+        "Date": date.to_numpy(),
+        "Name": np.where(name != "", name, date.dt.strftime("%Y-%m-%d")),
+    })
+
+
+def parse_holiday_workbook(sheets, default_region=DEFAULT_REGION, sheet_regions=None):
+    """
+    Svi sheet-ovi → jedan DataFrame [Region, Date (NAIVE UTC ključ), Name] + lista (sheet, region, rows).
+    Region sheet-a: eksplicitno mapiranje > `default_region` (ako je jedan sheet) > naziv sheet-a.
+    """
+    sheet_regions = sheet_regions or {}
+    frames, per_sheet = [], []
+    for sheet, df_raw in sheets.items():
+        if sheet_regions:
+            if sheet not in sheet_regions:
+                continue
+            region = sheet_regions[sheet]
+        else:
+            region = default_region if len(sheets) == 1 else str(sheet).strip()
+        if df_raw.shape[1] < 3:
+            continue
+        part = parse_holiday_sheet(df_raw, region)
+        per_sheet.append({"sheet": sheet, "region": region, "rows": int(part.shape[0])})
+        frames.append(part)
+
+    if not frames:
+        return pd.DataFrame(columns=["Region", "Date", "Name"]), per_sheet
+    out = pd.concat(frames, ignore_index=True)
+    if out.empty:
+        return out, per_sheet
+
+    # Lokalni NY dan → UTC → 00:00 UTC (dnevni ključ, isto kao join_holidays u ml/features.py)
+    dates_local = pd.to_datetime(out["Date"]).dt.tz_localize(
+        NY_TZ, ambiguous="infer", nonexistent="shift_forward"
+    )
+    out["Date"] = dates_local.dt.tz_convert("UTC").dt.normalize().dt.tz_localize(None)
+
+    # isti (Region, Date) više puta u upload-u → posljednji red pobjeđuje (kao ranije kod upsert-a)
+    out = out.drop_duplicates(subset=["Region", "Date"], keep="last").reset_index(drop=True)
+    return out, per_sheet
+
+
+def holiday_upserts(out):
+    """DataFrame praznika → UpdateOne(upsert=True) po (Region, Date), kolonski (bez iterrows)."""
+    dates = out["Date"].to_numpy(dtype="datetime64[us]").astype(object)
+    return [
+        UpdateOne(
+            {"Region": r, "Date": d},
+            {"$set": {"Region": r, "Date": d, "Name": n, "is_holiday": True}},
+            upsert=True,
+        )
+        for r, d, n in zip(out["Region"].astype(str).tolist(), dates, out["Name"].astype(str).tolist())
+    ]
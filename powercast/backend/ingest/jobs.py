@@ -0,0 +1,188 @@
+# jobs.py
+# Asinhroni import job-ovi (LOAD / WEATHER):
+# - ruta sačuva upload u spool folder, upiše job u kolekciju `import_jobs` i odmah vrati job id
+# - ograničeni pool pozadinskih niti (Config.IMPORT_JOB_WORKERS) izvršava isti pipeline kao sinhrona ruta
+# - napredak (rows_parsed / rows_written), throughput i greška se periodično upisuju u job dokument,
+#   pa GET /import/jobs/<id> radi iz bilo kog Flask worker-a
+# - job nosi vlasnika (host/pid) i heartbeat (storage.jobowner): job-ovi procesa koji je pao ili se
+#   restartovao označe se kao failed ("interrupted"), a njihov spool fajl se briše
+#
+# Status: queued → running → done | failed
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from pymongo import DESCENDING
+
+from config import Config
+from storage.jobowner import owner, watch_jobs
+from .pipelines import PIPELINES
+from .writer import StageTimer
+
+JOBS_COLL = "import_jobs"
+ACTIVE = ("queued", "running")
+# koliko često (s) se napredak upisuje u Mongo dok job radi
+_PROGRESS_EVERY_S = 0.5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _remove_spool(doc):
+    """Spool fajl prekinutog job-a (samo ako je na ovom hostu)."""
+    path = doc.get("spool_path")
+    if path and (doc.get("owner") or {}).get("host") == owner()["host"]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _get_executor(db):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # zaostali job-ovi prethodnog procesa (restart) → failed
+            watch_jobs(db[JOBS_COLL], ACTIVE, on_recovered=_remove_spool)
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.IMPORT_JOB_WORKERS),
+                thread_name_prefix="import-job",
+            )
+    return _executor
+
+
+def init_jobs(db):
+    """Start aplikacije: oporavi zaostale job-ove prethodnog procesa i pokreni heartbeat (executor unaprijed)."""
+    _get_executor(db)
+
+
+def spool_upload(fileobj, filename):
+    """Sačuvaj upload na disk (stream kopija u blokovima) i vrati putanju privremenog fajla."""
+    spool_dir = Config.IMPORT_SPOOL_DIR or tempfile.gettempdir()
+    os.makedirs(spool_dir, exist_ok=True)
+    suffix = os.path.splitext(filename or "")[1] or ".csv"
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=suffix, dir=spool_dir)
+    fileobj.seek(0)
+    with os.fdopen(fd, "wb") as out:
+        for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+            out.write(block)
+    return path
+
+
+class _Progress:
+    """Callback za pipeline: pamti kumulativne brojače i povremeno ih upisuje u job dokument."""
+    def __init__(self, coll, job_id):
+        self.coll = coll
+        self.job_id = job_id
+        self.t0 = time.perf_counter()
+        self.last_flush = 0.0
+        self.rows_parsed = 0
+        self.rows_written = 0
+
+    def __call__(self, rows_parsed=None, rows_written=None):
+        if rows_parsed is not None:
+            self.rows_parsed = int(rows_parsed)
+        if rows_written is not None:
+            self.rows_written = int(rows_written)
+        if time.perf_counter() - self.last_flush >= _PROGRESS_EVERY_S:
+            self.flush()
+
+    def fields(self):
+        elapsed = time.perf_counter() - self.t0
+        return {
+            "progress": {"rows_parsed": self.rows_parsed, "rows_written": self.rows_written},
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rows_s": round(self.rows_parsed / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def flush(self):
+        self.last_flush = time.perf_counter()
+        self.coll.update_one({"_id": self.job_id}, {"$set": self.fields()})
+
+
+def _run_job(db, job_id, kind, path, filename, digest, options):
+    coll = db[JOBS_COLL]
+    progress = _Progress(coll, job_id)
+    try:
+        # već označen kao prekinut (failed) dok je čekao u redu → ne počinji
+        if coll.update_one({"_id": job_id, "status": "queued"},
+                           {"$set": {"status": "running", "started_at": _now()}}).matched_count == 0:
+            return
+        with open(path, "rb") as fh:
+            result = PIPELINES[kind](db, fh, filename, digest, options,
+                                     timer=StageTimer(), progress=progress)
+        coll.update_one({"_id": job_id}, {"$set": {
+            "status": "done", "finished_at": _now(), "result": result, **progress.fields(),
+        }})
+    except Exception as e:
+        # ValueError = neispravan ulaz (ista poruka kao kod sinhrone rute), ostalo = neočekivana greška
+        msg = str(e) if isinstance(e, ValueError) else f"Import error: {e}"
+        coll.update_one({"_id": job_id}, {"$set": {
+            "status": "failed", "finished_at": _now(), "error": msg, **progress.fields(),
+        }})
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def submit_import_job(db, kind, fileobj, filename, digest, options=None):
+    """Spool upload-a + upis job dokumenta + predaja pool-u. Vraća job id (hex string)."""
+    if kind not in PIPELINES:
+        raise ValueError(f"Unknown import type: {kind}")
+
+    executor = _get_executor(db)
+    path = spool_upload(fileobj, filename)
+    job_id = uuid.uuid4().hex
+    created_at = _now()
+    db[JOBS_COLL].insert_one({
+        "_id": job_id,
+        "type": kind,
+        "file": filename,
+        "sha256": digest,
+        "options": dict(options or {}),
+        "status": "queued",
+        "created_at": created_at,
+        "owner": owner(),
+        "heartbeat_at": created_at,
+        "spool_path": path,
+        "progress": {"rows_parsed": 0, "rows_written": 0},
+    })
+    executor.submit(_run_job, db, job_id, kind, path, filename, digest, dict(options or {}))
+    return job_id
+
+
+def _serialize(doc):
+    out = {k: v for k, v in doc.items() if k != "_id"}
+    out["job_id"] = doc["_id"]
+    for k in ("created_at", "started_at", "finished_at"):
+        if out.get(k) is not None:
+            out[k] = out[k].isoformat()
+    return out
+
+
+def get_job(db, job_id):
+    """Job dokument za JSON odgovor ili None."""
+    doc = db[JOBS_COLL].find_one({"_id": job_id})
+    return _serialize(doc) if doc else None
+
+
+def list_jobs(db, kind=None, status=None, limit=50):
+    """Posljednji job-ovi (najnoviji prvi), bez pune `result` sekcije."""
+    q = {}
+    if kind:
+        q["type"] = kind
+    if status:
+        q["status"] = status
+    cur = db[JOBS_COLL].find(q, {"result": 0}).sort("created_at", DESCENDING).limit(int(limit))
+    return [_serialize(d) for d in cur]
@@ -0,0 +1,75 @@
+# ledger.py
+# Evidencija uvezenih fajlova (kolekcija `import_ledger`):
+# - ključ je (type, sha256 sadržaja fajla) → provjera "već uvezeno?" je jedan indeksirani find_one
+# - uz hash se čuvaju ključevi (regioni/lokacije), vremenski opseg i brojači upisa
+# Noćni sync poslovi tako za nepromijenjene fajlove ne rade parsiranje ni upis.
+# Indeksi kolekcije su deklarisani u schema.py.
+
+import hashlib
+from datetime import datetime, timezone
+
+LEDGER_COLL = "import_ledger"
+_HASH_BLOCK = 1024 * 1024
+
+def file_sha256(fileobj):
+    """
+    SHA-256 sadržaja upload-a (čita u blokovima) i vraća stream na početak,
+    tako da ga parser nakon toga može normalno pročitati.
+    """
+    h = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(_HASH_BLOCK), b""):
+        h.update(block)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+def ledger_lookup(db, kind, digest):
+    """Vrati postojeći zapis za (type, sha256) ili None."""
+    return db[LEDGER_COLL].find_one({"type": kind, "sha256": digest}, {"_id": 0})
+
+
+def ledger_record(db, kind, digest, filename, keys, ts_from, ts_to, stats=None):
+    """
+    Upiši/obnovi zapis nakon uspješnog importa.
+    ts_from / ts_to: NAIVE UTC datetime (ili ISO string) granice uvezenog opsega.
+    """
+    now = datetime.now(timezone.utc)
+    db[LEDGER_COLL].update_one(
+        {"type": kind, "sha256": digest},
+        {
+            "$set": {
+                "type": kind,
+                "sha256": digest,
+                "file": filename,
+                "keys": sorted(keys),
+                "ts_from": ts_from,
+                "ts_to": ts_to,
+                "stats": stats or {},
+                "imported_at": now,
+            },
+            "$inc": {"imports": 1},
+        },
+        upsert=True,
+    )
+
+
+def skipped_response(kind, digest, entry):
+    """JSON payload kad je fajl već uvezen (kratki spoj bez parsiranja)."""
+    def iso(v):
+        return v.isoformat() if hasattr(v, "isoformat") else v
+
+    return {
+        "ok": True,
+        "skipped": True,
+        "reason": "File already imported (same content hash); use force=1 to re-import",
+        "type": kind,
+        "sha256": digest,
+        "ledger": {
+            "file": entry.get("file"),
+            "keys": entry.get("keys", []),
+            "ts_range": {"from": iso(entry.get("ts_from")), "to": iso(entry.get("ts_to"))},
+            "imported_at": iso(entry.get("imported_at")),
+            "stats": entry.get("stats", {}),
+        },
+    }
@@ -0,0 +1,294 @@
+# pipelines.py
+# Import pipeline-i za LOAD i WEATHER CSV, nezavisni od Flask request-a:
+# koriste ih i sinhrone rute (api/import_routes.py) i pozadinski import job-ovi (ingest/jobs.py).
+#
+# Svaka funkcija:
+#   - prima file-like objekat (upload stream ili fajl sa diska) i opcije importa
+#   - baca ValueError sa porukom za korisnika kad ulaz nije validan
+#   - javlja napredak kroz opcioni callback progress(rows_parsed=..., rows_written=...)
+#   - vraća sažetak (dict) za JSON odgovor
+
+import pandas as pd
+
+from storage.series import series_collection
+
+from .ledger import ledger_record
+from .streaming import stream_load_csv
+from .tz import to_utc_series_localized, localize_to_utc, utc_floor_hour, aware_to_naive_utc
+from .writer import StageTimer, write_hourly
+
+REQUIRED_LOAD_COLS = ["Time Stamp", "Name", "Load"]
+
+# Podrazumijevane opcije importa (rute ih popunjavaju iz form-data / query stringa)
+DEFAULT_OPTIONS = {"stream": False, "chunk_rows": None, "diff": True, "batch_size": None, "workers": None}
+
+
+def _noop_progress(**_):
+    pass
+
+
+def write_counts(stats):
+    """Zajednička polja odgovora o upisu."""
+    return {
+        "upserts": stats["upserts"],
+        "modified": stats["modified"],
+        "batches": stats["batches"],
+        "inserted": stats["inserted"],
+        "updated": stats["updated"],
+        "unchanged": stats["unchanged"],
+    }
+
+
+def _write_opts(opts):
+    return {k: opts[k] for k in ("batch_size", "workers") if opts.get(k)}
+
+
+# ---------- LOAD (5-min → hourly mean) ----------
+
+def import_load_file(db, fileobj, filename, digest, options=None, timer=None, progress=None):
+    """LOAD import jednog CSV-a; streaming ili cijeli fajl u memoriji, zavisno od options["stream"]."""
+    opts = {**DEFAULT_OPTIONS, **(options or {})}
+    timer = timer or StageTimer()
+    progress = progress or _noop_progress
+
+    if opts["stream"]:
+        return _import_load_streaming(db, fileobj, filename, digest, opts, timer, progress)
+
+    # 4) Učitaj CSV u pandas DataFrame (bez nepotrebnog tip-guessanja)
+    try:
+        with timer.stage("parse"):
+            df = pd.read_csv(fileobj, low_memory=False)
+    except Exception as e:
+        raise ValueError(f"CSV parse error: {e}")
+
+    # 5) Provjeri da su obavezne kolone prisutne (Time Stamp, Name, Load)
+    missing = [c for c in REQUIRED_LOAD_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+
+    # 6) Osnovno čišćenje:
+    #    - zapamti ulazni broj redova (za povratnu informaciju)
+    #    - odbaci redove bez bilo koje od ključnih kolona
+    before_rows = len(df)
+    progress(rows_parsed=before_rows)
+    with timer.stage("clean"):
+        df = df.dropna(subset=["Time Stamp", "Name", "Load"]).copy()
+
+        # 7) Parsiraj Load u numerički tip; sve nevažeće vrijednosti postaju NaN
+        df["Load"] = pd.to_numeric(df["Load"], errors="coerce")
+        #    - odbaci redove gdje je Load NaN
+        df = df.dropna(subset=["Load"])
+
+    # 8) Pretvori "Time Stamp" (naivni lokalni NY) u AWARE UTC:
+    #    - ako CSV ima "Time Zone" (EST/EDT) → offset direktno iz kolone (bez sortiranja/infer)
+    #    - inače DST rubni slučajevi kroz tz_localize (spring forward / fall back)
+    try:
+        with timer.stage("localize"):
+            ts_utc = localize_to_utc(df, "Time Stamp")
+    except Exception as e:
+        raise ValueError(f"Timezone localization error: {e}")
+
+    with timer.stage("aggregate"):
+        #    - poravnaj DF na validne indekse (gdje je parsiranje uspjelo),
+        #      i sačuvaj kolonu sa UTC aware timestampom
+        df = df.loc[ts_utc.index].copy()
+        df["ts_utc"] = ts_utc
+
+        # 9) Floor na puni sat u UTC (npr. 12:34 → 12:00); priprema za satnu agregaciju
+        df["ts_hour_utc"] = utc_floor_hour(df["ts_utc"])
+
+        # 10) Grupacija i satna agregacija:
+        #     - po regionu ("Name") i satu (UTC) uzmi prosjek od 5-min vrijednosti
+        g = (
+            df.groupby(["Name", "ts_hour_utc"])["Load"]
+              .mean()
+              .reset_index()
+              .rename(columns={"Name": "region", "Load": "load_mw", "ts_hour_utc": "ts"})
+        )
+
+    # 11) Ako je sve odbačeno tokom čišćenja – javi korisniku
+    if g.empty:
+        raise ValueError("No usable rows after cleaning")
+
+    # 12) Ukloni eventualne duplikate (region, ts)
+    g = g.drop_duplicates(subset=["region", "ts"])
+
+    # 13) Upis: jednim opsežnim upitom uporedi sa postojećim vrijednostima (diff),
+    #     pa kolonski izgradi UpdateOne(upsert=True) samo za nove/promijenjene (region, ts)
+    # 14) Izvrši bulk_write u ograničenim batch-evima (ne-ordered; opciono paralelno)
+    try:
+        stats = write_hourly(
+            series_collection(db, "load"), g, "region", ["load_mw"],
+            diff=opts["diff"], write_opts=_write_opts(opts), timer=timer
+        )
+    except Exception as e:
+        raise ValueError(f"Mongo bulk_write error: {e}")
+    progress(rows_written=int(g.shape[0]))
+
+    # 15) Pripremi povratnu informaciju o importu (opseg vremena, broj regiona, itd.)
+    regions = sorted(g["region"].unique().tolist())
+    ts_min, ts_max = aware_to_naive_utc(g["ts"].min()), aware_to_naive_utc(g["ts"].max())
+    ledger_record(db, "load", digest, filename, regions,
+                  ts_min.to_pydatetime(), ts_max.to_pydatetime(), write_counts(stats))
+
+    # 16) Sažetak sa metrikama, statistikama upisa i trajanjem faza (ms)
+    return {
+        "file": filename,
+        "regions": regions,
+        "rows_input": int(before_rows),        # koliko je došlo
+        "rows_hourly": int(g.shape[0]),        # koliko satnih zapisa je nastalo
+        "ts_range": {"from": ts_min.isoformat(), "to": ts_max.isoformat()},
+        **write_counts(stats),
+        "timings_ms": timer.as_dict()
+    }
+
+
+def _import_load_streaming(db, fileobj, filename, digest, opts, timer, progress):
+    """
+    Streaming varijanta LOAD importa za velike (višegodišnje) 5-min fajlove.
+    Opcija chunk_rows (broj CSV redova po chunk-u).
+    """
+    try:
+        summary = stream_load_csv(
+            fileobj, series_collection(db, "load"), timer,
+            chunk_rows=opts["chunk_rows"], write_opts=_write_opts(opts), diff=opts["diff"],
+            progress=progress,
+        )
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Streaming import error: {e}")
+
+    if summary["rows_hourly"] == 0:
+        raise ValueError("No usable rows after cleaning")
+
+    ledger_record(db, "load", digest, filename, summary["regions"],
+                  pd.Timestamp(summary["ts_range"]["from"]).to_pydatetime(),
+                  pd.Timestamp(summary["ts_range"]["to"]).to_pydatetime(),
+                  {k: summary[k] for k in ("upserts", "modified", "inserted", "updated", "unchanged")})
+
+    return {
+        "file": filename,
+        "mode": "stream",
+        **summary,
+        "timings_ms": timer.as_dict()
+    }
+
+
+# ---------- WEATHER (hourly → hourly mean by hour) ----------
+
+def import_weather_file(db, fileobj, filename, digest, options=None, timer=None, progress=None):
+    """WEATHER import jednog CSV-a (satni prosjek po lokaciji)."""
+    opts = {**DEFAULT_OPTIONS, **(options or {})}
+    timer = timer or StageTimer()
+    progress = progress or _noop_progress
+
+    try:
+        with timer.stage("parse"):
+            df = pd.read_csv(fileobj, low_memory=False)
+    except Exception as e:
+        raise ValueError(f"CSV parse error: {e}")
+
+    if df.empty or df.shape[1] == 0:
+        raise ValueError("Empty CSV or no columns")
+
+    # Header normalizacija (trim, lower)
+    df.columns = [c.strip() for c in df.columns]
+    lower_map = {c: c.lower() for c in df.columns}
+    df.rename(columns=lower_map, inplace=True)
+
+    # aliasi
+    rename_map = {
+        "date time": "datetime",
+        "timestamp": "datetime",
+        "time": "datetime",
+        "city": "name",
+        "location": "name",
+    }
+    for src, dst in rename_map.items():
+        if src in df.columns and dst not in df.columns:
+            df.rename(columns={src: dst}, inplace=True)
+
+    # validacija obaveznih
+    required = ["datetime", "name"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}. Seen columns={list(df.columns)}")
+
+    # čišćenje
+    before_rows = len(df)
+    progress(rows_parsed=before_rows)
+    df = df.dropna(subset=["datetime", "name"]).copy()
+    df["name"] = df["name"].astype(str).str.strip()
+
+    # u lokalno NY pa u UTC (aware)
+    try:
+        with timer.stage("localize"):
+            dt_utc = to_utc_series_localized(df["datetime"])
+    except Exception as e:
+        raise ValueError(f"Timezone localization error: {e}")
+    df = df.loc[dt_utc.index].copy()
+    df["ts_utc"] = dt_utc
+    df["ts_hour_utc"] = utc_floor_hour(df["ts_utc"])
+
+    # kolone koje NE tretiramo kao numeriku
+    exclude_cols = {"datetime", "name", "ts_utc", "ts_hour_utc", "preciptype", "conditions"}
+    candidate_cols = [c for c in df.columns if c not in exclude_cols]
+
+    # numeričke kolone kroz coercion
+    numeric_cols = []
+    with timer.stage("clean"):
+        for c in candidate_cols:
+            coerced = pd.to_numeric(df[c], errors="coerce")
+            if coerced.notna().any():
+                df[c] = coerced
+                numeric_cols.append(c)
+
+    if not numeric_cols:
+        raise ValueError("No numeric columns detected (after coercion)")
+
+    # agregacija mean po satu i lokaciji
+    agg = {c: "mean" for c in numeric_cols}
+    with timer.stage("aggregate"):
+        g = (
+            df.groupby(["name", "ts_hour_utc"])
+              .agg(agg)
+              .reset_index()
+              .rename(columns={"name": "location", "ts_hour_utc": "ts"})
+        )
+
+    if g.empty:
+        raise ValueError("No usable rows after cleaning/grouping")
+
+    # deduplikacija
+    g = g.drop_duplicates(subset=["location", "ts"])
+
+    # diff + bulk upsert (kolonski; NaN vrijednosti se ne upisuju u dokument)
+    try:
+        stats = write_hourly(
+            series_collection(db, "weather"), g, "location", numeric_cols,
+            diff=opts["diff"], write_opts=_write_opts(opts), timer=timer
+        )
+    except Exception as e:
+        raise ValueError(f"Mongo bulk_write error: {e}")
+    progress(rows_written=int(g.shape[0]))
+
+    locations = sorted(g["location"].unique().tolist())
+    ts_min, ts_max = aware_to_naive_utc(g["ts"].min()), aware_to_naive_utc(g["ts"].max())
+    ledger_record(db, "weather", digest, filename, locations,
+                  ts_min.to_pydatetime(), ts_max.to_pydatetime(), write_counts(stats))
+
+    return {
+        "file": filename,
+        "locations": locations,
+        "rows_input": int(before_rows),
+        "rows_hourly": int(g.shape[0]),
+        "ts_range": {"from": ts_min.isoformat(), "to": ts_max.isoformat()},
+        **write_counts(stats),
+        "detected_numeric_columns": numeric_cols,
+        "all_columns_seen": list(df.columns),
+        "timings_ms": timer.as_dict(),
+    }
+
+
+PIPELINES = {"load": import_load_file, "weather": import_weather_file}
@@ -0,0 +1,176 @@
+# streaming.py
+# Streaming import LOAD CSV-a sa ograničenom memorijom:
+# - CSV se čita u chunk-ovima (read_csv(chunksize=...), C parser, eksplicitni dtype-ovi)
+# - svaki chunk se lokalizuje (NY → UTC) i agregira u parcijalne sume/brojače po (Name, sat)
+# - završeni sati se odmah upisuju u Mongo (flush), pa u memoriji nikad nije cijeli fajl
+#
+# NYISO pal fajlovi su hronološki sortirani, pa su zakašnjeli redovi izuzetak: red koji stigne za sat
+# koji je već upisan (late_rows) se dodaje u sačuvane parcijalne sume tog sata (sum/count po regionu
+# i satu, ~1/12 ulaznih redova), prosjek se ponovo računa i sat se ponovo upisuje kroz diff upsert
+# (late_hours = broj tako ispravljenih sati).
+
+import pandas as pd
+
+from config import Config
+from .tz import localize_to_utc, parse_nyiso_timestamps, utc_floor_hour, aware_to_naive_utc
+from .writer import write_hourly
+
+# Čitamo samo kolone koje koristimo; tekstualne kolone eksplicitno kao str
+# (bez tip-guessanja po chunk-u), Load ide kroz brzi C numerički parser.
+# "Time Zone" (EST/EDT) je opciona — ako postoji, UTC offset se čita direktno iz nje.
+LOAD_USECOLS = ["Time Stamp", "Name", "Load"]
+LOAD_DTYPES = {"Time Stamp": str, "Time Zone": str, "Name": str}
+
+
+class StreamingLoadImport:
+    """
+    Stanje jednog streaming importa:
+      - carry: redovi posljednjeg (možda nepotpunog) lokalnog dana iz prethodnog chunk-a
+      - watermark: najkasniji UTC sat koji je već upisan u Mongo
+      - flushed: (region, sat) → (sum, count) upisanih sati, za ponovnu agregaciju zakašnjelih redova
+      - brojači za povratnu informaciju (rows_input, rows_hourly, upserts, ...)
+    """
+    def __init__(self, coll, timer, write_opts=None, diff=True, progress=None):
+        self.coll = coll
+        self.timer = timer
+        self.write_opts = write_opts or {}
+        self.diff = diff
+        # opcioni callback progress(rows_parsed=..., rows_written=...) — kumulativni brojači
+        self.progress = progress
+        self.carry = None
+        self.watermark = None
+        self.flushed = {}
+        self.regions = set()
+        self.ts_min = None
+        self.ts_max = None
+        self.stats = {"chunks": 0, "rows_input": 0, "rows_hourly": 0, "late_rows": 0, "late_hours": 0,
+                      "upserts": 0, "modified": 0, "batches": 0,
+                      "inserted": 0, "updated": 0, "unchanged": 0}
+
+    def feed(self, chunk: pd.DataFrame):
+        """Obradi jedan CSV chunk: čišćenje → carry-over lokalnog dana → agregacija → flush."""
+        self.stats["chunks"] += 1
+        self.stats["rows_input"] += len(chunk)
+        if self.progress:
+            self.progress(rows_parsed=self.stats["rows_input"])
+
+        with self.timer.stage("clean"):
+            chunk = chunk.dropna(subset=LOAD_USECOLS)
+            chunk = chunk.assign(
+                Load=pd.to_numeric(chunk["Load"], errors="coerce"),
+                local=parse_nyiso_timestamps(chunk["Time Stamp"]),
+            ).dropna(subset=["Load", "local"])
+
+        if self.carry is not None:
+            chunk = pd.concat([self.carry, chunk], ignore_index=True)
+            self.carry = None
+        if chunk.empty:
+            return
+
+        # Posljednji lokalni dan u chunk-u možda nije kompletan → prenosi se u sljedeći chunk.
+        # Lokalizacija (ambiguous="infer") tako uvijek vidi cijeli dan, pa i DST prelaz.
+        # Lokalna ponoć je uvijek i granica UTC sata, pa su svi sati prije nje završeni.
+        last_day = chunk["local"].max().normalize()
+        tail = chunk["local"] >= last_day
+        self.carry = chunk[tail]
+        if tail.all():
+            return  # cijeli chunk je unutar istog dana → čekamo ostatak dana
+
+        self._aggregate_and_flush(chunk[~tail])
+
+    def finish(self):
+        """Kraj fajla: obradi preostali (prenešeni) dio."""
+        if self.carry is not None and not self.carry.empty:
+            chunk, self.carry = self.carry, None
+            self._aggregate_and_flush(chunk)
+
+    def _aggregate_and_flush(self, chunk):
+        with self.timer.stage("localize"):
+            ts_utc = localize_to_utc(chunk, "local")
+
+        with self.timer.stage("aggregate"):
+            part = chunk.loc[ts_utc.index, ["Name", "Load"]]
+            part = part.assign(ts=utc_floor_hour(ts_utc))
+            g = (
+                part.groupby(["Name", "ts"])["Load"]
+                    .agg(["sum", "count"])
+                    .reset_index()
+                    .rename(columns={"Name": "region"})
+            )
+
+            # sati već upisani u ranijem flush-u (nesortiran ulaz): parcijalne sume se spajaju sa
+            # sačuvanim, pa sat dobija prosjek SVIH svojih redova (diff upis ga ažurira)
+            if self.watermark is not None:
+                late = (g["ts"] <= self.watermark).to_numpy()
+                if late.any():
+                    self.stats["late_rows"] += int(g.loc[late, "count"].sum())
+                    prev = [self.flushed.get(k) for k in zip(g.loc[late, "region"], g.loc[late, "ts"])]
+                    g.loc[late, "sum"] += [p[0] if p else 0.0 for p in prev]
+                    g.loc[late, "count"] += [p[1] if p else 0 for p in prev]
+                    self.stats["late_hours"] += sum(p is not None for p in prev)
+            if g.empty:
+                return
+
+            g["load_mw"] = g["sum"] / g["count"]
+
+        res = write_hourly(self.coll, g, "region", ["load_mw"],
+                           diff=self.diff, write_opts=self.write_opts, timer=self.timer)
+
+        for k in ("upserts", "modified", "batches", "inserted", "updated", "unchanged"):
+            self.stats[k] += res[k]
+        self.flushed.update(zip(zip(g["region"], g["ts"]), zip(g["sum"].tolist(), g["count"].tolist())))
+        self.stats["rows_hourly"] += int(g.shape[0])
+        if self.progress:
+            self.progress(rows_written=self.stats["rows_hourly"])
+        self.regions.update(g["region"].unique().tolist())
+
+        lo, hi = g["ts"].min(), g["ts"].max()
+        self.ts_min = lo if self.ts_min is None else min(self.ts_min, lo)
+        self.ts_max = hi if self.ts_max is None else max(self.ts_max, hi)
+        self.watermark = self.ts_max
+
+    def summary(self):
+        out = dict(self.stats)
+        out["regions"] = sorted(self.regions)
+        out["ts_range"] = None
+        if self.ts_min is not None:
+            out["ts_range"] = {
+                "from": aware_to_naive_utc(self.ts_min).isoformat(),
+                "to": aware_to_naive_utc(self.ts_max).isoformat(),
+            }
+        return out
+
+
+def stream_load_csv(fileobj, coll, timer, chunk_rows=None, write_opts=None, diff=True, progress=None):
+    """
+    Streaming import LOAD CSV-a (5-min → satni prosjek) u kolekciju `coll`.
+    Memorija je ograničena veličinom chunk-a + jednim lokalnim danom (carry-over)
+    + satnim parcijalnim sumama upisanih sati (za zakašnjele redove).
+    progress: opcioni callback koji se zove poslije svakog chunk-a / flush-a.
+    Baca ValueError ako nedostaju obavezne kolone.
+    Vraća sažetak (dict) za JSON odgovor.
+    """
+    chunk_rows = max(1, int(chunk_rows or Config.IMPORT_CHUNK_ROWS))
+    job = StreamingLoadImport(coll, timer, write_opts, diff=diff, progress=progress)
+
+    reader = pd.read_csv(
+        fileobj,
+        usecols=lambda c: c in LOAD_USECOLS or c == "Time Zone",
+        dtype=LOAD_DTYPES,
+        engine="c",
+        chunksize=chunk_rows,
+    )
+
+    while True:
+        with timer.stage("parse"):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        if job.stats["chunks"] == 0:
+            missing = [c for c in LOAD_USECOLS if c not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing columns: {missing}")
+        job.feed(chunk)
+    job.finish()
+
+    return job.summary()
@@ -0,0 +1,320 @@
+# writer.py
+# Kolonski (vektorizovani) write engine za satne serije:
+# - StageTimer: mjerenje trajanja faza importa (parse / aggregate / write ...)
+# - frame_to_upserts: satni DataFrame → lista UpdateOne (bez iterrows i per-row pd.to_datetime)
+# - bulk_upsert: slanje operacija u batch-evima ograničene veličine, opciono kroz više niti
+# - diff_against_existing / write_hourly: upis samo novih i promijenjenih satnih vrijednosti
+# - write_timeseries: isti ugovor za MongoDB time-series kolekcije (insert + zamjena, bez upsert-a)
+#   (bucket format po danu: storage/buckets.py → write_buckets)
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from config import Config
+# storage moduli sa post-write hook-ovima se registruju pri importu (storage.writehooks)
+from storage import catalog, gaps, partitions, windowcache  # noqa: F401
+from storage.buckets import write_buckets
+from storage.series import is_bucketed, is_timeseries
+from storage.writehooks import run_write_hooks
+
+
+class StageTimer:
+    """
+    Mjeri trajanje imenovanih faza (u milisekundama).
+    Upotreba:
+        timer = StageTimer()
+        with timer.stage("parse"):
+            ...
+        timer.as_dict()  → {"parse": 12.3, ..., "total": 45.6}
+    """
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            # ista faza se može pojaviti više puta (npr. write po chunk-u) → sabiramo
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - t) * 1000.0
+
+    def as_dict(self):
+        out = {k: round(v, 2) for k, v in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self._t0) * 1000.0, 2)
+        return out
+
+
+def naive_utc_datetimes(ts: pd.Series) -> np.ndarray:
+    """
+    Vektorizovano: serija timestampova (aware ili naive UTC) → niz Python datetime-a
+    u NAIVE UTC (Mongo konvencija). Jedna konverzija za cijelu kolonu umjesto po redu.
+    """
+    ts = pd.to_datetime(ts)
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    # datetime64[us] → object daje datetime.datetime (BSON zna da ih serijalizuje)
+    return ts.to_numpy(dtype="datetime64[us]").astype(object)
+
+
+def frame_to_docs(g: pd.DataFrame, key_field: str, value_cols, skip_nan=True):
+    """
+    Satni DataFrame (kolone: key_field, ts, value_cols...) → lista dokumenata {key_field, ts, vrijednosti}.
+    - ts se konvertuje u NAIVE UTC jednom za cijelu kolonu
+    - vrijednosti se pretvaraju u float kolonski (to_numpy), a ne kroz row[c]
+    - skip_nan=True: NaN vrijednosti se ne upisuju (isto ponašanje kao ranije za weather)
+    """
+    if g.empty:
+        return []
+
+    keys = g[key_field].astype(str).to_numpy(dtype=object)
+    ts = naive_utc_datetimes(g["ts"])
+    vals = g[list(value_cols)].to_numpy(dtype=float)
+    cols = list(value_cols)
+
+    docs = []
+    if not skip_nan or not np.isnan(vals).any():
+        # brza grana: nema NaN → svaki dokument ima sve kolone
+        for k, t, row in zip(keys, ts, vals.tolist()):
+            doc = {key_field: k, "ts": t}
+            doc.update(zip(cols, row))
+            docs.append(doc)
+        return docs
+
+    notna = ~np.isnan(vals)
+    for k, t, row, m in zip(keys, ts, vals.tolist(), notna.tolist()):
+        doc = {key_field: k, "ts": t}
+        doc.update((c, v) for c, v, ok in zip(cols, row, m) if ok)
+        docs.append(doc)
+    return docs
+
+
+def frame_to_upserts(g: pd.DataFrame, key_field: str, value_cols, skip_nan=True):
+    """Satni DataFrame → lista UpdateOne(upsert=True) po ključu (key_field, ts)."""
+    return [
+        UpdateOne({key_field: d[key_field], "ts": d["ts"]}, {"$set": d}, upsert=True)
+        for d in frame_to_docs(g, key_field, value_cols, skip_nan)
+    ]
+
+
+def _batches(ops, batch_size):
+    for i in range(0, len(ops), batch_size):
+        yield ops[i:i + batch_size]
+
+
+def bulk_upsert(coll, ops, batch_size=None, workers=None):
+    """
+    Izvrši operacije kroz bulk_write u batch-evima od najviše `batch_size` operacija.
+    - workers > 1 → batch-evi se šalju paralelno iz ThreadPoolExecutor-a
+      (pymongo klijent je thread-safe i ima connection pool)
+    - ordered=False: server ne staje na prvoj grešci i može paralelizovati upis
+    Vraća sumarne brojače: {"batches", "upserts", "modified", "matched"}.
+    """
+    batch_size = max(1, int(batch_size or Config.IMPORT_BATCH_SIZE))
+    workers = max(1, int(workers or Config.IMPORT_WRITE_WORKERS))
+
+    stats = {"batches": 0, "upserts": 0, "modified": 0, "matched": 0}
+    if not ops:
+        return stats
+
+    def _write(batch):
+        return coll.bulk_write(batch, ordered=False)
+
+    batches = list(_batches(ops, batch_size))
+    if workers == 1 or len(batches) == 1:
+        results = [_write(b) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as ex:
+            results = list(ex.map(_write, batches))
+
+    for res in results:
+        stats["batches"] += 1
+        stats["upserts"] += res.upserted_count
+        stats["modified"] += res.modified_count
+        stats["matched"] += res.matched_count
+    return stats
+
+
+def diff_against_existing(coll, g: pd.DataFrame, key_field: str, value_cols, mark_new=False):
+    """
+    Poredi novi satni frame sa onim što je već u kolekciji, jednim opsežnim upitom:
+      {key_field: {$in: ključevi}, ts: {$gte: min, $lte: max}}
+    Vraća (g_za_upis, brojači) gdje g_za_upis sadrži samo:
+      - nove (region/location, ts) parove → "inserted"
+      - postojeće parove kod kojih se bar jedna vrijednost promijenila → "updated"
+    Nepromijenjeni redovi ("unchanged") se ne šalju u bazu.
+    NaN u novom frame-u se ne upisuje (frame_to_upserts ga preskače), pa ni ne računa kao promjena.
+    mark_new=True: g_za_upis dobija bool kolonu "_new" (novi par vs promijenjen postojeći).
+    """
+    cols = list(value_cols)
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if g.empty:
+        return g, counts
+
+    g = g.copy()
+    g["_ts"] = pd.to_datetime(naive_utc_datetimes(g["ts"]))
+
+    keys = sorted(g[key_field].astype(str).unique().tolist())
+    q = {
+        key_field: {"$in": keys},
+        "ts": {"$gte": g["_ts"].min().to_pydatetime(), "$lte": g["_ts"].max().to_pydatetime()},
+    }
+    proj = {"_id": 0, key_field: 1, "ts": 1, **{c: 1 for c in cols}}
+    old = pd.DataFrame(list(coll.find(q, proj)))
+
+    if old.empty:
+        counts["inserted"] = int(g.shape[0])
+        g = g.drop(columns=["_ts"])
+        if mark_new:
+            g["_new"] = True
+        return g, counts
+
+    old = old.rename(columns={"ts": "_ts", **{c: f"{c}__old" for c in cols}})
+    old["_ts"] = pd.to_datetime(old["_ts"])
+    old = old.drop_duplicates(subset=[key_field, "_ts"])
+    for c in cols:
+        if f"{c}__old" not in old.columns:
+            old[f"{c}__old"] = np.nan
+
+    # left merge čuva redoslijed i dužinu g (ključevi su jedinstveni s obje strane)
+    m = g.merge(old, how="left", on=[key_field, "_ts"], indicator=True)
+    is_new = (m["_merge"] == "left_only").to_numpy()
+
+    new_vals = m[cols].to_numpy(dtype=float)
+    old_vals = m[[f"{c}__old" for c in cols]].to_numpy(dtype=float)
+    # promjena: nova vrijednost postoji i (stara ne postoji ili se razlikuje)
+    changed = (~np.isnan(new_vals) & (np.isnan(old_vals) | (new_vals != old_vals))).any(axis=1)
+    changed &= ~is_new
+
+    counts["inserted"] = int(is_new.sum())
+    counts["updated"] = int(changed.sum())
+    counts["unchanged"] = int(len(m) - counts["inserted"] - counts["updated"])
+
+    keep = is_new | changed
+    out = g[keep].drop(columns=["_ts"])
+    if mark_new:
+        out["_new"] = is_new[keep]
+    return out, counts
+
+
+def _delete_pairs(coll, g: pd.DataFrame, key_field: str):
+    """Obriši postojeće (key_field, ts) parove iz frame-a: jedan delete_many po ključu."""
+    deleted = 0
+    ts = pd.Series(naive_utc_datetimes(g["ts"]), index=g.index)
+    for k, idx in g.groupby(key_field).groups.items():
+        res = coll.delete_many({key_field: str(k), "ts": {"$in": ts.loc[idx].tolist()}})
+        deleted += res.deleted_count
+    return deleted
+
+
+def write_timeseries(coll, g: pd.DataFrame, key_field: str, value_cols, diff=True, write_opts=None, timer=None):
+    """
+    Upis u MongoDB time-series kolekciju (upsert nije podržan):
+      - novi (key, ts) parovi → insert_many u batch-evima
+      - promijenjeni parovi → postojeći dokumenti se čitaju, spajaju sa novim vrijednostima
+        (kolone kojih nema u novom frame-u ostaju sačuvane), brišu i ponovo upisuju
+      - diff=False: svi parovi iz frame-a se tretiraju kao promijenjeni
+    Brojači su isti kao kod write_hourly (upserts = broj upisanih dokumenata).
+    """
+    timer = timer or StageTimer()
+    batch_size = max(1, int((write_opts or {}).get("batch_size") or Config.IMPORT_BATCH_SIZE))
+    cols = list(value_cols)
+
+    with timer.stage("diff"):
+        if diff:
+            g, counts = diff_against_existing(coll, g, key_field, cols, mark_new=True)
+        else:
+            g = g.copy()
+            g["_new"] = False
+            counts = {"inserted": 0, "updated": int(g.shape[0]), "unchanged": 0}
+
+    new, changed = g[g["_new"]], g[~g["_new"]]
+    replaced = 0
+    if not changed.empty:
+        with timer.stage("replace"):
+            ts = naive_utc_datetimes(changed["ts"])
+            q = {key_field: {"$in": sorted(changed[key_field].astype(str).unique().tolist())},
+                 "ts": {"$gte": ts.min(), "$lte": ts.max()}}
+            old = pd.DataFrame(list(coll.find(q, {"_id": 0})))
+            if not old.empty:
+                old["ts"] = pd.to_datetime(old["ts"])
+                cur = changed.assign(ts=pd.to_datetime(ts)).set_index([key_field, "ts"])
+                old = old.drop_duplicates(subset=[key_field, "ts"]).set_index([key_field, "ts"])
+                merged = cur[cols].combine_first(old.reindex(cur.index))
+                extra = [c for c in merged.columns if c not in cols]
+                changed = merged.reset_index()
+                cols_changed = cols + extra
+            else:
+                cols_changed = cols
+            replaced = _delete_pairs(coll, changed, key_field)
+    else:
+        cols_changed = cols
+
+    with timer.stage("build_ops"):
+        docs = frame_to_docs(new, key_field, cols) + frame_to_docs(changed, key_field, cols_changed)
+
+    stats = {"batches": 0, "upserts": 0, "modified": 0, "matched": 0}
+    with timer.stage("write"):
+        for batch in _batches(docs, batch_size):
+            res = coll.insert_many(batch, ordered=False)
+            stats["batches"] += 1
+            stats["upserts"] += len(res.inserted_ids)
+    stats["modified"] = replaced
+    stats["matched"] = replaced
+    stats.update(counts)
+    return stats
+
+
+def _after_write(coll, key_field, g, timer, inserted=None):
+    """Metapodaci nakon upisa frame-a g: registrovani post-write hook-ovi (keš-evi, katalog, indeks rupa)."""
+    run_write_hooks(coll, key_field, g, timer, inserted)
+
+
+def write_hourly(coll, g: pd.DataFrame, key_field: str, value_cols, diff=True, write_opts=None, timer=None):
+    """
+    Jedinstvena tačka upisa satnog frame-a (koriste je sve import rute);
+    za time-series / bucket kolekcije (storage.series) prosljeđuje na write_timeseries / write_buckets:
+      1) (opciono) diff prema postojećim vrijednostima → samo novi i promijenjeni redovi
+      2) kolonska izgradnja UpdateOne operacija
+      3) batch-ovani (opciono paralelni) bulk_write
+      4) post-write hook-ovi (storage.writehooks): invalidacija verzija particija, LRU prozora i
+         feature matrica, katalog pokrivenosti i indeks run-ova / rupa po ključu
+    Vraća brojače: upserts/modified/batches + inserted/updated/unchanged.
+    """
+    timer = timer or StageTimer()
+    if is_timeseries(coll) or is_bucketed(coll):
+        write = write_timeseries if is_timeseries(coll) else write_buckets
+        stats = write(coll, g, key_field, value_cols, diff=diff, write_opts=write_opts, timer=timer)
+        if stats["inserted"] or stats["updated"]:
+            # ovi putevi ne vraćaju tačan skup promijenjenih sati → metapodaci za cijeli frame
+            _after_write(coll, key_field, g, timer)
+        return stats
+
+    counts = None
+    if diff:
+        with timer.stage("diff"):
+            g, counts = diff_against_existing(coll, g, key_field, value_cols, mark_new=True)
+
+    with timer.stage("build_ops"):
+        ops = frame_to_upserts(g, key_field, value_cols)
+    with timer.stage("write"):
+        stats = bulk_upsert(coll, ops, **(write_opts or {}))
+    # diff zna tačan broj novih sati po ključu → $inc u katalogu; bez diff-a katalog prebrojava te ključeve
+    inserted = g.groupby(key_field)["_new"].sum().to_dict() if "_new" in g.columns else None
+    _after_write(coll, key_field, g, timer, inserted)
+
+    if counts is None:
+        # bez diff-a brojače izvodimo iz odgovora servera
+        counts = {
+            "inserted": stats["upserts"],
+            "updated": stats["modified"],
+            "unchanged": stats["matched"] - stats["modified"],
+        }
+    stats.update(counts)
+    return stats
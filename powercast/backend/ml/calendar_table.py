@@ -0,0 +1,102 @@
+# calendar_table.py
+# Prekomputirana satna tabela NY lokalnog kalendara za build_feature_frame / join_holidays.
+#
+# Red i = sat (1. januar CALENDAR_YEAR_FROM 00:00 UTC) + i h, za sve godine [YEAR_FROM, YEAR_TO]:
+#   hour, dow, month, is_weekend, sin_hour, cos_hour, sin_dow, cos_dow, day (NY lokalni datum)
+#
+# Feature-i za satni 'ts' (NAIVE UTC) su onda samo gather po cjelobrojnom offsetu
+# (ts - početak) // 1h — bez tz konverzije po pozivu. Tabela se gradi jednom po procesu
+# (~9k redova po godini); satovi van opsega (ili NaT) računaju se direktno, istom funkcijom.
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from ingest.tz import NY_TZ
+
+# redoslijed kao u build_feature_frame
+CAL_COLS = ["hour", "dow", "month", "is_weekend", "sin_hour", "cos_hour", "sin_dow", "cos_dow"]
+_HOUR_NS = 3_600_000_000_000
+
+_lock = threading.Lock()
+_table = None  # (početak kao int64 ns, {kolona: niz})
+
+
+def _calendar_arrays(utc_index):
+    """Aware UTC DatetimeIndex → NY lokalne i ciklične kolone + lokalni dan (ista logika kao ranije po pozivu)."""
+    local = utc_index.tz_convert(NY_TZ)
+    hour = local.hour.to_numpy()
+    dow = local.dayofweek.to_numpy()
+    return {
+        "hour": hour,
+        "dow": dow,
+        "month": local.month.to_numpy(),
+        "is_weekend": (dow >= 5).astype(int),
+        "sin_hour": np.sin(2 * np.pi * hour / 24),
+        "cos_hour": np.cos(2 * np.pi * hour / 24),
+        "sin_dow": np.sin(2 * np.pi * dow / 7),
+        "cos_dow": np.cos(2 * np.pi * dow / 7),
+        "day": local.tz_localize(None).floor("D").to_numpy().astype("datetime64[D]"),
+    }
+
+
+def calendar_table():
+    """(početak int64 ns, kolone) — gradi se pri prvom pozivu za Config.CALENDAR_YEAR_FROM..YEAR_TO."""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                start = pd.Timestamp(f"{Config.CALENDAR_YEAR_FROM}-01-01", tz="UTC")
+                end = pd.Timestamp(f"{Config.CALENDAR_YEAR_TO + 1}-01-01", tz="UTC")
+                idx = pd.date_range(start, end, freq="h", inclusive="left")
+                _table = (start.value, _calendar_arrays(idx))
+    return _table
+
+
+def _offsets(ts):
+    """'ts' (naive UTC ili aware) → (NAIVE UTC ns kao int64, offset u tabeli, maska redova u tabeli)."""
+    s = pd.to_datetime(pd.Series(np.asarray(ts)) if not isinstance(ts, pd.Series) else ts, utc=True, errors="coerce")
+    ns = s.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view("i8")
+    start, cols = calendar_table()
+    off = (ns - start) // _HOUR_NS
+    ok = (~s.isna().to_numpy()) & (off >= 0) & (off < cols["hour"].shape[0])
+    return ns, np.where(ok, off, 0), ok
+
+
+def _fill_missing(out, ns, ok, names):
+    """Redovi van tabele: direktna konverzija; NaT → NaN (NaT za 'day', 0 za is_weekend)."""
+    bad = np.flatnonzero(~ok)
+    nat = ns[bad] == np.iinfo(np.int64).min
+    far = bad[~nat]
+    if far.size:
+        direct = _calendar_arrays(pd.DatetimeIndex(ns[far].view("datetime64[ns]"), tz="UTC"))
+        for c in names:
+            out[c][far] = direct[c]
+    if nat.any():
+        for c in names:
+            if c == "day":
+                out[c][bad[nat]] = np.datetime64("NaT")
+            elif c == "is_weekend":
+                out[c][bad[nat]] = 0  # (NaN >= 5) → 0, kao ranije
+            else:
+                out[c] = out[c].astype(float)
+                out[c][bad[nat]] = np.nan
+    return out
+
+
+def calendar_features(ts):
+    """Kolone CAL_COLS za satne 'ts' (poravnate po poziciji) — gather iz tabele."""
+    ns, off, ok = _offsets(ts)
+    _, cols = calendar_table()
+    out = {c: cols[c][off] for c in CAL_COLS}
+    return out if ok.all() else _fill_missing(out, ns, ok, CAL_COLS)
+
+
+def local_days(ts):
+    """NY lokalni datum (datetime64[D]) za svaki 'ts' — za praznične feature-e."""
+    ns, off, ok = _offsets(ts)
+    _, cols = calendar_table()
+    out = {"day": cols["day"][off]}
+    return (out if ok.all() else _fill_missing(out, ns, ok, ["day"]))["day"]
@@ -0,0 +1,139 @@
+# context.py
+# Zajednički (read-only) ulazi feature-a za više regiona u jednom trening job-u:
+#   - meteo serija proxy lokacije (svi regioni koriste istu, npr. "New York City, NY")
+#   - kalendar praznika regiona praznika (sortirani NY lokalni dani)
+#   - kalendarske kolone (ml.calendar_table) na satnoj mreži opsega job-a
+#
+# Bez konteksta svaki region ponovo čita isti meteo opseg i ponovo radi join praznika/kalendara;
+# sa kontekstom se sve to učita JEDNOM po job-u (lijeno, tek kad zatreba), a regioni samo sijeku.
+# Za procesni pool (paralelni trening) kontekst se snima u folder kao .npy i workeri ga otvaraju
+# preko np.load(mmap_mode="r") — jedna kopija u page cache-u, bez kopije po procesu.
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage.catalog import catalog_entries
+from storage.featurestore import read_series_cached
+from storage.series import collection_name, series_frame
+from .calendar_table import CAL_COLS, calendar_features, local_days
+from .features import WEATHER_COLS, holiday_days
+
+_HOUR = np.timedelta64(1, "h")
+_META = "context.json"
+
+
+class FeatureContext:
+    """
+    Lijeno učitan dijeljeni kontekst za [ts_from, ts_to] (NAIVE UTC, uključivo).
+    Upiti van opsega (ili za drugu lokaciju / region praznika) idu direktno na izvor, kao bez konteksta.
+    """
+
+    def __init__(self, db, ts_from, ts_to, location, holiday_region="US"):
+        self.db = db
+        self.ts_from = pd.Timestamp(ts_from).floor("h")
+        self.ts_to = pd.Timestamp(ts_to).ceil("h")
+        self.location = location
+        self.holiday_region = holiday_region
+        self._weather = None   # (ts datetime64[ns], {kolona: float64})
+        self._holidays = None  # datetime64[D], sortirano
+        self._calendar = None  # {kolona: niz} na satnoj mreži od ts_from
+
+    @classmethod
+    def for_regions(cls, db, regions, date_from, date_to, location, holiday_region="US"):
+        """Opseg = opseg job-a ∪ pokrivenost load serija regiona (feature matrica računa cijelu seriju)."""
+        lo, hi = pd.Timestamp(date_from), pd.Timestamp(date_to)
+        for e in catalog_entries(db, collection_name("load"), regions):
+            if e.get("from") is not None:
+                lo, hi = min(lo, pd.Timestamp(e["from"])), max(hi, pd.Timestamp(e["to"]))
+        return cls(db, lo, hi, location, holiday_region)
+
+    def covers(self, lo, hi):
+        return self.ts_from <= pd.Timestamp(lo) and pd.Timestamp(hi) <= self.ts_to
+
+    # ---------- meteo ----------
+
+    def weather(self, location, lo, hi, fields):
+        """Kao read_series_cached(db, "weather", location, lo, hi, fields) — presjek učitanog opsega."""
+        if location != self.location or not self.covers(lo, hi) or not set(fields) <= set(WEATHER_COLS):
+            return read_series_cached(self.db, "weather", location, lo, hi, list(fields))
+        if self._weather is None:
+            w = read_series_cached(self.db, "weather", self.location, self.ts_from, self.ts_to, WEATHER_COLS)
+            self._weather = (w["ts"].to_numpy(dtype="datetime64[ns]"),
+                             {c: (w[c].to_numpy(dtype=np.float64) if c in w.columns else np.full(len(w), np.nan))
+                              for c in WEATHER_COLS})
+        ts, cols = self._weather
+        a, b = np.searchsorted(ts, np.datetime64(pd.Timestamp(lo), "ns")), \
+            np.searchsorted(ts, np.datetime64(pd.Timestamp(hi), "ns"), side="right")
+        return series_frame(ts[a:b], {c: cols[c][a:b] for c in fields})
+
+    # ---------- praznici ----------
+
+    def holidays(self, holiday_region):
+        """Sortirani NY lokalni dani praznika (None za drugi region → pozivalac čita sam)."""
+        if holiday_region != self.holiday_region:
+            return None
+        if self._holidays is None:
+            self._holidays = holiday_days(self.db, holiday_region)
+        return self._holidays
+
+    # ---------- kalendar ----------
+
+    def _grid(self):
+        if self._calendar is None:
+            grid = pd.Series(pd.date_range(self.ts_from, self.ts_to, freq="h"))
+            self._calendar = {**calendar_features(grid), "day": local_days(grid)}
+        return self._calendar
+
+    def _offsets(self, ts):
+        ts = np.asarray(pd.to_datetime(ts).to_numpy(), dtype="datetime64[ns]")
+        off = (ts - np.datetime64(self.ts_from, "ns")) // _HOUR
+        cal = self._grid()
+        ok = (off >= 0) & (off < cal["hour"].shape[0]) & ((ts - ts.astype("datetime64[h]")) == np.timedelta64(0))
+        return off, bool(ok.all())
+
+    def calendar(self, ts):
+        """Kolone CAL_COLS za satne ts (gather sa mreže konteksta; van mreže → calendar_features)."""
+        off, ok = self._offsets(ts)
+        if not ok:
+            return calendar_features(ts)
+        cal = self._grid()
+        return {c: cal[c][off] for c in CAL_COLS}
+
+    def local_days(self, ts):
+        off, ok = self._offsets(ts)
+        return self._grid()["day"][off] if ok else local_days(ts)
+
+    # ---------- dijeljenje sa procesima pool-a ----------
+
+    def save(self, path):
+        """Materijalizuj (učitaj sve) i snimi u folder kao .npy + meta JSON."""
+        os.makedirs(path, exist_ok=True)
+        self.weather(self.location, self.ts_from, self.ts_to, WEATHER_COLS)
+        ts, cols = self._weather
+        np.save(os.path.join(path, "weather_ts.npy"), ts.view("<i8"))
+        for c, v in cols.items():
+            np.save(os.path.join(path, f"weather_{c}.npy"), v)
+        np.save(os.path.join(path, "holidays.npy"), self.holidays(self.holiday_region).view("<i8"))
+        for c, v in self._grid().items():
+            np.save(os.path.join(path, f"cal_{c}.npy"), v.view("<i8") if c == "day" else v)
+        with open(os.path.join(path, _META), "w", encoding="utf-8") as f:
+            json.dump({"ts_from": self.ts_from.isoformat(), "ts_to": self.ts_to.isoformat(),
+                       "location": self.location, "holiday_region": self.holiday_region,
+                       "calendar": list(self._calendar)}, f)
+        return path
+
+    @classmethod
+    def open(cls, path, db):
+        """Kontekst iz foldera (save) — nizovi su read-only memmap-ovi; db služi samo za upite van opsega."""
+        with open(os.path.join(path, _META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ctx = cls(db, meta["ts_from"], meta["ts_to"], meta["location"], meta["holiday_region"])
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        ctx._weather = (load("weather_ts").view("datetime64[ns]"), {c: load(f"weather_{c}") for c in WEATHER_COLS})
+        ctx._holidays = load("holidays").view("datetime64[D]")
+        ctx._calendar = {c: (load(f"cal_{c}").view("datetime64[D]") if c == "day" else load(f"cal_{c}"))
+                         for c in meta["calendar"]}
+        return ctx
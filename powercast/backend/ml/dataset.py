@@ -1,5 +1,7 @@
 import numpy as np
+import torch
 from datetime import timedelta
+from torch.utils.data import Dataset
 
 # Kreira "sliding window" sekvence za trening/validaciju vremenskog niza.
 # Ulazi (svi poravnati po istom indeksu i dužine N):
@@ -38,3 +40,62 @@ def build_sequences(times, values, feats, input_window, horizon):
         T.append(times[i:i + horizon])
 
     return np.array(X), np.array(Xf), np.array(Y), T
+
+
+# ---------- Zero-copy sliding window dataset (trening) ----------
+# build_sequences materijalizuje svaki prozor: (N, T, F) float64 kopija istih redova ~T puta.
+# SlidingWindowDataset drži JEDNU kontinualnu float32 matricu (N, 1+F) = [target | feature-i]
+# i target (N,); uzorak k je pogled [k, k+T) na matricu i [k+T, k+T+H) na target
+# (isti raspored kao build_sequences: uzorak k ↔ i = k + input_window). Memorija je O(N·F);
+# kopira se samo batch koji DataLoader složi.
+
+class SlidingWindowDataset(Dataset):
+    """
+    Ulazi:
+      - values: (N,) target (već skaliran)
+      - feats : (N, F) feature-i po satu
+      - starts: indeksi uzoraka k (npr. np.flatnonzero(sample_mask) i njegov train/val/test dio);
+                None → svi uzorci 0..N-T-H
+      - region_id: opcioni cjelobrojni id regiona (globalni model) — dodaje se kao treći element uzorka
+    __getitem__(i) → (x: (T, 1+F) float32, y: (H,) float32[, region_id: int64]), pogledi na dijeljene tenzore.
+    """
+
+    def __init__(self, values, feats, input_window, horizon, starts=None, _shared=None, region_id=None):
+        self.input_window = int(input_window)
+        self.horizon = int(horizon)
+        self.region_id = region_id
+        self._rid = None if region_id is None else torch.tensor(int(region_id), dtype=torch.long)
+        if _shared is None:
+            values = np.asarray(values, dtype=np.float32)
+            feats = np.asarray(feats, dtype=np.float32).reshape(values.shape[0], -1)
+            mat = np.empty((values.shape[0], 1 + feats.shape[1]), dtype=np.float32)
+            mat[:, 0] = values
+            mat[:, 1:] = feats
+            _shared = (torch.from_numpy(mat), torch.from_numpy(np.ascontiguousarray(values)))
+        self._mat, self._y = _shared
+        n = self._y.shape[0] - self.input_window - self.horizon + 1
+        self.starts = np.arange(max(n, 0), dtype=np.int64) if starts is None else np.asarray(starts, dtype=np.int64)
+
+    @property
+    def feat_dim(self):
+        return self._mat.shape[1] - 1
+
+    def subset(self, starts, region_id=None):
+        """Novi dataset nad ISTIM tenzorima (npr. train/val/test split) — bez kopiranja podataka."""
+        return SlidingWindowDataset(None, None, self.input_window, self.horizon, starts, _shared=(self._mat, self._y),
+                                    region_id=region_id)
+
+    def __len__(self):
+        return self.starts.shape[0]
+
+    def __getitem__(self, i):
+        k = int(self.starts[i])
+        t = k + self.input_window
+        if self._rid is not None:
+            return self._mat[k:t], self._y[t:t + self.horizon], self._rid
+        return self._mat[k:t], self._y[t:t + self.horizon]
+
+    def inputs(self, lo, hi):
+        """Ulazi uzoraka [lo, hi) kao jedan batch (B, T, 1+F) — gather preko unfold pogleda, bez DataLoader-a."""
+        k = torch.from_numpy(self.starts[lo:hi])
+        return self._mat.unfold(0, self.input_window, 1)[k].transpose(1, 2)
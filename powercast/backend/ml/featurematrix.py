@@ -0,0 +1,391 @@
+# featurematrix.py
+# Perzistentna feature matrica po regionu (kolekcije `feature_matrix` + `feature_chunks`).
+#
+#   feature_matrix: {region, config_hash, config, location, holiday_region, columns: [...],
+#                    rows, ts_first, ts_last, dirty_from, dirty_seq, updated_at}
+#   feature_chunks: {region, config_hash, month: "YYYY-MM", rows,
+#                    ts: <int64 blob>, y: <float64 blob>, X: <float32 blob rows × F>}
+#
+# Matrica pokriva CIJELU load seriju regiona (svi sati iz baze), izračunata istim
+# build_feature_frame-om kao ranije; trening i prognoza samo sijeku redove [od, do].
+# Verzija = hash feature konfiguracije (lagovi, rolling prozori, meteo kolone, proxy lokacija,
+# region praznika, FEATURE_VERSION) — promjena konfiguracije znači novu matricu.
+#
+# Inkrementalno održavanje:
+#   - svaki upis load/weather sati i import praznika postavlja dirty_from ($min) na matricama
+#     na koje utiče (load → region, weather → regioni sa tom proxy lokacijom, praznici → region praznika)
+#   - pri sljedećem čitanju (refresh) se ponovo računaju samo redovi od dirty_from naprijed;
+#     kontekst za lagove/rolling je posljednjih max(lag, prozor) = 168 redova iz same matrice,
+#     pa dopisivanje novog dana računa samo nove sate.
+#   - refresh drži lease na meta dokumentu (refreshing_until / refresh_owner): drugi proces ili nit
+#     čeka da se lease oslobodi (ili istekne, FEATURE_MATRIX_LEASE_S) umjesto da paralelno prepisuje
+#     iste chunk-ove; mjeseci se zamjenjuju pojedinačno (replace_one), pa čitalac nikad ne vidi rupu.
+
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from bson.binary import Binary
+
+from config import Config
+from storage.catalog import catalog_entries
+from storage.featurestore import read_series_cached
+from storage.partitions import kind_for_collection
+from storage.series import collection_name
+from storage.writehooks import register_write_hook
+from .features import WEATHER_COLS, build_feature_frame
+
+MATRIX_COLL = "feature_matrix"
+CHUNKS_COLL = "feature_chunks"
+
+# podići kad se promijeni logika build_feature_frame (stare matrice postaju nevažeće)
+# 2: join_holidays poredi lokalni dan sa datumom ključa 'Date' (is/pre/post_holiday na pravom danu)
+FEATURE_VERSION = 2
+
+LAGS = (1, 24, 48, 168)
+ROLL_WINDOWS = (24, 168)
+DEFAULT_LOCATION = "New York City, NY"
+
+_CALENDAR = ["hour", "dow", "month", "is_weekend", "sin_hour", "cos_hour", "sin_dow", "cos_dow"]
+_HOLIDAY = ["is_holiday", "pre_holiday", "post_holiday"]
+
+
+def feature_config(location=DEFAULT_LOCATION, holiday_region="US"):
+    return {
+        "version": FEATURE_VERSION,
+        "lags": list(LAGS),
+        "roll_windows": list(ROLL_WINDOWS),
+        "weather_cols": list(WEATHER_COLS),
+        "location": location,
+        "holiday_region": holiday_region,
+    }
+
+
+def config_hash(cfg):
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def feature_columns(cfg):
+    """Fiksan redoslijed kolona (isti kao build_feature_frame kad su sve meteo kolone prisutne)."""
+    return (_CALENDAR + list(cfg["weather_cols"]) + [f"lag_{L}" for L in cfg["lags"]]
+            + [f"rollmean_{W}" for W in cfg["roll_windows"]] + _HOLIDAY)
+
+
+def _lookback(cfg):
+    return max(list(cfg["lags"]) + list(cfg["roll_windows"]))
+
+
+# ---------- serijalizacija chunk-ova ----------
+
+def _blob(arr, dtype):
+    return Binary(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+
+
+def _decode_chunk(doc, n_cols):
+    n = int(doc["rows"])
+    ts = np.frombuffer(doc["ts"], dtype="<i8").view("datetime64[ns]")
+    y = np.frombuffer(doc["y"], dtype="<f8")
+    X = np.frombuffer(doc["X"], dtype="<f4").reshape(n, n_cols)
+    return ts, y, X
+
+
+def _read_chunks(db, region, h, n_cols, month_from=None, month_to=None):
+    """Chunk-ovi [month_from, month_to] spojeni u (ts, y, X); bez granica → cijela matrica."""
+    q = {"region": region, "config_hash": h}
+    if month_from or month_to:
+        q["month"] = {k: v for k, v in (("$gte", month_from), ("$lte", month_to)) if v}
+    parts = [_decode_chunk(d, n_cols) for d in db[CHUNKS_COLL].find(q, {"_id": 0}).sort("month", 1)]
+    if not parts:
+        return (np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.float64),
+                np.zeros((0, n_cols), dtype=np.float32))
+    return (np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]),
+            np.concatenate([p[2] for p in parts]))
+
+
+def _write_rows(db, region, h, ts, y, X, t0, full=False):
+    """
+    Zamijeni redove ts >= t0 novim (ts, y, X): mjesec koji sadrži t0 zadržava svoje redove prije t0,
+    kasniji mjeseci se u potpunosti prepisuju. Svaki mjesec se zamjenjuje jednim replace_one (upsert),
+    a tek na kraju se brišu mjeseci koji više nemaju redova (iza novog kraja; full → svi nenapisani).
+    """
+    n_cols = X.shape[1]
+    t0 = np.datetime64(t0, "ns")
+    month0 = str(pd.Timestamp(t0).to_period("M"))
+    head_ts, head_y, head_X = _read_chunks(db, region, h, n_cols, month0, month0)
+    keep = head_ts < t0
+    ts = np.concatenate([head_ts[keep], ts])
+    y = np.concatenate([head_y[keep], y])
+    X = np.concatenate([head_X[keep], X])
+
+    months = pd.DatetimeIndex(ts).to_period("M").astype(str).to_numpy() if ts.size else np.array([], dtype=object)
+    written = []
+    for m in pd.unique(months):
+        sel = months == m
+        key = {"region": region, "config_hash": h, "month": str(m)}
+        db[CHUNKS_COLL].replace_one(key, {**key, "rows": int(sel.sum()),
+                                          "ts": _blob(ts[sel].view("<i8"), "<i8"), "y": _blob(y[sel], "<f8"),
+                                          "X": _blob(X[sel], "<f4")}, upsert=True)
+        written.append(str(m))
+    stale = {"$nin": written} if full else {"$gte": month0, "$nin": written}
+    db[CHUNKS_COLL].delete_many({"region": region, "config_hash": h, "month": stale})
+
+
+# ---------- računanje ----------
+
+def _compute(db, raw, cfg, context=None):
+    """raw (ts, load_mw, meteo...) → feature matrica (float32) u fiksnom redoslijedu kolona."""
+    feats = build_feature_frame(raw, lags=tuple(cfg["lags"]), roll_windows=tuple(cfg["roll_windows"]),
+                                db=db, holiday_region=cfg["holiday_region"], context=context)
+    return feats.reindex(columns=feature_columns(cfg), fill_value=0.0).to_numpy(dtype=np.float32)
+
+
+def _raw_from(db, region, cfg, t0, context=None):
+    """
+    Load (+ meteo proxy lokacije) od t0 do kraja serije, spojeno po satu; granice iz kataloga pokrivenosti.
+    Sa context-om se meteo siječe iz jednom učitanog opsega job-a (isti za sve regione).
+    """
+    span = catalog_entries(db, collection_name("load"), [region])
+    if not span or span[0].get("to") is None:
+        return pd.DataFrame(columns=["ts", "load_mw"])
+    lo = max(pd.Timestamp(t0), pd.Timestamp(span[0]["from"])) if t0 is not None else pd.Timestamp(span[0]["from"])
+    hi = pd.Timestamp(span[0]["to"])
+    if lo > hi:
+        return pd.DataFrame(columns=["ts", "load_mw"])
+    load = read_series_cached(db, "load", region, lo, hi, ["load_mw"])
+    if load.empty:
+        return load
+    if context is not None:
+        w = context.weather(cfg["location"], lo, hi, list(cfg["weather_cols"]))
+    else:
+        w = read_series_cached(db, "weather", cfg["location"], lo, hi, list(cfg["weather_cols"]))
+    if not w.empty:
+        load = load.merge(w, how="left", on="ts")
+    return load
+
+
+def _context(db, region, h, n_cols, meta, t0, lookback):
+    """Posljednjih lookback redova matrice prije t0 (unazad mjesec po mjesec); None ako ih nema dovoljno."""
+    if meta is None or meta.get("ts_first") is None or pd.Timestamp(meta["ts_first"]) >= t0:
+        return None
+    parts = []
+    month = pd.Timestamp(t0).to_period("M")
+    first = pd.Timestamp(meta["ts_first"]).to_period("M")
+    have = 0
+    while month >= first and have < lookback:
+        ts_m, y_m, X_m = _read_chunks(db, region, h, n_cols, str(month), str(month))
+        sel = ts_m < np.datetime64(t0, "ns")
+        parts.insert(0, (ts_m[sel], y_m[sel], X_m[sel]))
+        have += int(sel.sum())
+        month -= 1
+    if have < lookback:
+        return None
+    return tuple(np.concatenate([p[i] for p in parts])[-lookback:] for i in range(3))
+
+
+def _recompute(db, region, cfg, h, meta, t0, context=None):
+    """
+    Ponovo izračunaj redove od t0 naprijed, sa kontekstom od posljednjih lookback redova prije t0.
+    Ako t0 pada u prvih lookback redova serije, računa se cijela serija
+    (početni lagovi/rolling se popunjavaju bfill-om iz kasnijih redova, kao kod izgradnje iz početka).
+    """
+    cols = feature_columns(cfg)
+    n_cols = len(cols)
+    ctx = _context(db, region, h, n_cols, meta, t0, _lookback(cfg)) if t0 is not None else None
+    if ctx is None:
+        t0 = None
+    raw = _raw_from(db, region, cfg, t0, context)
+    rebuild = t0 is None
+    if rebuild:
+        t0 = raw["ts"].iloc[0] if not raw.empty else pd.Timestamp("1970-01-01")
+
+    if raw.empty:
+        _write_rows(db, region, h, np.array([], dtype="datetime64[ns]"), np.array([]),
+                    np.zeros((0, n_cols), np.float32), t0, rebuild)
+        return
+
+    # kontekst ulazi kao "sirovi" redovi: load = y, meteo = već popunjene meteo kolone matrice
+    ctx_ts, ctx_y, ctx_X = ctx if ctx is not None else (
+        np.array([], dtype="datetime64[ns]"), np.array([]), np.zeros((0, n_cols), np.float32))
+    ctx_df = pd.DataFrame({"ts": ctx_ts, "load_mw": ctx_y})
+    for c in cfg["weather_cols"]:
+        ctx_df[c] = ctx_X[:, cols.index(c)].astype(float)
+    full = pd.concat([ctx_df, raw], ignore_index=True) if ctx is not None else raw
+    X = _compute(db, full, cfg, context)[ctx_df.shape[0]:]
+    ts = raw["ts"].to_numpy(dtype="datetime64[ns]")
+    y = pd.to_numeric(raw["load_mw"], errors="coerce").to_numpy(dtype=np.float64)
+    _write_rows(db, region, h, ts, y, X, t0, rebuild)
+
+
+class MatrixBusy(Exception):
+    """Drugi proces osvježava matricu duže od FEATURE_MATRIX_WAIT_S."""
+
+
+def _acquire_lease(db, q, cfg, location, holiday_region):
+    """
+    Lease za refresh matrice: (meta, token) kad je preuzet; (meta, None) kad je matrica već ažurna.
+    Dok drugi proces drži važeći lease, čeka se (poll) da završi ili da lease istekne — najduže
+    FEATURE_MATRIX_WAIT_S sekundi, pa MatrixBusy.
+    Nova konfiguracija: meta se prvo upiše kao placeholder (dirty_from = 1970 → puna izgradnja).
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + Config.FEATURE_MATRIX_WAIT_S
+    lease = timedelta(seconds=Config.FEATURE_MATRIX_LEASE_S)
+    db[MATRIX_COLL].update_one(q, {"$setOnInsert": {
+        **q, "config": cfg, "location": location, "holiday_region": holiday_region, "columns": feature_columns(cfg),
+        "rows": 0, "ts_first": None, "ts_last": None, "dirty_from": datetime(1970, 1, 1), "dirty_seq": 0,
+    }}, upsert=True)
+    while True:
+        meta = db[MATRIX_COLL].find_one(q)
+        if meta.get("dirty_from") is None:
+            return meta, None
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        got = db[MATRIX_COLL].find_one_and_update(
+            {**q, "dirty_from": {"$ne": None},
+             "$or": [{"refreshing_until": None}, {"refreshing_until": {"$lt": now}}]},
+            {"$set": {"refreshing_until": now + lease, "refresh_owner": token}},
+            return_document=True,
+        )
+        if got is not None:
+            return got, token
+        if time.monotonic() >= deadline:
+            raise MatrixBusy(f"Feature matrix for region {q['region']} is being refreshed by another process; "
+                             f"try again later")
+        time.sleep(0.2)
+
+
+def _release_lease(db, q, token):
+    db[MATRIX_COLL].update_one({**q, "refresh_owner": token}, {"$set": {"refreshing_until": None, "refresh_owner": None}})
+
+
+def matrix_fresh(db, region, location=DEFAULT_LOCATION, holiday_region="US"):
+    """Da li je matrica regiona izgrađena i bez dirty oznake (refresh_matrix ne bi ništa računao)."""
+    meta = db[MATRIX_COLL].find_one({"region": region, "config_hash": config_hash(feature_config(location, holiday_region))},
+                                    {"dirty_from": 1})
+    return meta is not None and meta.get("dirty_from") is None
+
+
+def refresh_matrix(db, region, location=DEFAULT_LOCATION, holiday_region="US", context=None):
+    """
+    Osiguraj da je matrica regiona ažurna: nova konfiguracija → puna izgradnja;
+    dirty_from → ponovo samo redovi od dirty_from. Vraća meta dokument.
+    context (ml.context.FeatureContext): dijeljeni meteo/praznici/kalendar više-regionskog job-a.
+    """
+    cfg = feature_config(location, holiday_region)
+    h = config_hash(cfg)
+    q = {"region": region, "config_hash": h}
+    meta = db[MATRIX_COLL].find_one(q)
+    if meta is not None and meta.get("dirty_from") is None:
+        return meta
+
+    meta, token = _acquire_lease(db, q, cfg, location, holiday_region)
+    if token is None:
+        return meta  # drugi proces je u međuvremenu osvježio matricu
+    try:
+        return _refresh_locked(db, region, cfg, h, q, meta, location, holiday_region, context)
+    finally:
+        _release_lease(db, q, token)
+
+
+def _refresh_locked(db, region, cfg, h, q, meta, location, holiday_region, context):
+    """Tijelo refresh_matrix pod lease-om: ponovo izračunaj od dirty_from, sažetak, skini dirty oznaku."""
+    seq = int(meta.get("dirty_seq", 0))
+    # placeholder nove konfiguracije (bez ts_first) → _recompute radi punu izgradnju
+    t0 = pd.Timestamp(meta["dirty_from"])
+    _recompute(db, region, cfg, h, meta, t0, context)
+
+    # sažetak matrice + skidanje dirty oznake samo ako u međuvremenu nije bilo novog upisa
+    agg = list(db[CHUNKS_COLL].aggregate([
+        {"$match": q},
+        {"$group": {"_id": None, "rows": {"$sum": "$rows"}, "first": {"$min": "$month"}, "last": {"$max": "$month"}}},
+    ]))
+    summary = {"rows": 0, "ts_first": None, "ts_last": None}
+    if agg and agg[0]["rows"]:
+        first_ts = _read_chunks(db, region, h, len(feature_columns(cfg)), agg[0]["first"], agg[0]["first"])[0]
+        last_ts = _read_chunks(db, region, h, len(feature_columns(cfg)), agg[0]["last"], agg[0]["last"])[0]
+        summary = {"rows": int(agg[0]["rows"]), "ts_first": pd.Timestamp(first_ts[0]).to_pydatetime(),
+                   "ts_last": pd.Timestamp(last_ts[-1]).to_pydatetime()}
+    base = {**q, "config": cfg, "location": location, "holiday_region": holiday_region,
+            "columns": feature_columns(cfg), **summary, "updated_at": datetime.now(timezone.utc)}
+    res = db[MATRIX_COLL].update_one({**q, "dirty_seq": seq}, {"$set": {**base, "dirty_from": None}})
+    if res.matched_count == 0:
+        db[MATRIX_COLL].update_one(q, {"$set": base})
+    return db[MATRIX_COLL].find_one(q)
+
+
+def feature_matrix(db, region, ts_from, ts_to, include_end=True, location=DEFAULT_LOCATION, holiday_region="US",
+                   context=None, refresh=True):
+    """
+    Redovi matrice u [ts_from, ts_to] (include_end=False → [ts_from, ts_to)), NAIVE UTC.
+    Vraća (ts: datetime64[ns], y: float64, X: float32 (N, F), imena kolona).
+    refresh=False: bez osvježavanja i čekanja na lease — None ako matrica nije ažurna (HTTP putanje).
+    """
+    if refresh:
+        meta = refresh_matrix(db, region, location, holiday_region, context)
+    else:
+        meta = db[MATRIX_COLL].find_one({"region": region,
+                                         "config_hash": config_hash(feature_config(location, holiday_region))})
+        if meta is None or meta.get("dirty_from") is not None:
+            return None
+    cols = meta["columns"]
+    lo, hi = pd.Timestamp(ts_from), pd.Timestamp(ts_to)
+    ts, y, X = _read_chunks(db, region, meta["config_hash"], len(cols),
+                            str(lo.to_period("M")), str(hi.to_period("M")))
+    upper = ts <= np.datetime64(hi, "ns") if include_end else ts < np.datetime64(hi, "ns")
+    sel = (ts >= np.datetime64(lo, "ns")) & upper
+    return ts[sel], y[sel], X[sel], list(cols)
+
+
+def iter_matrix_months(db, region, ts_from, ts_to, location=DEFAULT_LOCATION, holiday_region="US", context=None):
+    """
+    Kao feature_matrix (uključivo [ts_from, ts_to]), ali mjesec po mjesec, pa pozivalac nikad ne drži
+    cijeli opseg u memoriji. Vraća (imena kolona, generator (ts, y, X) po nepraznom mjesečnom chunk-u).
+    """
+    meta = refresh_matrix(db, region, location, holiday_region, context)
+    cols = list(meta["columns"])
+    lo, hi = pd.Timestamp(ts_from), pd.Timestamp(ts_to)
+
+    def _months():
+        for month in pd.period_range(lo.to_period("M"), hi.to_period("M"), freq="M"):
+            ts, y, X = _read_chunks(db, region, meta["config_hash"], len(cols), str(month), str(month))
+            sel = (ts >= np.datetime64(lo, "ns")) & (ts <= np.datetime64(hi, "ns"))
+            if sel.any():
+                yield ts[sel], y[sel], X[sel]
+
+    return cols, _months()
+
+
+# ---------- invalidacija (post-write hook writer-a i import praznika) ----------
+
+def _mark(db, q, t):
+    # dirty_seq prvo: refresh koji je u toku neće skinuti oznaku (vidi refresh_matrix)
+    db[MATRIX_COLL].update_many(q, {"$inc": {"dirty_seq": 1}})
+    db[MATRIX_COLL].update_many({**q, "dirty_from": None}, {"$set": {"dirty_from": t}})
+    db[MATRIX_COLL].update_many({**q, "dirty_from": {"$gt": t}}, {"$set": {"dirty_from": t}})
+
+
+def mark_dirty(coll, key_field, g):
+    """Nakon upisa load/weather sati: označi pogođene matrice od najranijeg upisanog sata."""
+    kind = kind_for_collection(coll.name)
+    if kind is None or g is None or g.empty:
+        return 0
+    ts = pd.to_datetime(g["ts"])
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    first = pd.DataFrame({"key": g[key_field].astype(str).to_numpy(), "ts": ts.to_numpy()}).groupby("key")["ts"].min()
+    field = "region" if kind == "load" else "location"
+    for key, t in first.items():
+        _mark(coll.database, {field: key}, pd.Timestamp(t).to_pydatetime())
+    return int(first.shape[0])
+
+
+register_write_hook("invalidate", lambda coll, key_field, g, inserted: mark_dirty(coll, key_field, g),
+                    name="ml.featurematrix.mark_dirty")
+
+
+def mark_holidays_dirty(db, region, date_min):
+    """Import praznika: pre/post_holiday zavisi od susjednog dana → od dan prije najranijeg datuma."""
+    _mark(db, {"holiday_region": region}, (pd.Timestamp(date_min) - pd.Timedelta(days=2)).to_pydatetime())
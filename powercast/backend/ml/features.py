@@ -1,15 +1,25 @@
 # features.py
 # Skup helpera za građenje feature-a za vremenske nizove (NYISO use-case).
 # - _utc_to_ny_local: konverzija UTC timestampa u lokalno NY vrijeme (aware)
-# - join_holidays: spajanje dnevnih praznika (iz Mongo kolekcije `holidays`) na satne zapise
+# - join_holidays: spajanje dnevnih praznika (keširani kalendar iz Mongo kolekcije `holidays`) na satne zapise
 # - build_feature_frame: kreiranje vremenskih, cikličnih, meteo, lag/rolling i holiday feature-a
+#   (vremenske i ciklične kolone dolaze iz ml.calendar_table — bez tz konverzije po pozivu)
+
+import time
 
 import numpy as np
 import pandas as pd
-from pytz import timezone, UTC
+from pytz import timezone
+
+from config import Config
+from storage.partitions import holidays_version, touch_holidays
+from .calendar_table import calendar_features, local_days
 
 NY_TZ = timezone("America/New_York")
 
+# Meteo kolone koje ulaze u feature frame (reader-i učitavaju samo njih — projekcija na serveru)
+WEATHER_COLS = ["temp", "dew", "humidity", "windspeed", "precip", "solarradiation", "uvindex", "sealevelpressure", "cloudcover"]
+
 def _utc_to_ny_local(ts_series: pd.Series) -> pd.Series:
     """
     Ulaz: serija 'ts' koja može biti naive ili aware.
@@ -22,63 +32,80 @@ def _utc_to_ny_local(ts_series: pd.Series) -> pd.Series:
     return s.dt.tz_convert(NY_TZ)
 
 
-def join_holidays(df, db, holiday_region="US"):
+# ---------- Keš prazničnog kalendara (po procesu, verzija u Mongo-u) ----------
+# Region → (verzija, sortiran niz NY lokalnih dana praznika datetime64[D], trenutak provjere verzije).
+# Verzija se čuva u series_partitions (storage.partitions.touch_holidays): /import/holidays je povećava
+# preko invalidate_holidays. Ostali procesi/serveri je ponovo pitaju tek kad istekne HOLIDAY_CACHE_TTL_S,
+# pa lookup u okviru TTL-a nema Mongo round trip (više-regionski job dodatno dijeli dane kroz FeatureContext).
+_HOLIDAY_CACHE = {}
+
+
+def invalidate_holidays(db, region):
+    """Povećaj verziju kalendara regiona u Mongo-u; lokalni keš odmah, ostali procesi najkasnije nakon TTL-a."""
+    touch_holidays(db, region)
+    _HOLIDAY_CACHE.pop(region, None)
+
+
+def holiday_days(db, holiday_region="US"):
+    """Sortirani NY lokalni dani praznika za region (datetime64[D]); verzija se provjerava najviše jednom po TTL-u."""
+    now = time.monotonic()
+    hit = _HOLIDAY_CACHE.get(holiday_region)
+    if hit is not None and now - hit[2] < Config.HOLIDAY_CACHE_TTL_S:
+        return hit[1]
+    version = holidays_version(db, holiday_region)
+    if hit is not None and hit[0] == version:
+        _HOLIDAY_CACHE[holiday_region] = (version, hit[1], now)
+        return hit[1]
+
+    # 'Date' iz baze je NAIVE UTC ključ NY lokalnog dana (ingest.holidays: lokalna ponoć → UTC → 00:00),
+    # pa je njegov kalendarski datum upravo lokalni dan praznika (NY je UTC-4/-5, isti datum)
+    dates = [d["Date"] for d in db.holidays.find({"Region": holiday_region}, {"_id": 0, "Date": 1})]
+    if dates:
+        days = np.unique(pd.DatetimeIndex(pd.to_datetime(dates)).floor("D").to_numpy().astype("datetime64[D]"))
+    else:
+        days = np.array([], dtype="datetime64[D]")
+    _HOLIDAY_CACHE[holiday_region] = (version, days, now)
+    return days
+
+
+def _in_sorted(values, sorted_arr):
+    """Vektorsko članstvo: values ∈ sorted_arr (searchsorted umjesto isin/merge)."""
+    if sorted_arr.size == 0:
+        return np.zeros(values.shape[0], dtype=bool)
+    idx = np.clip(np.searchsorted(sorted_arr, values), 0, sorted_arr.size - 1)
+    return sorted_arr[idx] == values
+
+
+def join_holidays(df, db, holiday_region="US", context=None):
     """
     Za dati satni DataFrame 'df' i Mongo konekciju 'db':
-      - izračunaj koji NY lokalni dan (00:00) pripada svakom 'ts'
-      - spoji sa kolekcijom 'holidays' po NAIVE UTC datumu (ključ 'Date')
+      - izračunaj koji NY lokalni dan pripada svakom 'ts'
+      - uporedi ga sa keširanim kalendarom praznika regiona (holiday_days, searchsorted)
       - vrati DataFrame sa kolonama:
           is_holiday  ∈ {0,1}
-          pre_holiday ∈ {0,1}  (dan prije praznika, po NY lokalnom datumu)
-          post_holiday∈ {0,1}  (dan poslije praznika, po NY lokalnom datumu)
+          pre_holiday ∈ {0,1}  (dan poslije praznika, po NY lokalnom datumu: lokalni dan == praznik + 1 dan)
+          post_holiday∈ {0,1}  (dan prije praznika, po NY lokalnom datumu: lokalni dan == praznik - 1 dan)
     Ako nema podataka, vraća kolone pune nula (poravnate po df.index).
+    context (ml.context.FeatureContext): dijeljeni kalendar praznika / lokalni dani job-a (bez ponovnog računanja).
     """
     if df.empty:
         return pd.DataFrame({"is_holiday": 0, "pre_holiday": 0, "post_holiday": 0}, index=df.index)
 
-    # 1) ts → aware UTC
-    ts_utc = pd.to_datetime(df["ts"], utc=True, errors="coerce")
-
-    # 2) NY lokalni dan (ponoć) — AWARE NY; koristi floor("D") da dobijemo 00:00 lokalno
-    local_midnight = ts_utc.dt.tz_convert(NY_TZ).dt.floor("D")
-
-    # 3) Taj lokalni dan mapiraj na NAIVE UTC 00:00 (ključ za join sa Mongo 'holidays.Date')
-    date_utc_for_join = local_midnight.dt.tz_convert(UTC).dt.tz_localize(None)
-    dd = pd.DataFrame({"Date": date_utc_for_join}, index=df.index)
-
-    # Učitaj praznike iz baze (holidays) za dati region; 'Date' je NAIVE UTC u kolekciji
-    cur = db.holidays.find({"Region": holiday_region}, {"_id": 0, "Date": 1})
-    hdf = pd.DataFrame(list(cur))
-    if hdf.empty:
+    hol = context.holidays(holiday_region) if context is not None else None
+    if hol is None:
+        hol = holiday_days(db, holiday_region)
+    if hol.size == 0:
         return pd.DataFrame({"is_holiday": 0, "pre_holiday": 0, "post_holiday": 0}, index=df.index)
 
-    # Očisti i označi praznike
-    hdf["Date"] = pd.to_datetime(hdf["Date"])
-    hdf = hdf.drop_duplicates(subset=["Date"])
-    hdf["is_holiday"] = 1
+    # NY lokalni kalendarski dan svakog ts (datetime64[D]) — gather iz prekomputirane tabele
+    days = context.local_days(df["ts"]) if context is not None else local_days(df["ts"])
+    one = np.timedelta64(1, "D")
 
-    # Join po NAIVE UTC datumu (dd: naš dnevni ključ, hdf: praznici)
-    dd2 = dd.merge(hdf, how="left", on="Date").fillna({"is_holiday": 0})
-    dd2.index = df.index  # zadrži izvorni index
-
-    # Izvedi skup lokalnih NY "dnevnih" prazničnih datuma (aware NY na ponoć)
-    hol_local_days = (
-        hdf["Date"]
-        .dt.tz_localize(UTC)   # 'Date' iz baze je naive UTC → učini ga aware UTC
-        .dt.tz_convert(NY_TZ)  # prebaci u NY lokalno
-        .dt.floor("D")         # uzmi lokalni dan (00:00)
-        .drop_duplicates()
-    )
-
-    # pre_holiday: ako je naš lokalni dan == (praznik + 1 dan)
-    # post_holiday: ako je naš lokalni dan == (praznik - 1 dan)
-    pre_mask  = local_midnight.isin(hol_local_days + pd.Timedelta(days=1))
-    post_mask = local_midnight.isin(hol_local_days - pd.Timedelta(days=1))
-
-    dd2["pre_holiday"]  = pre_mask.astype(int).values
-    dd2["post_holiday"] = post_mask.astype(int).values
-
-    return dd2[["is_holiday", "pre_holiday", "post_holiday"]]
+    return pd.DataFrame({
+        "is_holiday": _in_sorted(days, hol).astype(int),
+        "pre_holiday": _in_sorted(days - one, hol).astype(int),
+        "post_holiday": _in_sorted(days + one, hol).astype(int),
+    }, index=df.index)
 
 def build_feature_frame(
     df,
@@ -87,7 +114,8 @@ def build_feature_frame(
     add_roll=True,
     roll_windows=(24, 168),
     db=None,
-    holiday_region="US"
+    holiday_region="US",
+    context=None
 ):
     """
     Glavni feature builder.
@@ -102,25 +130,19 @@ def build_feature_frame(
       - lagovi i rolajući prosjeci nad load_mw (ako su uključeni)
       - indikator praznika (is/pre/post) spojen iz Mongo 'holidays' (po NY lokalnom danu)
       - popunjavanje rupa (ffill/bfill) i NaN → 0.0
+    context (ml.context.FeatureContext, opciono): kalendar i praznici dijeljeni među regionima job-a.
     Vraća DataFrame poravnat na df.index.
     """
     out = pd.DataFrame(index=df.index)
 
-    # NY lokalne komponente vremena (iz 'ts' koji je u NAIVE UTC)
-    ts_local = _utc_to_ny_local(df["ts"])
-    out["hour"] = ts_local.dt.hour
-    out["dow"] = ts_local.dt.dayofweek
-    out["month"] = ts_local.dt.month
-    out["is_weekend"] = (out["dow"] >= 5).astype(int)
-
-    # Ciklični (sin/cos) enkodinzi za sat u danu i dan u sedmici
-    out["sin_hour"] = np.sin(2 * np.pi * out["hour"] / 24)
-    out["cos_hour"] = np.cos(2 * np.pi * out["hour"] / 24)
-    out["sin_dow"]  = np.sin(2 * np.pi * out["dow"] / 7)
-    out["cos_dow"]  = np.cos(2 * np.pi * out["dow"] / 7)
+    # NY lokalne komponente vremena (hour, dow, month, is_weekend) i ciklični (sin/cos) enkodinzi
+    # za sat u danu i dan u sedmici — gather iz prekomputirane tabele po UTC satnom offsetu
+    cal = context.calendar(df["ts"]) if context is not None else calendar_features(df["ts"])
+    for c, v in cal.items():
+        out[c] = v
 
     # Meteo kolone (kopiraj samo ako postoje; coerceanje u broj)
-    for c in ["temp", "dew", "humidity", "windspeed", "precip", "solarradiation", "uvindex", "sealevelpressure", "cloudcover"]:
+    for c in WEATHER_COLS:
         if c in df.columns:
             out[c] = pd.to_numeric(df[c], errors="coerce")
 
@@ -139,7 +161,7 @@ def build_feature_frame(
 
     # Praznici (spoji is/pre/post za region; koristi NY lokalni kalendar)
     if db is not None:
-        h = join_holidays(df, db, holiday_region)
+        h = join_holidays(df, db, holiday_region, context)
         out = pd.concat([out, h], axis=1)
 
     # Popuni nedostajuće kroz forward/backward fill (npr. rupe u meteo ili praznicima)
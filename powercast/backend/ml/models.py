@@ -84,3 +84,30 @@ class LSTMSeq2Seq(nn.Module):
         # Spajamo vremenske korake u sekvencu dužine H: (B, H, 1) → (B, H)
         y_out = torch.cat(outs, dim=1)
         return y_out.squeeze(-1)
+
+
+class GlobalLSTMSeq2Seq(LSTMSeq2Seq):
+    """
+    Jedan model za sve regione: LSTMSeq2Seq čiji encoder uz [target || features] dobija
+    i naučeni embedding regiona (isti vektor u svakom satu istorije).
+    - n_regions: broj regiona (id-jevi 0..n_regions-1, redoslijed iz artefakta)
+    - emb_dim:   dimenzija embedding-a regiona
+    Target ostaje u prvoj koloni ulaza, pa decoder (start token, autoregresija) radi isto kao u baznom modelu.
+    """
+
+    def __init__(self, feat_dim, n_regions, emb_dim=8, hidden_size=128, num_layers=2, dropout=0.2, horizon=24):
+        super().__init__(feat_dim + emb_dim, hidden_size=hidden_size, num_layers=num_layers,
+                         dropout=dropout, horizon=horizon)
+        self.n_regions = n_regions
+        self.emb_dim = emb_dim
+        self.region_emb = nn.Embedding(n_regions, emb_dim)
+
+    def forward(self, x_hist, region_ids, y_hist=None, teacher_forcing=0.0):
+        """
+        x_hist:     (B, T, 1+F)  → istorija [target || features], kao u LSTMSeq2Seq
+        region_ids: (B,) long    → id regiona svakog uzorka (batch može miješati regione)
+        Povratna vrednost: (B, H)
+        """
+        B, T, _ = x_hist.shape
+        emb = self.region_emb(region_ids)[:, None, :].expand(B, T, self.emb_dim)
+        return super().forward(torch.cat([x_hist, emb], dim=-1), y_hist=y_hist, teacher_forcing=teacher_forcing)
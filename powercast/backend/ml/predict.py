@@ -4,7 +4,11 @@ import numpy as np
 import pandas as pd
 import torch
 from pytz import UTC
-from .features import build_feature_frame
+from config import Config
+from storage.gaps import forecast_starts, load_runs, missing_hours
+from storage.windowcache import cached_read_series
+from .features import build_feature_frame, WEATHER_COLS
+from .featurematrix import FEATURE_VERSION, LAGS, ROLL_WINDOWS, feature_matrix
 from .utils import StandardScaler1D
 
 def _to_naive_utc(ts_like):
@@ -15,6 +19,22 @@ def _to_naive_utc(ts_like):
     t = pd.to_datetime(ts_like, utc=True)
     return t.tz_convert(UTC).tz_localize(None)
 
+def latest_model(db, region):
+    """Najnoviji model koji servira region: model regiona ili globalni model čija lista 'regions' ga sadrži."""
+    from .train import GLOBAL_ALGO
+    return db.models.find_one({"$or": [{"region": region}, {"algo": GLOBAL_ALGO, "regions": region}]},
+                              sort=[("created_at", -1), ("_id", -1)])
+
+def _check_feature_version(data):
+    """
+    Artefakt mora biti treniran na istoj verziji feature-a kao trenutni build_feature_frame
+    (npr. verzija 2 je pomjerila is/pre/post_holiday); stariji artefakt nema polje → verzija 1.
+    """
+    version = int(data.get("feature_version", 1))
+    if version != FEATURE_VERSION:
+        raise ValueError(f"Model was trained with feature version {version}, current is {FEATURE_VERSION}. "
+                         "Retrain the model.")
+
 def load_artifact(fs, artifact_id):
     """
     Učitaj binarni artefakt modela iz GridFS-a i rekonstruiši sve što treba za inferenciju:
@@ -26,6 +46,7 @@ def load_artifact(fs, artifact_id):
     gridout = fs.get(artifact_id)
     by = gridout.read()
     data = torch.load(io.BytesIO(by), map_location="cpu")
+    _check_feature_version(data)
 
     # Rekonstrukcija modela identičnih dimenzija kao u treningu
     from .models import LSTMSeq2Seq
@@ -46,6 +67,41 @@ def load_artifact(fs, artifact_id):
     saved_input_window = int(data.get("input_window", 168))
     return model, scaler, feat_names, horizon, saved_input_window
 
+def load_global_artifact(fs, artifact_id):
+    """
+    Kao load_artifact, za globalni model (GlobalLSTMSeq2Seq, hyper.global_model):
+    vraća (model, skaleri po regionu, feat_names, horizon, input_window, regioni u redoslijedu id-jeva embedding-a).
+    """
+    data = torch.load(io.BytesIO(fs.get(artifact_id).read()), map_location="cpu")
+    _check_feature_version(data)
+
+    from .models import GlobalLSTMSeq2Seq
+    regions = list(data["regions"])
+    model = GlobalLSTMSeq2Seq(
+        feat_dim=int(data["feat_dim"]),
+        n_regions=len(regions),
+        emb_dim=int(data["emb_dim"]),
+        hidden_size=int(data["hidden_size"]),
+        num_layers=int(data["num_layers"]),
+        dropout=float(data["dropout"]),
+        horizon=int(data["horizon"]),
+    )
+    model.load_state_dict(data["state_dict"])
+    model.eval()
+
+    scalers = {r: StandardScaler1D.from_dict(d) for r, d in data["scalers"].items()}
+    return model, scalers, data.get("feat_names", []), int(data["horizon"]), int(data.get("input_window", 168)), regions
+
+def _nearest_start_hint(runs, start, input_window):
+    """Najbliži validan start_date (prije ili poslije traženog) iz indeksa run-ova, kao dodatak poruci."""
+    lo, hi = forecast_starts(runs, input_window)
+    if not lo.size:
+        return ""
+    t = np.datetime64(start, "ns")
+    cand = np.clip(t, lo, hi)  # najbliža tačka svakog intervala validnih startova
+    best = pd.Timestamp(cand[np.argmin(np.abs(cand - t))])
+    return f" Nearest valid start_date: {best.isoformat()}Z."
+
 def prepare_inference_window(db, region, start_date, input_window, location_proxy="New York City, NY"):
     """
     Pripremi POSLEDNJIH `input_window` sati istorije prije 'start_date' (start nije uključen).
@@ -56,36 +112,55 @@ def prepare_inference_window(db, region, start_date, input_window, location_prox
     start = _to_naive_utc(start_date)
     hist_from = start - pd.Timedelta(hours=input_window)
 
-    # ---- LOAD (kritično da bude kompletan) ----
-    cur = db.series_load_hourly.find({
-        "region": region,
-        "ts": {"$gte": hist_from.to_pydatetime(), "$lt": start.to_pydatetime()}
-    }, {"_id": 0, "ts": 1, "load_mw": 1}).sort("ts", 1)
-    ldf = pd.DataFrame(list(cur))
+    # ---- Indeks rupa (storage.gaps): nepotpun prozor se odbija bez čitanja podataka ----
+    runs = load_runs(db, region)
+    if runs is not None:
+        missing = missing_hours(runs, hist_from, start)
+        if missing:
+            return None, (f"Not enough history for input_window (missing {missing} hourly load points)."
+                          f"{_nearest_start_hint(runs, start, input_window)}")
+
+    # ---- Perzistentna feature matrica (ml.featurematrix): presjek [hist_from, start) ----
+    # samo kad je već ažurna: request ne čeka tuđi refresh niti sam ponovo gradi matricu (to radi trening);
+    # inače isti prozor iz serija + build_feature_frame ispod
+    mat = None
+    if Config.FEATURE_MATRIX not in ("0", "false", "no"):
+        mat = feature_matrix(db, region, hist_from, start, include_end=False, location=location_proxy, refresh=False)
+    if mat is not None:
+        ts, y, Xf, names = mat
+        if ts.shape[0] < input_window or np.isnan(y).any():
+            missing = input_window - int((~np.isnan(y)).sum())
+            return None, f"Not enough history for input_window (missing {missing} hourly load points)."
+        out_df = pd.DataFrame({"ts": pd.DatetimeIndex(ts).to_pydatetime(), "y": y}).join(
+            pd.DataFrame(Xf.astype(float), index=range(len(Xf))))
+        return out_df, names
+
+    # ---- LOAD (kritično da bude kompletan; isti prozor se ponavlja → LRU keš) ----
+    # + kontekst od max(lag, rolling prozor) sati prije prozora, da lagovi/rolling budu isti kao u matrici
+    ctx_from = hist_from - pd.Timedelta(hours=max(LAGS + ROLL_WINDOWS))
+    ldf = cached_read_series(db, "load", region, ctx_from, start, fields=["load_mw"], include_end=False)
     if ldf.empty:
         return None, "No load data in the requested window"
 
-    ldf["ts"] = pd.to_datetime(ldf["ts"])
-    ldf = ldf.drop_duplicates(subset=["ts"]).set_index("ts").sort_index()
+    ldf = ldf.set_index("ts")
 
-    # Poravnaj na puni hourly grid (NAIVE UTC)
+    # Poravnaj prozor na puni hourly grid (NAIVE UTC); kontekst su postojeći sati prije prozora
     idx = pd.date_range(hist_from, periods=input_window, freq="h")
-    ldf = ldf.reindex(idx)
+    window = ldf.reindex(idx)
 
     # Ako fali ijedan sat loada → prekini (model nema punu istoriju)
-    if ldf["load_mw"].isna().any():
-        missing = int(ldf["load_mw"].isna().sum())
+    if window["load_mw"].isna().any():
+        missing = int(window["load_mw"].isna().sum())
         return None, f"Not enough history for input_window (missing {missing} hourly load points)."
 
+    ctx = ldf[ldf.index < hist_from].dropna(subset=["load_mw"])
+    ldf = pd.concat([ctx, window])
+    idx = ldf.index
+
     # ---- WEATHER (dozvoljene rupe → ffill/bfill) ----
-    curw = db.series_weather_hourly.find({
-        "location": location_proxy,
-        "ts": {"$gte": hist_from.to_pydatetime(), "$lt": start.to_pydatetime()}
-    }, {"_id": 0}).sort("ts", 1)
-    wdf = pd.DataFrame(list(curw))
+    wdf = cached_read_series(db, "weather", location_proxy, ctx_from, start, fields=WEATHER_COLS, include_end=False)
     if not wdf.empty:
-        wdf["ts"] = pd.to_datetime(wdf["ts"])
-        wdf = wdf.drop_duplicates(subset=["ts"]).set_index("ts").sort_index()
+        wdf = wdf.set_index("ts")
         wdf = wdf.reindex(idx)
         wdf = wdf.ffill().bfill()  # popuni vremenske rupe
         df = ldf.join(wdf, how="left")
@@ -94,12 +169,13 @@ def prepare_inference_window(db, region, start_date, input_window, location_prox
 
     df = df.reset_index().rename(columns={"index": "ts"})
 
-    # Izgradi feature-e (kalendar/praznici u NY lokalnom vremenu; ulazni 'ts' je NAIVE UTC)
+    # Izgradi feature-e (kalendar/praznici u NY lokalnom vremenu; ulazni 'ts' je NAIVE UTC), pa odbaci kontekst
     feats = build_feature_frame(
         df.assign(ts=pd.to_datetime(df["ts"])),
         db=db,
         holiday_region="US"
     )
+    df, feats = df.iloc[-input_window:].reset_index(drop=True), feats.iloc[-input_window:].reset_index(drop=True)
 
     # Pripremi izlaz: ts, y (load), pa feature kolone
     y = df["load_mw"].astype(float).values
@@ -109,6 +185,50 @@ def prepare_inference_window(db, region, start_date, input_window, location_prox
     out_df = pd.DataFrame({"ts": ts, "y": y}).join(pd.DataFrame(Xf, index=range(len(Xf))))
     return out_df, feats.columns.tolist()
 
+def _model_input(df, feat_names, scaler):
+    """
+    Istorija iz prepare_inference_window → ulaz modela (T, 1+F) = [skaliran target | feature-i]:
+      - dodaj 0.0 za kolone koje fale
+      - reordnaj tačno po feat_names (višak kolona odbaci)
+    """
+    y_hist = df["y"].values.astype(float)
+    feats_df = df.drop(columns=["ts", "y"]).copy()
+    for c in feat_names:
+        if c not in feats_df.columns:
+            feats_df[c] = 0.0
+    feats_df = feats_df[feat_names]
+    Xf = feats_df.values.astype(float)
+
+    # Skaliraj target istoriju istim skalerom kao na treningu
+    y_s = scaler.transform(y_hist) if scaler else y_hist
+    return np.concatenate([y_s[:, None], Xf], axis=1)
+
+def _forecast_output(fs, region, start_date, days, horizon, yhat, scaler):
+    """
+    Predikcija modela (skala modela) → (timestamps NAIVE UTC, vrijednosti u MW, csv_id u GridFS).
+    Ispoštuj traženi broj dana, model_horizon i dužinu yhat.
+    """
+    if scaler:
+        yhat = scaler.inverse_transform(yhat)  # vrati u MW
+
+    start_naive = _to_naive_utc(start_date)
+    H_req = int(days) * 24
+    H = int(min(H_req, yhat.shape[0], horizon))
+    ts_out = [(start_naive + pd.Timedelta(hours=i)).to_pydatetime() for i in range(H)]
+    y_out = yhat[:H].astype(float).tolist()
+
+    # Snimi CSV (ISO UTC sa 'Z') u GridFS i vrati njegov ID
+    import csv
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["Datetime", "PredictedLoad"])
+    for t, y in zip(ts_out, y_out):
+        writer.writerow([pd.to_datetime(t).isoformat() + "Z", float(y)])
+    data = buf.getvalue().encode("utf-8")
+
+    csv_id = fs.put(data, filename=f"forecast_{region}_{start_naive.strftime('%Y%m%dT%H%M%S')}.csv")
+    return ts_out, y_out, csv_id
+
 def run_forecast(db, fs, model_doc, region, start_date, days):
     """
     Glavna funkcija predikcije:
@@ -120,9 +240,13 @@ def run_forecast(db, fs, model_doc, region, start_date, days):
           * listu predikcija (float),
           * csv_id (GridFS) fajla sa prognozom (Datetime, PredictedLoad)
     Napomena: Maksimalni broj sati H = min(days*24, model_horizon).
+    Globalni model (algo GlobalLSTMSeq2Seq) ide kroz run_forecast_regions sa jednim regionom.
     """
     from bson import ObjectId
-    import csv
+    from .train import GLOBAL_ALGO
+
+    if model_doc.get("algo") == GLOBAL_ALGO:
+        return run_forecast_regions(db, fs, model_doc, [region], start_date, days)[region]
 
     # 1) Artefakt + meta
     model, scaler, feat_names, horizon, saved_input_window = load_artifact(fs, ObjectId(model_doc["artifact_id"]))
@@ -135,45 +259,45 @@ def run_forecast(db, fs, model_doc, region, start_date, days):
         raise ValueError(prep[1])
     df, feat_cols = prep
 
-    # 3) Uskladi FEATURE kolone s treningom:
-    #    - dodaj 0.0 za kolone koje fale
-    #    - reordnaj tačno po feat_names (višak kolona odbaci)
-    y_hist = df["y"].values.astype(float)
-    feats_df = df.drop(columns=["ts", "y"]).copy()
-    for c in feat_names:
-        if c not in feats_df.columns:
-            feats_df[c] = 0.0
-    feats_df = feats_df[feat_names]
-    Xf = feats_df.values.astype(float)
-
-    # 4) Skaliraj target istoriju istim skalerom kao na treningu
-    y_s = scaler.transform(y_hist) if scaler else y_hist
-
-    # 5) Složi ulaz za model: (1, T, 1+F)  → batch=1
-    X_all = np.concatenate([y_s[:, None], Xf], axis=1)[None, ...]
-    X_all = torch.tensor(X_all, dtype=torch.float32)
+    # 3–5) Uskladi FEATURE kolone s treningom, skaliraj target i složi ulaz: (1, T, 1+F)  → batch=1
+    X_all = torch.tensor(_model_input(df, feat_names, scaler)[None, ...], dtype=torch.float32)
 
     # 6) Autoregresivna prognoza (decoder bez teacher forcing-a)
     with torch.no_grad():
         yhat = model(X_all)  # (1, H)
     yhat = yhat.numpy().reshape(-1)
-    if scaler:
-        yhat = scaler.inverse_transform(yhat)  # vrati u MW
 
-    # 7) Izgradi timestamps i ispoštuj traženi broj dana, model_horizon i dužinu yhat
-    start_naive = _to_naive_utc(start_date)
-    H_req = int(days) * 24
-    H = int(min(H_req, yhat.shape[0], horizon))
-    ts_out = [(start_naive + pd.Timedelta(hours=i)).to_pydatetime() for i in range(H)]
-    y_out = yhat[:H].astype(float).tolist()
+    # 7–8) Timestamps, vrijednosti u MW i CSV u GridFS
+    return _forecast_output(fs, region, start_date, days, horizon, yhat, scaler)
 
-    # 8) Snimi CSV (ISO UTC sa 'Z') u GridFS i vrati njegov ID
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(["Datetime", "PredictedLoad"])
-    for t, y in zip(ts_out, y_out):
-        writer.writerow([pd.to_datetime(t).isoformat() + "Z", float(y)])
-    data = buf.getvalue().encode("utf-8")
+def run_forecast_regions(db, fs, model_doc, regions, start_date, days):
+    """
+    Prognoza za više regiona iz JEDNOG globalnog artefakta: istorije svih regiona se slože u
+    batch (R, T, 1+F) i model radi jedan forward pass sa id-jevima regiona.
+    Vraća {region: (ts_out, y_out, csv_id)} (isto kao run_forecast po regionu).
+    ValueError ako model ne servira region ili istorija regiona nije potpuna.
+    """
+    from bson import ObjectId
 
-    csv_id = fs.put(data, filename=f"forecast_{region}_{start_naive.strftime('%Y%m%dT%H%M%S')}.csv")
-    return ts_out, y_out, csv_id
+    model, scalers, feat_names, horizon, saved_input_window, model_regions = load_global_artifact(
+        fs, ObjectId(model_doc["artifact_id"]))
+    input_window = int(model_doc.get("hyper", {}).get("input_window", saved_input_window or 168))
+
+    unknown = [r for r in regions if r not in model_regions]
+    if unknown:
+        raise ValueError(f"Global model was not trained for region(s): {', '.join(unknown)}")
+
+    rows = []
+    for region in regions:
+        prep = prepare_inference_window(db, region, start_date, input_window)
+        if prep[0] is None:
+            raise ValueError(f"{region}: {prep[1]}")
+        rows.append(_model_input(prep[0], feat_names, scalers[region]))
+
+    X_all = torch.tensor(np.stack(rows), dtype=torch.float32)                   # (R, T, 1+F)
+    rid = torch.tensor([model_regions.index(r) for r in regions], dtype=torch.long)
+    with torch.no_grad():
+        yhat = model(X_all, rid).numpy()                                         # (R, H)
+
+    return {region: _forecast_output(fs, region, start_date, days, horizon, yhat[i], scalers[region])
+            for i, region in enumerate(regions)}
@@ -0,0 +1,164 @@
+# stream.py
+# Out-of-core podaci za trening: feature matrica regiona (ml.featurematrix) se mjesec po mjesec
+# prepisuje u lokalni spool, a ShardWindowDataset iz njega streamuje sliding window uzorke.
+#
+#   <spool>/<region>/ts.bin   int64 ns (NAIVE UTC), redovi sa poznatim targetom
+#   <spool>/<region>/y.bin    float64 target (load_mw, neskaliran)
+#   <spool>/<region>/X.bin    float32 (rows × F) feature-i
+#
+# Fajlovi se čitaju preko np.memmap. Uzorci (start indeksi k, isti raspored kao SlidingWindowDataset)
+# dijele se u shard-ove od shard_rows uzastopnih startova; DataLoader worker u jednom trenutku
+# drži samo blokove nekoliko shard-ova (+ T + H - 1 redova preklopa), pa je memorija fiksna bez obzira
+# na broj godina i regiona. Shard-ovi se dijele workerima round-robin (po epohi promiješano), a pri
+# shuffle-u worker miješa uzorke shuffle_shards shard-ova zajedno (ne samo unutar jednog shard-a).
+
+import os
+from urllib.parse import quote
+
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+from .featurematrix import DEFAULT_LOCATION, iter_matrix_months
+
+
+def spool_region(db, region, ts_from, ts_to, root, location=DEFAULT_LOCATION, context=None):
+    """
+    Prepiši redove matrice regiona u [ts_from, ts_to] (bez NaN targeta) u <root>/<region>/
+    (context: dijeljeni FeatureContext job-a ako matricu treba osvježiti).
+    Vraća {"region", "dir", "rows", "columns"}; None ako u opsegu nema podataka.
+    """
+    cols, months = iter_matrix_months(db, region, ts_from, ts_to, location=location, context=context)
+    rdir = os.path.join(root, quote(str(region), safe=""))
+    os.makedirs(rdir, exist_ok=True)
+    rows = 0
+    with open(os.path.join(rdir, "ts.bin"), "wb") as fts, \
+         open(os.path.join(rdir, "y.bin"), "wb") as fy, \
+         open(os.path.join(rdir, "X.bin"), "wb") as fx:
+        for ts, y, X in months:
+            keep = ~np.isnan(y)
+            fts.write(np.ascontiguousarray(ts[keep].view("<i8")).tobytes())
+            fy.write(np.ascontiguousarray(y[keep], dtype="<f8").tobytes())
+            fx.write(np.ascontiguousarray(X[keep], dtype="<f4").tobytes())
+            rows += int(keep.sum())
+    if rows == 0:
+        return None
+    return {"region": region, "dir": rdir, "rows": rows, "columns": cols}
+
+
+def open_spool(spool):
+    """(ts datetime64[ns], y float64, X float32 (rows × F)) kao read-only memmap-ovi."""
+    n, f = spool["rows"], len(spool["columns"])
+    ts = np.memmap(os.path.join(spool["dir"], "ts.bin"), dtype="<i8", mode="r", shape=(n,)).view("datetime64[ns]")
+    y = np.memmap(os.path.join(spool["dir"], "y.bin"), dtype="<f8", mode="r", shape=(n,))
+    X = np.memmap(os.path.join(spool["dir"], "X.bin"), dtype="<f4", mode="r", shape=(n, f))
+    return ts, y, X
+
+
+class ShardWindowDataset(IterableDataset):
+    """
+    Streaming sliding window uzoraka iz spool-ova jednog ili više regiona.
+      - sources: lista {"spool": <spool_region rezultat>, "starts": start indeksi k, "mean", "std"
+                 [, "region_id"]} (target se skalira u letu: (y - mean) / std, kao StandardScaler1D)
+      - shard_rows: broj uzastopnih startova po shard-u (jedinica rada workera)
+      - shuffle: promiješaj redoslijed shard-ova i uzoraka (nova permutacija svake epohe)
+      - shuffle_shards: pri shuffle-u, broj uzastopnih shard-ova workera čiji se uzorci miješaju zajedno
+                        (bafer od toliko blokova; 1 = miješanje samo unutar shard-a)
+    Yield: (x: (T, 1+F) float32, y: (H,) float32[, region_id: int64]) — isti raspored kao SlidingWindowDataset.
+    """
+
+    def __init__(self, sources, input_window, horizon, shard_rows=720, shuffle=False, seed=42, shuffle_shards=1):
+        self.sources = sources
+        self.input_window = int(input_window)
+        self.horizon = int(horizon)
+        self.shard_rows = max(1, int(shard_rows))
+        self.shuffle = bool(shuffle)
+        self.shuffle_shards = max(1, int(shuffle_shards))
+        self.seed = int(seed)
+        self._epoch = 0
+        self._mm = {}  # memmap-ovi se otvaraju lijeno, u procesu koji čita (worker)
+
+    def __len__(self):
+        return int(sum(len(s["starts"]) for s in self.sources))
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_mm"] = {}  # memmap se ne serijalizuje (spawn workeri otvaraju svoje)
+        return state
+
+    def _open(self, si):
+        if si not in self._mm:
+            self._mm[si] = open_spool(self.sources[si]["spool"])
+        return self._mm[si]
+
+    def _units(self):
+        """(indeks izvora, slice startova) za svaki shard, redom po vremenu."""
+        units = []
+        for si, src in enumerate(self.sources):
+            starts = np.asarray(src["starts"])
+            if starts.size == 0:
+                continue
+            shard = starts // self.shard_rows
+            brk = np.flatnonzero(np.diff(shard)) + 1
+            bounds = np.concatenate([[0], brk, [starts.size]])
+            units.extend((si, slice(int(a), int(b))) for a, b in zip(bounds[:-1], bounds[1:]))
+        return units
+
+    def _block(self, si, k):
+        """Redovi [min k, max k + T + H) izvora si kao jedan float32 blok [skaliran target | feature-i]."""
+        src = self.sources[si]
+        _, y, X = self._open(si)
+        r0, r1 = int(k[0]), int(k[-1]) + self.input_window + self.horizon
+        ys = ((np.asarray(y[r0:r1], dtype=np.float64) - src["mean"]) / src["std"]).astype(np.float32)
+        block = np.empty((r1 - r0, 1 + X.shape[1]), dtype=np.float32)
+        block[:, 0] = ys
+        block[:, 1:] = X[r0:r1]
+        return r0, torch.from_numpy(block), torch.from_numpy(ys)
+
+    def __iter__(self):
+        # svaka kopija dataset-a (persistent worker) broji svoje epohe → ista permutacija u svim workerima
+        epoch, self._epoch = self._epoch, self._epoch + 1
+        rng = np.random.default_rng(self.seed + epoch)
+        units = self._units()
+        if self.shuffle:
+            units = [units[i] for i in rng.permutation(len(units))]
+        info = get_worker_info()
+        if info is not None:
+            units = units[info.id::info.num_workers]
+        T, H = self.input_window, self.horizon
+        group = self.shuffle_shards if self.shuffle else 1
+        for g in range(0, len(units), group):
+            # blokovi grupe shard-ova: (blok, skalirani target, region_id, pozicije uzoraka u bloku)
+            blocks = []
+            for si, sl in units[g:g + group]:
+                k = np.asarray(self.sources[si]["starts"][sl], dtype=np.int64)
+                r0, block, ys = self._block(si, k)
+                rid = self.sources[si].get("region_id")
+                rid = torch.tensor(int(rid), dtype=torch.long) if rid is not None else None
+                blocks.append((block, ys, rid, k - r0))
+            which = np.concatenate([np.full(b[3].size, i) for i, b in enumerate(blocks)])
+            order = np.concatenate([b[3] for b in blocks])
+            if self.shuffle:
+                si, sl = units[g]
+                p = np.random.default_rng((self.seed, epoch, si, sl.start)).permutation(order.size)
+                which, order = which[p], order[p]
+            for i, o in zip(which.tolist(), order.tolist()):
+                block, ys, rid, _ = blocks[i]
+                if rid is not None:
+                    yield block[o:o + T], ys[o + T:o + T + H], rid
+                else:
+                    yield block[o:o + T], ys[o + T:o + T + H]
+
+    def inputs(self, lo, hi):
+        """Ulazi uzoraka [lo, hi) (redom, preko svih izvora) kao jedan batch (B, T, 1+F) — za test/evaluaciju."""
+        out, base = [], 0
+        for si, src in enumerate(self.sources):
+            n = len(src["starts"])
+            a, b = max(lo - base, 0), min(hi - base, n)
+            if a < b:
+                k = np.asarray(src["starts"][a:b], dtype=np.int64)
+                r0, block, _ = self._block(si, k)
+                idx = torch.from_numpy((k - r0)[:, None] + np.arange(self.input_window))
+                out.append(block[idx])
+            base += n
+        return torch.cat(out) if out else torch.zeros((0, self.input_window, 0))
@@ -1,51 +1,78 @@
 # train.py
 import io
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import ConcatDataset, DataLoader
 from pytz import UTC
 
 # Naši helperi iz prethodnih fajlova
 from .utils import StandardScaler1D, mape
-from .features import build_feature_frame
-from .dataset import build_sequences
-from .models import LSTMSeq2Seq
+from .features import build_feature_frame, WEATHER_COLS
+from .dataset import SlidingWindowDataset
+from .stream import ShardWindowDataset, open_spool, spool_region
+from .models import GlobalLSTMSeq2Seq, LSTMSeq2Seq
+from .featurematrix import DEFAULT_LOCATION, FEATURE_VERSION, feature_matrix, matrix_fresh
+from .context import FeatureContext
+from config import Config
+from storage.featurestore import read_series_cached
+from storage.gaps import load_runs, sample_mask
 
+# procesni pool za paralelni trening regiona (vidi train_lstm_on_regions)
+_POOL_START_METHOD = "spawn"
 
-def prepare_region_dataframe(db, region, date_from, date_to, location_proxy="New York City, NY"):
+# globalni model (hyper.global_model): oznaka rezultata / dokumenta modela i ime algoritma
+GLOBAL_REGION = "ALL"
+GLOBAL_ALGO = "GlobalLSTMSeq2Seq"
+
+
+class TrainingCancelled(Exception):
+    """Baca je progress callback (npr. otkazan trening job) — trening se prekida između batch-eva."""
+
+
+def _naive_utc_range(date_from, date_to):
+    """ISO granice (sa ili bez zone) → NAIVE UTC Timestamp-ovi (Mongo konvencija)."""
+    return (pd.to_datetime(date_from, utc=True).tz_convert(UTC).tz_localize(None),
+            pd.to_datetime(date_to, utc=True).tz_convert(UTC).tz_localize(None))
+
+
+def prepare_region_dataframe(db, region, date_from, date_to, location_proxy="New York City, NY", context=None):
     """
     Učitava satne load i weather podatke iz Mongo u opsegu [date_from, date_to] (UTC),
     spaja po UTC satu i gradi feature frame (NY lokalni kalendar/praznici).
+    context (ml.context.FeatureContext): meteo/praznici/kalendar učitani jednom za sve regione job-a.
     Vraća:
       - DataFrame: kolone ts (UTC), y (target), zatim sve feature kolone
       - lista imena feature kolona (redosled kao u DataFrame-u posle ts,y)
     """
     # 1) Normalizuj granice opsega u NAIVE UTC (Mongo konvencija)
-    dfrom = pd.to_datetime(date_from, utc=True).tz_convert(UTC).tz_localize(None)
-    dto   = pd.to_datetime(date_to,   utc=True).tz_convert(UTC).tz_localize(None)
-
-    # 2) Učitaj LOAD (satno) za region i opseg
-    cur = db.series_load_hourly.find(
-        {"region": region, "ts": {"$gte": dfrom.to_pydatetime(), "$lte": dto.to_pydatetime()}},
-        {"_id": 0, "ts": 1, "load_mw": 1}
-    ).sort("ts", 1)
-    load_df = pd.DataFrame(list(cur))
+    dfrom, dto = _naive_utc_range(date_from, date_to)
+
+    # 1b) Perzistentna feature matrica (ml.featurematrix): samo presjek prekomputiranih float32 redova
+    if Config.FEATURE_MATRIX not in ("0", "false", "no"):
+        ts, y, Xf, names = feature_matrix(db, region, dfrom, dto, location=location_proxy, context=context)
+        mask = ~np.isnan(y)
+        if not mask.any():
+            return None  # nema podataka u opsegu
+        return (pd.DataFrame({"ts": pd.DatetimeIndex(ts[mask]), "y": y[mask]})
+                  .join(pd.DataFrame(Xf[mask], index=range(int(mask.sum()))))), names
+
+    # 2) Učitaj LOAD (satno) za region i opseg (lokalni feature store; iz Mongo-a samo promijenjene particije)
+    load_df = read_series_cached(db, "load", region, dfrom, dto, fields=["load_mw"])
     if load_df.empty:
         return None  # nema podataka u opsegu
 
-    load_df["ts"] = pd.to_datetime(load_df["ts"])
-    load_df = load_df.sort_values("ts").reset_index(drop=True)
-
     # 3) Učitaj WEATHER (satno) za proxy lokaciju i opseg
-    curw = db.series_weather_hourly.find(
-        {"location": location_proxy, "ts": {"$gte": dfrom.to_pydatetime(), "$lte": dto.to_pydatetime()}},
-        {"_id": 0}
-    ).sort("ts", 1)
-    wdf = pd.DataFrame(list(curw))
-    if not wdf.empty:
-        wdf["ts"] = pd.to_datetime(wdf["ts"])
+    if context is not None:
+        wdf = context.weather(location_proxy, dfrom, dto, WEATHER_COLS)
+    else:
+        wdf = read_series_cached(db, "weather", location_proxy, dfrom, dto, fields=WEATHER_COLS)
 
     # 4) Merge po satu (UTC). Ako nema meteo – ostaje samo load_df.
     df = load_df.copy()
@@ -53,7 +80,7 @@ def prepare_region_dataframe(db, region, date_from, date_to, location_proxy="New
         df = df.merge(wdf, how="left", on="ts", suffixes=("", "_w"))
 
     # 5) Izgradi feature frame (NY lokalno: hour/dow/month, sin/cos, meteo, lag/roll, praznici)
-    feats = build_feature_frame(df.assign(ts=pd.to_datetime(df["ts"])), db=db, holiday_region="US")
+    feats = build_feature_frame(df.assign(ts=pd.to_datetime(df["ts"])), db=db, holiday_region="US", context=context)
 
     # 6) Target (y), feature matrica (Xf) i vremenska osa (ts)
     y = pd.to_numeric(df["load_mw"], errors="coerce").values
@@ -68,157 +95,478 @@ def prepare_region_dataframe(db, region, date_from, date_to, location_proxy="New
     return pd.DataFrame({"ts": ts, "y": y}).join(pd.DataFrame(Xf, index=range(len(Xf)))), feats.columns.tolist()
 
 
-def train_lstm_on_regions(db, regions, date_from, date_to, hyper):
+def train_lstm_on_regions(db, regions, date_from, date_to, hyper, progress=None):
+    """
+    Trening LSTMSeq2Seq po regionima (svaki region: train_region).
+    - hyper.region_workers / Config.TRAIN_REGION_WORKERS > 1 → regioni idu na procesni pool;
+      svaki proces dobija torch.set_num_threads(jezgra / broj procesa) da se jezgra ne prebukiraju
+    - rezultati su u istom obliku i redoslijedu kao regions, uz "timing" (wall_s, samples_per_s) po regionu
+    - progress(region, stage=..., **polja): opcioni callback napretka (mora biti picklable za pool);
+      može baciti TrainingCancelled da prekine trening
+    - više regiona: meteo proxy lokacije, praznici i kalendar se učitaju jednom po job-u (ml.context)
+      i dijele među regionima; procesi pool-a ih otvaraju kao read-only memmap iz privremenog foldera
+    - hyper.global_model → jedan GlobalLSTMSeq2Seq za sve regione (train_global, rezultat sa region=GLOBAL_REGION);
+      hyper.global_baseline → uz njega i modeli po regionu, a globalni rezultat dobija "comparison"
+    """
+    context = _job_context(db, regions, date_from, date_to)
+    if not hyper.get("global_model"):
+        return _train_regions(db, regions, date_from, date_to, hyper, progress, context)
+
+    results = _train_regions(db, regions, date_from, date_to, hyper, progress, context) \
+        if hyper.get("global_baseline") else []
+    glob = train_global(db, regions, date_from, date_to, hyper, progress, context)
+    if results and glob.get("ok"):
+        glob["comparison"] = _compare_with_baseline(glob, results)
+    return results + [glob]
+
+
+def progress_labels(regions, hyper):
+    """Oznake pod kojima train_lstm_on_regions javlja napredak (regioni i/ili GLOBAL_REGION)."""
+    if not hyper.get("global_model"):
+        return list(regions)
+    return (list(regions) if hyper.get("global_baseline") else []) + [GLOBAL_REGION]
+
+
+def _train_regions(db, regions, date_from, date_to, hyper, progress, context):
+    """Modeli po regionu: redom ili na procesnom pool-u (vidi train_lstm_on_regions)."""
+    workers = min(max(1, int(hyper.get("region_workers", Config.TRAIN_REGION_WORKERS))), len(regions))
+    if workers <= 1:
+        return [train_region(db, region, date_from, date_to, hyper, progress, context) for region in regions]
+
+    # budžet niti po procesu; DataLoader workeri regiona ulaze u isti budžet
+    threads = Config.TRAIN_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // workers)
+    sub = {**hyper, "num_workers": min(int(hyper.get("num_workers", Config.TRAIN_NUM_WORKERS)), threads - 1)}
+    # spawn: svaki proces otvara svoju Mongo konekciju (pymongo / torch nisu fork-safe)
+    with tempfile.TemporaryDirectory(prefix="ctx-", dir=Config.TRAIN_SPOOL_DIR or None) as ctx_dir, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(_POOL_START_METHOD)) as ex:
+        ctx_path = context.save(ctx_dir) if context is not None else None
+        return list(ex.map(_train_region_worker,
+                           [(r, date_from, date_to, sub, threads, progress, ctx_path) for r in regions]))
+
+
+def _job_context(db, regions, date_from, date_to):
+    """
+    Dijeljeni FeatureContext za više regiona; None za jedan region ili kad su sve feature matrice
+    ažurne (trening tada samo siječe prekomputirane redove — meteo/praznici se ne čitaju).
+    """
+    if len(regions) < 2:
+        return None
+    if Config.FEATURE_MATRIX not in ("0", "false", "no") and all(matrix_fresh(db, r) for r in regions):
+        return None
+    return FeatureContext.for_regions(db, regions, *_naive_utc_range(date_from, date_to), location=DEFAULT_LOCATION)
+
+
+def _train_region_worker(args):
+    """Radnik procesnog pool-a (top-level funkcija → picklable): jedan region sa zadatim brojem niti."""
+    region, date_from, date_to, hyper, threads, progress, ctx_path = args
+    torch.set_num_threads(threads)
+    from db import get_db
+    db = get_db()
+    context = FeatureContext.open(ctx_path, db) if ctx_path else None
+    return train_region(db, region, date_from, date_to, hyper, progress, context)
+
+
+def _run_timed(label, progress, body):
+    """
+    Zajednički okvir train_region / train_global: seed, (streaming) spool folder, timing, start/done napredak.
+    body(streaming, spool_dir, report) → rezultat (dict).
     """
-    Trening LSTMSeq2Seq po regionima.
-    - Učita podatke (prepare_region_dataframe)
+    t0 = time.perf_counter()
+    report = progress or (lambda region, **fields: None)
+    report(label, stage="start")
+
+    # (opciono) reproducibilnost — po modelu, pa rezultat ne zavisi od redoslijeda ni od pool-a
+    torch.manual_seed(42)
+    np.random.seed(42)
+
+    # Streaming (out-of-core): matrica regiona se prepisuje u lokalni spool i čita shard po shard
+    streaming = Config.FEATURE_MATRIX not in ("0", "false", "no") and Config.TRAIN_STREAMING not in ("0", "false", "no")
+    spool = tempfile.TemporaryDirectory(prefix="train-", dir=Config.TRAIN_SPOOL_DIR or None) if streaming else None
+    try:
+        res = body(streaming, spool.name if spool else None, report)
+    finally:
+        if spool is not None:
+            spool.cleanup()
+    res["timing"] = {"wall_s": round(time.perf_counter() - t0, 3), **res.get("timing", {})}
+    report(label, stage="done", ok=bool(res.get("ok")), error=res.get("error"))
+    return res
+
+
+def train_region(db, region, date_from, date_to, hyper, progress=None, context=None):
+    """
+    Trening LSTMSeq2Seq za jedan region.
+    - Učita podatke (prepare_region_dataframe ili streaming spool feature matrice; context = dijeljeni ulazi job-a)
     - Skalira target (StandardScaler1D) — fit na SVIM dostupnim tačkama u opsegu
-    - Kreira sekvence (build_sequences): X (target istorija), XF (feature istorija), Y (budućnost)
+    - Kreira sliding window dataset (SlidingWindowDataset / ShardWindowDataset)
     - Napravi train/val/test split (70/15/15) po vremenu
     - Trenira LSTM sa teacher forcing-om i early stopping-om (po val loss)
     - Testira (MAPE na originalnoj skali)
     - Pakuje artefakt modela (state_dict + meta + scaler) u bytes
-    Vraća listu rezultata po regionu.
-    """
-    # --- Hiperparametri (sa podrazumijevanim vrijednostima) ---
-    input_window    = int(hyper.get("input_window", 168))          # broj prošlih sati koji ulaze u model (T) – npr. 168 = 7 dana istorije
-    horizon         = int(hyper.get("forecast_horizon", 168))      # broj sati unaprijed koje model predviđa (H) – npr. 168 = prognoza za 7 dana
-    hidden_size     = int(hyper.get("hidden_size", 128))           # dimenzija skrivenog sloja u RNN/LSTM – koliko neurona po sloju
-    num_layers      = int(hyper.get("layers", 2))                  # broj slojeva u RNN/LSTM mreži – dublje mreže = veća sposobnost učenja
-    dropout         = float(hyper.get("dropout", 0.2))             # dropout stopa – vjerovatnoća “gašenja” neurona radi regularizacije
-    epochs          = int(hyper.get("epochs", 25))                 # broj epoha – koliko puta model vidi cijeli trening set
-    batch_size      = int(hyper.get("batch_size", 64))             # veličina batch-a – koliko primjera se obrađuje prije update-a težina
-    lr              = float(hyper.get("learning_rate", 1e-3))      # learning rate – brzina učenja optimizatora
-    teacher_forcing = float(hyper.get("teacher_forcing", 0.2))     # vjerovatnoća teacher forcing-a – koliko često koristimo stvarni izlaz umjesto predikcije tokom treninga
-
-    results = []
-
-    # (opciono) reproducibilnost
-    torch.manual_seed(42)
-    np.random.seed(42)
-
-    for region in regions:
-        # 1) Priprema podataka za region (load+weather→features; ts,y,Xf)
-        prep = prepare_region_dataframe(db, region, date_from, date_to)
+    Vraća rezultat regiona (dict) sa "timing": {"wall_s", ...}.
+    """
+    return _run_timed(region, progress, lambda streaming, spool_dir, report: _train_region(
+        db, region, date_from, date_to, hyper, streaming, spool_dir, report, context))
+
+
+def _hyperparams(hyper):
+    """Hiperparametri (sa podrazumijevanim vrijednostima) kao dict."""
+    return {
+        "input_window":    int(hyper.get("input_window", 168)),          # broj prošlih sati koji ulaze u model (T) – npr. 168 = 7 dana istorije
+        "horizon":         int(hyper.get("forecast_horizon", 168)),      # broj sati unaprijed koje model predviđa (H) – npr. 168 = prognoza za 7 dana
+        "hidden_size":     int(hyper.get("hidden_size", 128)),           # dimenzija skrivenog sloja u RNN/LSTM – koliko neurona po sloju
+        "num_layers":      int(hyper.get("layers", 2)),                  # broj slojeva u RNN/LSTM mreži – dublje mreže = veća sposobnost učenja
+        "dropout":         float(hyper.get("dropout", 0.2)),             # dropout stopa – vjerovatnoća “gašenja” neurona radi regularizacije
+        "epochs":          int(hyper.get("epochs", 25)),                 # broj epoha – koliko puta model vidi cijeli trening set
+        "batch_size":      int(hyper.get("batch_size", 64)),             # veličina batch-a – koliko primjera se obrađuje prije update-a težina
+        "lr":              float(hyper.get("learning_rate", 1e-3)),      # learning rate – brzina učenja optimizatora
+        "teacher_forcing": float(hyper.get("teacher_forcing", 0.2)),     # vjerovatnoća teacher forcing-a – koliko često koristimo stvarni izlaz umjesto predikcije tokom treninga
+        "num_workers":     int(hyper.get("num_workers", Config.TRAIN_NUM_WORKERS)),  # DataLoader worker procesi (0 = u glavnom procesu)
+        "region_emb_dim":  int(hyper.get("region_emb_dim", 8)),          # dimenzija embedding-a regiona (samo globalni model)
+    }
+
+
+def _loader_kw(hp):
+    loader_kw = {"num_workers": hp["num_workers"], "pin_memory": torch.cuda.is_available()}
+    if hp["num_workers"] > 0:
+        loader_kw.update(persistent_workers=True, prefetch_factor=Config.TRAIN_PREFETCH)
+    return loader_kw
+
+
+def _region_data(db, region, date_from, date_to, hp, streaming, spool_dir, context):
+    """
+    Koraci 1–3 i 5 treninga za jedan region: podaci, skaliranje targeta, validni startovi i
+    vremenski split 70/15/15. Vraća dict (ok=True) ili rezultat greške ({"ok": False, ...}).
+    make_ds(starts, shuffle, region_id=None) pravi dataset nad istim podacima regiona.
+    """
+    input_window, horizon = hp["input_window"], hp["horizon"]
+
+    # 1) Priprema podataka za region (load+weather→features; ts,y,Xf)
+    #    streaming: ts/y/Xf su memmap-ovi spool-a (u memoriji se drže samo ts i y)
+    if streaming:
+        sp = spool_region(db, region, *_naive_utc_range(date_from, date_to), spool_dir, context=context)
+        if sp is None:
+            return {"region": region, "ok": False, "error": "No data in date range"}
+        ts, y, Xf = open_spool(sp)
+        feat_names = sp["columns"]
+    else:
+        prep = prepare_region_dataframe(db, region, date_from, date_to, context=context)
         if prep is None:
-            results.append({"region": region, "ok": False, "error": "No data in date range"})
-            continue
+            return {"region": region, "ok": False, "error": "No data in date range"}
 
         df, feat_names = prep
-        ts = pd.to_datetime(df["ts"]).tolist()
+        ts = df["ts"].to_numpy(dtype="datetime64[ns]")
         y  = df["y"].values.astype(float)
-        Xf = df.drop(columns=["ts", "y"]).values.astype(float)
-
-        # 2) Skaliranje targeta (z-score). VAŽNO: ovdje se fit radi na svim dostupnim tačkama.
-        #    Ako želiš striktan train-only fit (bez lekkage), promijeni logiku: fit na train segmentu nakon split-a.
-        scaler = StandardScaler1D().fit(y)
-        y_s = scaler.transform(y) # normalizovan cilj, pomaže treniranju
-
-        # 3) Sliding window sekvence: X:(N,T), XF:(N,T,F), Y:(N,H)
-        X, XF, Y, _ = build_sequences(ts, y_s, Xf, input_window, horizon)
-        if X.shape[0] < 10:
-            results.append({"region": region, "ok": False, "error": "Not enough sequences (increase date range or reduce windows)."})
-            continue
-
-        # 4) Spoji target istoriju i feature-e po vremenskom koraku: (N,T,1+F)
-        X_all = np.concatenate([X[..., None], XF], axis=2)
-
-        # 5) Vremenski split: 70% train, 15% val, 15% test
-        n = X_all.shape[0]
-        n_train = int(n * 0.7)
-        n_val   = int(n * 0.15)
-        Xtr, Xva, Xte = X_all[:n_train], X_all[n_train:n_train+n_val], X_all[n_train+n_val:]
-        Ytr, Yva, Yte = Y[:n_train],    Y[n_train:n_train+n_val],    Y[n_train+n_val:]
-
-        # 6) Model + optimizator + loss
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model = LSTMSeq2Seq(
-            feat_dim=Xf.shape[1],
-            hidden_size=hidden_size,
-            num_layers=num_layers,
-            dropout=dropout,
-            horizon=horizon
-        ).to(device)
-        opt = torch.optim.Adam(model.parameters(), lr=lr)
-        loss_fn = nn.MSELoss()
-
-        # Helper za konverziju numpy→torch na ispravan device/dtype
-        def TT(a): return torch.tensor(a, dtype=torch.float32, device=device)
-
-        # 7) DataLoader-i (batching)
-        tr_dl = DataLoader(TensorDataset(TT(Xtr), TT(Ytr)), batch_size=batch_size, shuffle=True,  drop_last=False)
-        va_dl = DataLoader(TensorDataset(TT(Xva), TT(Yva)), batch_size=batch_size, shuffle=False, drop_last=False)
-
-        # 8) Early stopping po najboljem val loss-u
-        best_va = None
-        best_state = None
-        patience, patience_cnt = 6, 0
-
-        for _ in range(1, epochs + 1):
-            # --- Trening petlja (sa teacher forcing-om) ---
-            model.train()
-            tr_loss = 0.0
-            for xb, yb in tr_dl:
-                opt.zero_grad()
-                # Teacher forcing: prosljeđujemo ground-truth y za decoder (kao (B,H,1))
-                y_hist = yb.unsqueeze(-1)          # (B,H,1)
-                yhat = model(xb, y_hist=y_hist, teacher_forcing=teacher_forcing)  # izlaz: (B,H)
-                loss = loss_fn(yhat, yb)           # MSE na skali modela (standardizovanoj)
-                loss.backward()
-                opt.step()
-                tr_loss += loss.item() * xb.size(0)
-            tr_loss /= len(tr_dl.dataset)
-
-            # --- Validacija (bez teacher forcing-a) ---
-            model.eval()
-            va_loss = 0.0
-            with torch.no_grad():
-                for xb, yb in va_dl:
-                    yhat = model(xb)               # autoregresivno (bez y_hist)
-                    va_loss += loss_fn(yhat, yb).item() * xb.size(0)
-            va_loss /= max(1, len(va_dl.dataset))
-
-            # --- Early stopping logika ---
-            if best_va is None or va_loss < best_va - 1e-6:
-                best_va = va_loss
-                # Sačuvaj najbolja stanja (cpu kopija tensor-a)
-                best_state = {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}
-                patience_cnt = 0
-            else:
-                patience_cnt += 1
-                if patience_cnt >= patience:
-                    break  # zaustavi ako nema poboljšanja
-
-        # 9) Test: učitaj najbolja stanja i izračunaj MAPE na originalnoj skali (MW)
-        model.load_state_dict(best_state)
+        Xf = df.drop(columns=["ts", "y"]).to_numpy(dtype=np.float32)
+
+    # 2) Skaliranje targeta (z-score). VAŽNO: ovdje se fit radi na svim dostupnim tačkama.
+    #    Ako želiš striktan train-only fit (bez lekkage), promijeni logiku: fit na train segmentu nakon split-a.
+    scaler = StandardScaler1D().fit(y)
+    y_s = scaler.transform(y) # normalizovan cilj, pomaže treniranju
+
+    # 3) Sliding window uzorci k: ulaz [k, k+T) (target + feature-i), izlaz [k+T, k+T+H)
+    #    Izbaci sekvence koje prelaze preko rupe u podacima (indeks run-ova, storage.gaps)
+    keep = sample_mask(ts, load_runs(db, region), input_window, horizon)
+    starts = np.flatnonzero(keep)
+    if starts.shape[0] < 10:
+        return {"region": region, "ok": False, "error": "Not enough sequences (increase date range or reduce windows)."}
+
+    # 4) Jedna float32 matrica (N,1+F) = [target | feature-i]; prozori (T,1+F) su pogledi na nju
+    #    streaming: shard-ovi spool-a, blok po blok u workerima (fiksna memorija)
+    if streaming:
+        def make_ds(st, shuffle, region_id=None):
+            src = {"spool": sp, "starts": st, "mean": scaler.mean_, "std": scaler.std_, "region_id": region_id}
+            return ShardWindowDataset([src], input_window, horizon, Config.TRAIN_SHARD_HOURS, shuffle=shuffle,
+                                      shuffle_shards=Config.TRAIN_SHUFFLE_SHARDS)
+    else:
+        ds = SlidingWindowDataset(y_s, Xf, input_window, horizon)
+        def make_ds(st, shuffle, region_id=None):
+            return ds.subset(st, region_id)
+
+    # 5) Vremenski split: 70% train, 15% val, 15% test (podskupovi indeksa nad istom matricom)
+    n = starts.shape[0]
+    n_train = int(n * 0.7)
+    n_val   = int(n * 0.15)
+    return {
+        "ok": True, "region": region, "sp": sp if streaming else None, "feat_names": list(feat_names),
+        "feat_dim": Xf.shape[1], "scaler": scaler, "y_s": y_s, "make_ds": make_ds,
+        "train": starts[:n_train], "val": starts[n_train:n_train+n_val], "test": starts[n_train+n_val:],
+        "gap_dropped": int((~keep).sum()),
+    }
+
+
+def _fit(model, tr_dl, va_dl, hp, device, report, label, n_train):
+    """
+    Koraci 6–8: Adam + MSE, teacher forcing, early stopping po val loss-u.
+    Batch je (x, y) ili (x, y, region_id) — dodatni elementi idu modelu kao pozicioni argumenti.
+    Vraća (best_state, best_va, epochs_run, fit_s).
+    """
+    opt = torch.optim.Adam(model.parameters(), lr=hp["lr"])
+    loss_fn = nn.MSELoss()
+    epochs = hp["epochs"]
+
+    # 8) Early stopping po najboljem val loss-u
+    best_va = None
+    best_state = None
+    patience, patience_cnt = 6, 0
+    t_fit, epochs_run = time.perf_counter(), 0
+    report(label, stage="fit", epochs=epochs, batches=len(tr_dl), train_samples=n_train)
+
+    for epoch in range(1, epochs + 1):
+        epochs_run += 1
+        # --- Trening petlja (sa teacher forcing-om) ---
+        model.train()
+        tr_loss, seen = 0.0, 0
+        for batch, (xb, yb, *extra) in enumerate(tr_dl, 1):
+            xb, yb = xb.to(device, non_blocking=True), yb.to(device, non_blocking=True)
+            extra = [e.to(device, non_blocking=True) for e in extra]
+            opt.zero_grad()
+            # Teacher forcing: prosljeđujemo ground-truth y za decoder (kao (B,H,1))
+            y_hist = yb.unsqueeze(-1)          # (B,H,1)
+            yhat = model(xb, *extra, y_hist=y_hist, teacher_forcing=hp["teacher_forcing"])  # izlaz: (B,H)
+            loss = loss_fn(yhat, yb)           # MSE na skali modela (standardizovanoj)
+            loss.backward()
+            opt.step()
+            tr_loss += loss.item() * xb.size(0)
+            seen += xb.size(0)
+            # napredak + kooperativno otkazivanje (callback može baciti TrainingCancelled)
+            report(label, stage="batch", epoch=epoch, batch=batch, train_loss=tr_loss / seen)
+        tr_loss /= len(tr_dl.dataset)
+
+        # --- Validacija (bez teacher forcing-a) ---
         model.eval()
+        va_loss = 0.0
         with torch.no_grad():
-            yhat_te = model(TT(Xte)).cpu().numpy()   # (N,H) na standardizovanoj skali
-        yh = scaler.inverse_transform(yhat_te.reshape(-1))  # vrati u MW
-        yt = scaler.inverse_transform(Yte.reshape(-1))      # vrati GT u MW
-        test_mape = mape(yt, yh)                            # % greške
-
-        # 10) Serijalizuj artefakt modela (state_dict + meta + scaler) u bytes (za GridFS)
-        buffer = io.BytesIO()
-        torch.save({
-            "state_dict": best_state,        # težine modela
-            "feat_dim": Xf.shape[1],         # broj feature-a po času
-            "horizon": horizon,
-            "hidden_size": hidden_size,
-            "num_layers": num_layers,
-            "dropout": dropout,
-            "scaler": scaler.to_dict(),      # mean/std za inverse_transform u serviranju
-            "feat_names": feat_names,        # imena kolona feature-a
-            "input_window": input_window,    # veličina istorijskog prozora
-        }, buffer)
-        artifact_bytes = buffer.getvalue()
-
-        # 11) Rezultat za region
-        results.append({
-            "ok": True,
-            "region": region,
-            "artifact_bytes": artifact_bytes,                 # spremno za upload u GridFS
-            "metrics": {"val_loss": float(best_va), "test_mape": float(test_mape)}
-        })
-
-    return results
+            for xb, yb, *extra in va_dl:
+                xb, yb = xb.to(device, non_blocking=True), yb.to(device, non_blocking=True)
+                yhat = model(xb, *[e.to(device, non_blocking=True) for e in extra])  # autoregresivno (bez y_hist)
+                va_loss += loss_fn(yhat, yb).item() * xb.size(0)
+        va_loss /= max(1, len(va_dl.dataset))
+
+        # --- Early stopping logika ---
+        if best_va is None or va_loss < best_va - 1e-6:
+            best_va = va_loss
+            # Sačuvaj najbolja stanja (cpu kopija tensor-a)
+            best_state = {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}
+            patience_cnt = 0
+        else:
+            patience_cnt += 1
+        report(label, stage="epoch", epoch=epoch, train_loss=tr_loss, val_loss=va_loss, best_val_loss=best_va)
+        if patience_cnt >= patience:
+            break  # zaustavi ako nema poboljšanja
+
+    return best_state, best_va, epochs_run, time.perf_counter() - t_fit
+
+
+def _test_mape(model, data, hp, device, region_id=None):
+    """Korak 9: MAPE (%) na test prozorima regiona, na originalnoj skali (MW)."""
+    input_window, horizon, batch_size = hp["input_window"], hp["horizon"], hp["batch_size"]
+    ds_te = data["make_ds"](data["test"], False)
+    model.eval()
+    with torch.no_grad():
+        def predict(xb):
+            if region_id is None:
+                return model(xb)
+            return model(xb, torch.full((xb.shape[0],), region_id, dtype=torch.long, device=device))
+        yhat_te = np.concatenate([predict(ds_te.inputs(j, j + batch_size).to(device)).cpu().numpy()
+                                  for j in range(0, len(ds_te), batch_size)])  # (N,H) standardizovano
+    Yte = data["y_s"][data["test"][:, None] + input_window + np.arange(horizon)]  # GT prozori (N,H)
+    yh = data["scaler"].inverse_transform(yhat_te.reshape(-1))  # vrati u MW
+    yt = data["scaler"].inverse_transform(Yte.reshape(-1))      # vrati GT u MW
+    return mape(yt, yh)                                         # % greške
+
+
+def _timing(fit_s, epochs_run, n_train):
+    """Trening petlja (wall_s dodaje _run_timed)."""
+    return {
+        "fit_s": round(fit_s, 3),
+        "epochs_run": epochs_run,
+        "samples_per_s": round(n_train * epochs_run / fit_s, 1) if fit_s > 0 else None,
+    }
+
+
+def _train_region(db, region, date_from, date_to, hyper, streaming, spool_dir, report, context=None):
+    """Tijelo train_region: podaci → dataset → trening → test → artefakt (spool_dir samo za streaming)."""
+    hp = _hyperparams(hyper)
+    loader_kw = _loader_kw(hp)
+
+    # 1–5) Podaci, skaliranje, sliding window uzorci i split (_region_data)
+    data = _region_data(db, region, date_from, date_to, hp, streaming, spool_dir, context)
+    if not data["ok"]:
+        return data
+    n_train = data["train"].shape[0]
+    ds_tr, ds_va = data["make_ds"](data["train"], True), data["make_ds"](data["val"], False)
+
+    # 6) Model
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = LSTMSeq2Seq(
+        feat_dim=data["feat_dim"],
+        hidden_size=hp["hidden_size"],
+        num_layers=hp["num_layers"],
+        dropout=hp["dropout"],
+        horizon=hp["horizon"]
+    ).to(device)
+
+    # 7) DataLoader-i (batching; kopira se samo složeni batch, pa ide na device)
+    #    (IterableDataset miješa sam, po shard-ovima; pin_memory + non_blocking kad je device CUDA)
+    tr_dl = DataLoader(ds_tr, batch_size=hp["batch_size"], shuffle=not streaming, drop_last=False, **loader_kw)
+    va_dl = DataLoader(ds_va, batch_size=hp["batch_size"], shuffle=False, drop_last=False, **loader_kw)
+
+    # 8) Trening sa early stopping-om
+    best_state, best_va, epochs_run, fit_s = _fit(model, tr_dl, va_dl, hp, device, report, region, n_train)
+
+    # 9) Test: učitaj najbolja stanja i izračunaj MAPE na originalnoj skali (MW)
+    model.load_state_dict(best_state)
+    test_mape = _test_mape(model, data, hp, device)
+
+    # 10) Serijalizuj artefakt modela (state_dict + meta + scaler) u bytes (za GridFS)
+    buffer = io.BytesIO()
+    torch.save({
+        "state_dict": best_state,        # težine modela
+        "feat_dim": data["feat_dim"],    # broj feature-a po času
+        "horizon": hp["horizon"],
+        "hidden_size": hp["hidden_size"],
+        "num_layers": hp["num_layers"],
+        "dropout": hp["dropout"],
+        "scaler": data["scaler"].to_dict(),  # mean/std za inverse_transform u serviranju
+        "feat_names": data["feat_names"],    # imena kolona feature-a
+        "input_window": hp["input_window"],  # veličina istorijskog prozora
+        "feature_version": FEATURE_VERSION,  # semantika feature-a (predict odbija artefakt druge verzije)
+    }, buffer)
+    artifact_bytes = buffer.getvalue()
+
+    # 11) Rezultat za region
+    return {
+        "ok": True,
+        "region": region,
+        "artifact_bytes": artifact_bytes,                 # spremno za upload u GridFS
+        "feature_version": FEATURE_VERSION,
+        "metrics": {"val_loss": float(best_va), "test_mape": float(test_mape)},
+        "gap_samples_dropped": data["gap_dropped"],       # sekvence izbačene zbog rupa u load seriji
+        "timing": _timing(fit_s, epochs_run, n_train),
+    }
+
+
+# ---------- Globalni model (svi regioni, jedan artefakt) ----------
+
+def train_global(db, regions, date_from, date_to, hyper, progress=None, context=None):
+    """
+    Trening jednog GlobalLSTMSeq2Seq za sve regione (id regiona → embedding):
+    - podaci, skaler i split 70/15/15 po regionu (isto kao train_region)
+    - trening na spojenim train prozorima svih regiona (miješano), val na spojenim val prozorima
+    - test MAPE po regionu (na istim test prozorima kao model po regionu) + ukupno
+    Vraća jedan rezultat sa region=GLOBAL_REGION, "regions" (redoslijed = id embedding-a) i artefaktom
+    (state_dict + skaler po regionu). Regioni bez dovoljno podataka su u "skipped".
+    """
+    return _run_timed(GLOBAL_REGION, progress, lambda streaming, spool_dir, report: _train_global(
+        db, regions, date_from, date_to, hyper, streaming, spool_dir, report, context))
+
+
+def _train_global(db, regions, date_from, date_to, hyper, streaming, spool_dir, report, context=None):
+    """Tijelo train_global (spool_dir dijele svi regioni; svaki region ima svoj podfolder)."""
+    hp = _hyperparams(hyper)
+    loader_kw = _loader_kw(hp)
+
+    # 1–5) po regionu; regioni bez podataka se preskaču (ne obaraju cijeli trening)
+    datas, skipped = [], []
+    for region in regions:
+        data = _region_data(db, region, date_from, date_to, hp, streaming, spool_dir, context)
+        if data["ok"]:
+            datas.append(data)
+        else:
+            skipped.append({"region": region, "error": data["error"]})
+    if not datas:
+        return {"region": GLOBAL_REGION, "ok": False, "error": "No region has enough data in date range",
+                "skipped": skipped}
+    feat_names = datas[0]["feat_names"]
+    if any(d["feat_names"] != feat_names for d in datas):
+        return {"region": GLOBAL_REGION, "ok": False, "error": "Feature columns differ across regions",
+                "skipped": skipped}
+    trained = [d["region"] for d in datas]
+
+    # spojeni train/val skup; id regiona = pozicija u `trained`
+    if streaming:
+        def joint(part, shuffle):
+            srcs = [{"spool": d["sp"], "starts": d[part], "mean": d["scaler"].mean_, "std": d["scaler"].std_,
+                     "region_id": rid} for rid, d in enumerate(datas)]
+            return ShardWindowDataset(srcs, hp["input_window"], hp["horizon"], Config.TRAIN_SHARD_HOURS,
+                                      shuffle=shuffle, shuffle_shards=Config.TRAIN_SHUFFLE_SHARDS)
+    else:
+        def joint(part, shuffle):
+            return ConcatDataset([d["make_ds"](d[part], shuffle, rid) for rid, d in enumerate(datas)])
+    ds_tr, ds_va = joint("train", True), joint("val", False)
+    n_train = len(ds_tr)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = GlobalLSTMSeq2Seq(
+        feat_dim=datas[0]["feat_dim"],
+        n_regions=len(trained),
+        emb_dim=hp["region_emb_dim"],
+        hidden_size=hp["hidden_size"],
+        num_layers=hp["num_layers"],
+        dropout=hp["dropout"],
+        horizon=hp["horizon"]
+    ).to(device)
+
+    tr_dl = DataLoader(ds_tr, batch_size=hp["batch_size"], shuffle=not streaming, drop_last=False, **loader_kw)
+    va_dl = DataLoader(ds_va, batch_size=hp["batch_size"], shuffle=False, drop_last=False, **loader_kw)
+    best_state, best_va, epochs_run, fit_s = _fit(model, tr_dl, va_dl, hp, device, report, GLOBAL_REGION, n_train)
+
+    # test po regionu (isti prozori kao kod modela po regionu) + ukupni MAPE preko svih test prozora
+    model.load_state_dict(best_state)
+    per_region, weighted = [], 0.0
+    for rid, d in enumerate(datas):
+        m = float(_test_mape(model, d, hp, device, region_id=rid))
+        per_region.append({"region": d["region"], "test_mape": m, "test_samples": int(d["test"].shape[0])})
+        weighted += m * d["test"].shape[0]
+
+    buffer = io.BytesIO()
+    torch.save({
+        "model": GLOBAL_ALGO,
+        "state_dict": best_state,
+        "feat_dim": datas[0]["feat_dim"],
+        "horizon": hp["horizon"],
+        "hidden_size": hp["hidden_size"],
+        "num_layers": hp["num_layers"],
+        "dropout": hp["dropout"],
+        "emb_dim": hp["region_emb_dim"],
+        "regions": trained,                                        # id embedding-a = indeks u listi
+        "scalers": {d["region"]: d["scaler"].to_dict() for d in datas},  # skaler targeta po regionu
+        "feat_names": feat_names,
+        "input_window": hp["input_window"],
+        "feature_version": FEATURE_VERSION,
+    }, buffer)
+
+    return {
+        "ok": True,
+        "region": GLOBAL_REGION,
+        "algo": GLOBAL_ALGO,
+        "regions": trained,
+        "artifact_bytes": buffer.getvalue(),
+        "feature_version": FEATURE_VERSION,
+        "metrics": {
+            "val_loss": float(best_va),
+            "test_mape": weighted / max(1, sum(p["test_samples"] for p in per_region)),
+            "per_region": per_region,
+        },
+        "skipped": skipped,
+        "gap_samples_dropped": int(sum(d["gap_dropped"] for d in datas)),
+        "timing": _timing(fit_s, epochs_run, n_train),
+    }
+
+
+def _compare_with_baseline(glob, results):
+    """Globalni model vs modeli po regionu (isti job, isti test prozori): MAPE po regionu i ukupno vrijeme."""
+    base = {r["region"]: r for r in results if r.get("ok")}
+    rows = [{
+        "region": p["region"],
+        "global_test_mape": p["test_mape"],
+        "baseline_test_mape": base[p["region"]]["metrics"]["test_mape"] if p["region"] in base else None,
+    } for p in glob["metrics"]["per_region"]]
+    return {
+        "per_region": rows,
+        "global_wall_s": glob["timing"]["wall_s"],
+        # zbir po regionu = vrijeme treninga modela po regionu bez paralelizacije
+        "baseline_wall_s": round(sum(r["timing"]["wall_s"] for r in base.values()), 3),
+        "baseline_fit_s": round(sum(r["timing"]["fit_s"] for r in base.values()), 3),
+        "global_fit_s": glob["timing"]["fit_s"],
+    }
@@ -0,0 +1,239 @@
+# train_jobs.py
+# Asinhroni trening job-ovi (isti obrazac kao ingest/jobs.py za import):
+# - ruta upiše job u kolekciju `train_jobs` i odmah vrati job id
+# - ograničeni pool pozadinskih niti (Config.TRAIN_JOB_WORKERS) izvršava train_lstm_on_regions
+#   + snimanje modela; broj job-ova u redu/u radu je ograničen (Config.TRAIN_JOB_QUEUE_LIMIT)
+# - napredak po regionu (epoha, batch, train/val loss, ETA) se periodično upisuje u job dokument,
+#   pa GET /train/jobs/<id> radi iz bilo kog Flask worker-a (i iz procesa paralelnog treninga)
+# - job nosi vlasnika (host/pid) i heartbeat (storage.jobowner): job-ovi procesa koji je pao ili se
+#   restartovao označe se kao failed ("interrupted") i ne zauzimaju mjesto u redu
+# - DELETE /train/jobs/<id> postavlja cancel_requested; trening ga provjerava između batch-eva
+#
+# Status: queued → running → done | failed | cancelled
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from pymongo import DESCENDING
+
+from config import Config
+from storage.jobowner import owner, watch_jobs
+from .train import TrainingCancelled, progress_labels, train_lstm_on_regions
+
+TRAIN_JOBS_COLL = "train_jobs"
+ACTIVE = ("queued", "running")
+# koliko često (s) se napredak upisuje u Mongo / provjerava otkazivanje dok job radi
+_PROGRESS_EVERY_S = 0.5
+
+_executor = None
+_executor_lock = threading.Lock()
+_cancelled = set()  # job id-jevi otkazani u ovom procesu (brza provjera bez upita)
+
+
+class QueueFull(Exception):
+    """Previše job-ova u redu / u radu (Config.TRAIN_JOB_QUEUE_LIMIT)."""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _get_executor(db):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # zaostali job-ovi prethodnog procesa (restart) → failed, prije prvog brojanja reda
+            watch_jobs(db[TRAIN_JOBS_COLL], ACTIVE)
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.TRAIN_JOB_WORKERS),
+                thread_name_prefix="train-job",
+            )
+    return _executor
+
+
+def init_jobs(db):
+    """Start aplikacije: oporavi zaostale job-ove prethodnog procesa i pokreni heartbeat (executor unaprijed)."""
+    _get_executor(db)
+
+
+class JobProgress:
+    """
+    progress callback za train_lstm_on_regions: stanje po regionu + periodičan upis u job dokument.
+    Picklable (bez Mongo konekcije) → radi i u procesima paralelnog treninga, gdje otvara svoju konekciju.
+    Baca TrainingCancelled kad je job otkazan.
+    """
+    def __init__(self, job_id, regions, db=None):
+        self.job_id = job_id
+        self.regions = list(regions)
+        self._db = db
+        self._state = {}
+        self._last_flush = {}
+        self._last_check = 0.0
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_db"] = None
+        return state
+
+    def _coll(self):
+        if self._db is None:
+            from db import get_db
+            self._db = get_db()
+        return self._db[TRAIN_JOBS_COLL]
+
+    def __call__(self, region, stage, **fields):
+        now = time.perf_counter()
+        st = self._state.setdefault(region, {"region": region})
+        if stage == "start":
+            st.update(status="running", t0=now)
+        elif stage == "fit":
+            st.update(t_fit=now)
+        elif stage == "done":
+            st.update(status="done" if fields.pop("ok") else "failed")
+        st.update({k: v for k, v in fields.items() if v is not None})
+
+        if stage != "batch" or now - self._last_flush.get(region, 0.0) >= _PROGRESS_EVERY_S:
+            self._flush(region, now)
+        if stage != "done" and self.cancel_requested(now):
+            raise TrainingCancelled(self.job_id)
+
+    def _flush(self, region, now):
+        self._last_flush[region] = now
+        st = self._state[region]
+        out = {k: v for k, v in st.items() if k not in ("t0", "t_fit")}
+        out["elapsed_s"] = round(now - st["t0"], 3)
+        # ETA iz brzine dosadašnjih epoha/batch-eva (gornja granica: early stopping može završiti ranije)
+        if st.get("t_fit") and st.get("epochs") and st.get("batches") and st.get("epoch"):
+            done = (st["epoch"] - 1 + min(st.get("batch", st["batches"]), st["batches"]) / st["batches"]) / st["epochs"]
+            if st.get("status") == "done" or done >= 1:
+                out["eta_s"] = 0.0
+            elif done > 0:
+                out["eta_s"] = round((now - st["t_fit"]) * (1 - done) / done, 1)
+        if st.get("status") in ("done", "failed"):
+            out["eta_s"] = 0.0
+        self._coll().update_one({"_id": self.job_id},
+                                {"$set": {f"progress.{self.regions.index(region)}": out}})
+
+    def cancel_requested(self, now=None):
+        if self.job_id in _cancelled:
+            return True
+        now = now or time.perf_counter()
+        if now - self._last_check < _PROGRESS_EVERY_S:
+            return False
+        self._last_check = now
+        doc = self._coll().find_one({"_id": self.job_id}, {"cancel_requested": 1})
+        return bool(doc and doc.get("cancel_requested"))
+
+
+def _run_job(db, job_id, persist):
+    coll = db[TRAIN_JOBS_COLL]
+    # otkazan dok je čekao u redu → ne počinji
+    if coll.update_one({"_id": job_id, "status": "queued"},
+                       {"$set": {"status": "running", "started_at": _now()}}).matched_count == 0:
+        return
+    job = coll.find_one({"_id": job_id})
+    progress = JobProgress(job_id, progress_labels(job["regions"], job["hyper"]), db)
+    try:
+        results = train_lstm_on_regions(db, job["regions"], job["date_from"], job["date_to"], job["hyper"],
+                                        progress=progress)
+        out = persist(db, results, job["hyper"], job["date_from"], job["date_to"])
+        coll.update_one({"_id": job_id}, {"$set": {"status": "done", "finished_at": _now(), "results": out}})
+    except TrainingCancelled:
+        coll.update_one({"_id": job_id}, {"$set": {"status": "cancelled", "finished_at": _now()}})
+    except Exception as e:
+        coll.update_one({"_id": job_id}, {"$set": {
+            "status": "failed", "finished_at": _now(), "error": f"Training error: {e}",
+        }})
+    finally:
+        _cancelled.discard(job_id)
+
+
+def submit_train_job(db, regions, date_from, date_to, hyper, persist):
+    """
+    Upis job dokumenta + predaja pool-u. persist(db, results, hyper, date_from, date_to) snima modele
+    i vraća listu za odgovor (isto kao sinhroni /train/start). Vraća job id (hex string).
+    Limit reda je atomičan: job se prvo upiše, pa ostaje samo ako ispred njega (created_at, _id) ima
+    manje od TRAIN_JOB_QUEUE_LIMIT aktivnih job-ova; inače se briše i baca QueueFull.
+    """
+    executor = _get_executor(db)
+    coll = db[TRAIN_JOBS_COLL]
+    job_id = uuid.uuid4().hex
+    created_at = _now()
+    coll.insert_one({
+        "_id": job_id,
+        "regions": list(regions),
+        "date_from": date_from,
+        "date_to": date_to,
+        "hyper": dict(hyper or {}),
+        "status": "queued",
+        "cancel_requested": False,
+        "created_at": created_at,
+        "owner": owner(),
+        "heartbeat_at": created_at,
+        "progress": [{"region": r, "status": "pending"} for r in progress_labels(regions, hyper or {})],
+    })
+    ahead = coll.count_documents({"status": {"$in": list(ACTIVE)}, "$or": [
+        {"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": job_id}}]})
+    if ahead >= Config.TRAIN_JOB_QUEUE_LIMIT:
+        coll.delete_one({"_id": job_id})
+        raise QueueFull(f"Training queue is full ({Config.TRAIN_JOB_QUEUE_LIMIT} jobs queued or running)")
+    executor.submit(_run_job, db, job_id, persist)
+    return job_id
+
+
+def cancel_job(db, job_id):
+    """
+    Otkaži job: queued → odmah cancelled; running → cancel_requested (trening staje na sljedećem batch-u).
+    Vraća "cancelled" (bio u redu), "running" (otkazivanje u toku), status završenog job-a ili None ako ne postoji.
+    """
+    coll = db[TRAIN_JOBS_COLL]
+    if coll.update_one({"_id": job_id, "status": "queued"},
+                       {"$set": {"status": "cancelled", "cancel_requested": True, "finished_at": _now()}}).matched_count:
+        return "cancelled"
+    if coll.update_one({"_id": job_id, "status": "running"}, {"$set": {"cancel_requested": True}}).matched_count:
+        _cancelled.add(job_id)
+        return "running"
+    doc = coll.find_one({"_id": job_id}, {"status": 1})
+    return doc["status"] if doc else None
+
+
+def _job_eta(doc):
+    """ETA job-a: preostalo aktivnih regiona + regioni na čekanju (prosječno trajanje započetih) / paralelnost."""
+    if doc.get("status") != "running":
+        return None
+    prog = doc.get("progress") or []
+    started = [p for p in prog if p.get("status") != "pending"]
+    totals = [p["elapsed_s"] + p["eta_s"] for p in started if p.get("eta_s") is not None and "elapsed_s" in p]
+    if not totals:
+        return None
+    pending = sum(1 for p in prog if p.get("status") == "pending")
+    remaining = sum(p["eta_s"] for p in started if p.get("status") == "running" and p.get("eta_s") is not None)
+    remaining += pending * sum(totals) / len(totals)
+    workers = max(1, min(int(doc.get("hyper", {}).get("region_workers", Config.TRAIN_REGION_WORKERS)), len(prog)))
+    return round(remaining / workers, 1)
+
+
+def _serialize(doc):
+    out = {k: v for k, v in doc.items() if k != "_id"}
+    out["job_id"] = doc["_id"]
+    for k in ("created_at", "started_at", "finished_at"):
+        if out.get(k) is not None:
+            out[k] = out[k].isoformat()
+    out["eta_s"] = _job_eta(doc)
+    return out
+
+
+def get_job(db, job_id):
+    """Job dokument za JSON odgovor ili None."""
+    doc = db[TRAIN_JOBS_COLL].find_one({"_id": job_id})
+    return _serialize(doc) if doc else None
+
+
+def list_jobs(db, status=None, limit=50):
+    """Posljednji trening job-ovi (najnoviji prvi), bez pune `results` sekcije."""
+    q = {"status": status} if status else {}
+    cur = db[TRAIN_JOBS_COLL].find(q, {"results": 0}).sort("created_at", DESCENDING).limit(int(limit))
+    return [_serialize(d) for d in cur]
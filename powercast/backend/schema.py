@@ -0,0 +1,217 @@
+# schema.py
+# Centralna šema baze: svi indeksi na jednom mjestu + verzionisane migracije.
+# Pokreće se JEDNOM pri startu aplikacije (create_app → bootstrap_schema),
+# pa rute više ne rade create_index / list_collection_names na svakom request-u.
+#
+# Trenutna verzija šeme čuva se u kolekciji `schema_meta` ({_id: "schema", version, applied: [...]}).
+# Nova migracija = novi unos na kraju MIGRATIONS (verzija = prethodna + 1); stare se ne mijenjaju.
+#
+#   python -m schema            → primijeni migracije koje nedostaju
+#   python -m schema --status   → samo prikaži verziju
+
+import argparse
+import json
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING
+
+META_COLL = "schema_meta"
+
+# Deklaracija svih indeksa: kolekcija → lista (ključevi, opcije)
+INDEXES = {
+    "series_load_hourly": [
+        ([("region", ASCENDING), ("ts", ASCENDING)], {"unique": True}),
+    ],
+    "series_weather_hourly": [
+        ([("location", ASCENDING), ("ts", ASCENDING)], {"unique": True}),
+    ],
+    "holidays": [
+        ([("Region", ASCENDING), ("Date", ASCENDING)], {"unique": True}),
+    ],
+    "import_ledger": [
+        ([("type", ASCENDING), ("sha256", ASCENDING)], {"unique": True}),
+        ([("type", ASCENDING), ("ts_from", ASCENDING), ("ts_to", ASCENDING)], {}),
+    ],
+    "import_jobs": [
+        ([("created_at", DESCENDING)], {}),
+        ([("type", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)], {}),
+        # aktivni job-ovi bez obzira na tip (heartbeat / oporavak, storage.jobowner)
+        ([("status", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    # najnoviji model po regionu: find_one({"region"}, sort=created_at desc)
+    "models": [
+        ([("region", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("created_at", DESCENDING)], {}),
+    ],
+    # update_many is_latest po (region, start_date) + pretraga po regionu/opsegu, najnoviji prvi
+    "forecasts": [
+        ([("region", ASCENDING), ("start_date", ASCENDING), ("is_latest", ASCENDING)], {}),
+        ([("region", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("created_at", DESCENDING)], {}),
+    ],
+    # verzije (ključ, mjesec) particija satnih serija (storage.partitions)
+    "series_partitions": [
+        ([("kind", ASCENDING), ("key", ASCENDING), ("month", ASCENDING)], {"unique": True}),
+    ],
+    # katalog pokrivenosti: jedan dokument po (kolekcija, ključ) (storage.catalog)
+    "series_catalog": [
+        ([("coll", ASCENDING), ("key", ASCENDING)], {"unique": True}),
+    ],
+    # indeks run-ova / rupa load serije po regionu (storage.gaps)
+    "series_gaps": [
+        ([("coll", ASCENDING), ("key", ASCENDING)], {"unique": True}),
+    ],
+    # perzistentne feature matrice (ml.featurematrix): meta po (region, config) + mjesečni chunk-ovi
+    "feature_matrix": [
+        ([("region", ASCENDING), ("config_hash", ASCENDING)], {"unique": True}),
+        ([("location", ASCENDING)], {}),
+        ([("holiday_region", ASCENDING)], {}),
+    ],
+    "feature_chunks": [
+        ([("region", ASCENDING), ("config_hash", ASCENDING), ("month", ASCENDING)], {"unique": True}),
+    ],
+    # asinhroni trening job-ovi (ml.train_jobs): lista najnovijih + brojanje aktivnih (limit reda)
+    "train_jobs": [
+        ([("created_at", DESCENDING)], {}),
+        ([("status", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+}
+
+# Stanje posljednjeg bootstrap-a u ovom procesu (za /health bez dodatnog upita)
+STATE = {"version": None, "target": None, "applied_now": [], "error": None}
+
+
+def create_indexes(db, collections):
+    """Kreiraj deklarisane indekse za date kolekcije (create_index je idempotentan na serveru)."""
+    for name in collections:
+        for keys, opts in INDEXES[name]:
+            db[name].create_index(keys, **opts)
+
+
+def _m1_series_and_imports(db):
+    create_indexes(db, ["series_load_hourly", "series_weather_hourly", "holidays",
+                        "import_ledger", "import_jobs"])
+
+
+def _m2_models_and_forecasts(db):
+    create_indexes(db, ["models", "forecasts"])
+
+
+def _m3_series_partitions(db):
+    create_indexes(db, ["series_partitions"])
+
+
+def _m4_series_catalog(db):
+    # jednokratna izgradnja kataloga za postojeće podatke (kasnije ga održava svaki upis)
+    from storage.catalog import rebuild_catalog
+    from storage.series import SERIES, collection_name
+
+    create_indexes(db, ["series_catalog"])
+    rebuild_catalog(db, [collection_name(kind) for kind in SERIES] + ["holidays"])
+
+
+def _m5_series_gaps(db):
+    from storage.gaps import rebuild_gap_index
+    from storage.series import collection_name
+
+    create_indexes(db, ["series_gaps"])
+    rebuild_gap_index(db, [collection_name("load")])
+
+
+def _m6_feature_matrix(db):
+    create_indexes(db, ["feature_matrix", "feature_chunks"])
+
+
+def _m7_train_jobs(db):
+    create_indexes(db, ["train_jobs"])
+
+
+def _m8_import_jobs_status(db):
+    create_indexes(db, ["import_jobs"])
+
+
+# (verzija, opis, funkcija) — redoslijed je bitan
+MIGRATIONS = [
+    (1, "unique indeksi satnih serija, praznika, import ledger-a i job-ova", _m1_series_and_imports),
+    (2, "indeksi models(region, created_at) i forecasts(region, start_date, is_latest)", _m2_models_and_forecasts),
+    (3, "unique indeks series_partitions(kind, key, month) za invalidaciju feature store-a", _m3_series_partitions),
+    (4, "katalog pokrivenosti series_catalog(coll, key) + početna izgradnja", _m4_series_catalog),
+    (5, "indeks run-ova / rupa series_gaps(coll, key) + početna izgradnja", _m5_series_gaps),
+    (6, "indeksi feature_matrix(region, config_hash) i feature_chunks(region, config_hash, month)", _m6_feature_matrix),
+    (7, "indeksi train_jobs(created_at) i train_jobs(status, created_at)", _m7_train_jobs),
+    (8, "indeks import_jobs(status, created_at) za oporavak prekinutih job-ova", _m8_import_jobs_status),
+]
+TARGET_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(db):
+    doc = db[META_COLL].find_one({"_id": "schema"}, {"version": 1})
+    return int(doc["version"]) if doc else 0
+
+
+def migrate(db):
+    """
+    Primijeni sve migracije novije od trenutne verzije, jednu po jednu.
+    Verzija se upisuje poslije svake uspješne migracije; greška prekida niz
+    (sljedeći start nastavlja od posljednje uspješne).
+    Vraća listu primijenjenih verzija.
+    """
+    version = current_version(db)
+    applied = []
+    for v, desc, fn in MIGRATIONS:
+        if v <= version:
+            continue
+        fn(db)
+        db[META_COLL].update_one(
+            {"_id": "schema"},
+            {"$set": {"version": v, "updated_at": datetime.now(timezone.utc)},
+             "$push": {"applied": {"version": v, "description": desc,
+                                   "applied_at": datetime.now(timezone.utc)}}},
+            upsert=True,
+        )
+        applied.append(v)
+        version = v
+    return applied
+
+
+def bootstrap_schema(db):
+    """Poziva se iz create_app(); greška se bilježi u STATE (vidljivo na /health), a ne ruši start."""
+    STATE.update({"target": TARGET_VERSION, "applied_now": [], "error": None})
+    try:
+        STATE["applied_now"] = migrate(db)
+    except Exception as e:
+        STATE["error"] = str(e)
+    try:
+        STATE["version"] = current_version(db)
+    except Exception as e:
+        STATE["error"] = STATE["error"] or str(e)
+    return dict(STATE)
+
+
+def schema_status():
+    """Sažetak za /health."""
+    return {
+        "version": STATE["version"],
+        "target": STATE["target"],
+        "up_to_date": STATE["version"] is not None and STATE["version"] >= TARGET_VERSION,
+        "error": STATE["error"],
+    }
+
+
+def main(argv=None):
+    from db import get_db
+
+    parser = argparse.ArgumentParser(description="Migracije šeme (indeksi) PowerCast baze.")
+    parser.add_argument("--status", action="store_true", help="samo prikaži trenutnu verziju")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.status:
+        print(json.dumps({"version": current_version(db), "target": TARGET_VERSION}))
+        return
+    applied = migrate(db)
+    print(json.dumps({"applied": applied, "version": current_version(db), "target": TARGET_VERSION}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+# storage/
+# Tanak repository sloj za satne serije (load / weather): koja kolekcija i koji format
+# čuva podatke zavisi od Config.SERIES_BACKEND, a pozivaoci (import, ML, rute)
+# dobijaju kolekciju / upis kroz storage.series i ne znaju za razliku.
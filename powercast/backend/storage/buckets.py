@@ -0,0 +1,209 @@
+# buckets.py
+# Kompaktan format satnih serija: JEDAN dokument po ključu (region/location) i NY lokalnom danu.
+#
+#   {
+#     region: "N.Y.C.",            # ili location (weather)
+#     day: 2018-11-04 00:00,       # NY lokalni kalendarski dan (naive)
+#     ts_from: 2018-11-04 04:00,   # NAIVE UTC sat koji odgovara lokalnoj ponoći
+#     n: 25,                       # broj sati tog lokalnog dana (23 / 24 / 25 zbog DST-a)
+#     ts_first / ts_last,          # prvi / posljednji sat koji ima vrijednost (NAIVE UTC)
+#     count: 25,                   # broj sati sa bar jednom vrijednošću
+#     values: {load_mw: <float32 blob dužine n>, ...},   # pozicija i = ts_from + i sati, NaN = nema
+#     min: {load_mw: ...}, max: {load_mw: ...}
+#   }
+#
+# Višegodišnje čitanje jednog regiona je ~1.5k dokumenata umjesto ~35k, a dekodiranje
+# je np.frombuffer po bucket-u (bez Python dict-a po satu).
+
+import numpy as np
+import pandas as pd
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+from config import Config
+from ingest.tz import NY_TZ
+
+_HOUR = np.timedelta64(1, "h")
+
+
+def encode_values(arr):
+    return Binary(np.asarray(arr, dtype="<f4").tobytes())
+
+
+def decode_values(blob, n):
+    arr = np.frombuffer(blob, dtype="<f4")
+    if arr.shape[0] != n:  # zaštita od oštećenog bucket-a
+        out = np.full(n, np.nan, dtype=np.float32)
+        out[:min(n, arr.shape[0])] = arr[:n]
+        return out
+    return arr
+
+
+def _naive_utc(ts):
+    ts = pd.to_datetime(ts)
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    return ts
+
+
+def local_days(ts_naive_utc):
+    """NAIVE UTC satovi → NY lokalni dan (naive ponoć)."""
+    return (ts_naive_utc.dt.tz_localize("UTC").dt.tz_convert(NY_TZ)
+            .dt.normalize().dt.tz_localize(None))
+
+
+def day_bounds(days):
+    """
+    Za niz lokalnih dana vrati (ts_from, n): NAIVE UTC početak dana i broj sati (23/24/25).
+    Lokalna ponoć nikad nije dvosmislena u America/New_York (DST prelaz je u 02:00).
+    """
+    days = pd.DatetimeIndex(days)
+    start = days.tz_localize(NY_TZ).tz_convert("UTC").tz_localize(None)
+    end = (days + pd.Timedelta(days=1)).tz_localize(NY_TZ).tz_convert("UTC").tz_localize(None)
+    n = ((end - start) / pd.Timedelta(hours=1)).astype(int)
+    return start, n
+
+
+def bucket_query_days(ts_from, ts_to):
+    """Opseg lokalnih dana koji sigurno pokriva [ts_from, ts_to] (NAIVE UTC), ±1 dan."""
+    lo = pd.Timestamp(ts_from).normalize() - pd.Timedelta(days=1)
+    hi = pd.Timestamp(ts_to).normalize() + pd.Timedelta(days=1)
+    return lo.to_pydatetime(), hi.to_pydatetime()
+
+
+def decode_buckets(docs, fields=None):
+    """
+    Bucket dokumenti → (ts: datetime64[ns] niz, {kolona: float niz}) — sve u NumPy, bez satnih dict-ova.
+    fields=None → sve kolone koje se pojavljuju u bucket-ima.
+    Sati bez ijedne vrijednosti se izostavljaju (isto kao kod documents backend-a).
+    """
+    docs = list(docs)
+    if not docs:
+        return np.array([], dtype="datetime64[ns]"), {c: np.array([], dtype=float) for c in (fields or [])}
+
+    if fields is None:
+        fields = sorted({c for d in docs for c in d.get("values", {})})
+
+    ts_parts, col_parts = [], {c: [] for c in fields}
+    for d in docs:
+        n = int(d["n"])
+        t0 = np.datetime64(d["ts_from"], "ns")
+        ts_parts.append(t0 + np.arange(n) * _HOUR)
+        vals = d.get("values", {})
+        for c in fields:
+            blob = vals.get(c)
+            col_parts[c].append(decode_values(blob, n) if blob is not None else np.full(n, np.nan, dtype=np.float32))
+
+    ts = np.concatenate(ts_parts)
+    cols = {c: np.concatenate(col_parts[c]).astype(float) for c in fields}
+    if fields:
+        has = np.zeros(ts.shape[0], dtype=bool)
+        for c in fields:
+            has |= ~np.isnan(cols[c])
+        ts = ts[has]
+        cols = {c: v[has] for c, v in cols.items()}
+    return ts, cols
+
+
+def _bucket_doc(key_field, key, day, ts_from, n, arrays):
+    """Sastavi bucket dokument iz float32 nizova dužine n (po koloni)."""
+    has = np.zeros(n, dtype=bool)
+    for arr in arrays.values():
+        has |= ~np.isnan(arr)
+    idx = np.flatnonzero(has)
+    t0 = pd.Timestamp(ts_from)
+    doc = {
+        key_field: key,
+        "day": pd.Timestamp(day).to_pydatetime(),
+        "ts_from": t0.to_pydatetime(),
+        "n": int(n),
+        "count": int(idx.shape[0]),
+        "ts_first": (t0 + pd.Timedelta(hours=int(idx[0]))).to_pydatetime() if idx.size else None,
+        "ts_last": (t0 + pd.Timedelta(hours=int(idx[-1]))).to_pydatetime() if idx.size else None,
+        "values": {c: encode_values(a) for c, a in arrays.items()},
+        "min": {c: float(np.nanmin(a)) for c, a in arrays.items() if not np.isnan(a).all()},
+        "max": {c: float(np.nanmax(a)) for c, a in arrays.items() if not np.isnan(a).all()},
+    }
+    return doc
+
+
+def write_buckets(coll, g: pd.DataFrame, key_field: str, value_cols, diff=True, write_opts=None, timer=None):
+    """
+    Upis satnog frame-a u bucket kolekciju (isti ugovor/brojači kao write_hourly):
+      1) sati se grupišu po (ključ, NY lokalni dan)
+      2) postojeći bucket-i tih dana se čitaju jednim upitom i dekodiraju
+      3) nove vrijednosti (float32) se upisuju na svoje pozicije; NaN ne briše postojeću vrijednost
+      4) šalju se samo bucket-i koji su se promijenili (diff=False → svi dotaknuti bucket-i)
+    Brojači inserted/updated/unchanged su po SATU, upserts/modified po bucket dokumentu.
+    """
+    cols = list(value_cols)
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    stats = {"batches": 0, "upserts": 0, "modified": 0, "matched": 0}
+    if g.empty:
+        stats.update(counts)
+        return stats
+
+    with timer.stage("diff"):
+        g = g.copy()
+        g["ts"] = _naive_utc(g["ts"])
+        g["day"] = local_days(g["ts"])
+        keys = sorted(g[key_field].astype(str).unique().tolist())
+        dmin, dmax = g["day"].min().to_pydatetime(), g["day"].max().to_pydatetime()
+        existing = {
+            (d[key_field], pd.Timestamp(d["day"])): d
+            for d in coll.find({key_field: {"$in": keys}, "day": {"$gte": dmin, "$lte": dmax}}, {"_id": 0})
+        }
+
+    with timer.stage("build_ops"):
+        uniq_days = pd.DatetimeIndex(g["day"].unique())
+        starts, ns = day_bounds(uniq_days)
+        bounds = {d: (s, int(n)) for d, s, n in zip(uniq_days, starts, ns)}
+
+        ops = []
+        for (key, day), part in g.groupby([key_field, "day"], sort=True):
+            key = str(key)
+            ts_from, n = bounds[pd.Timestamp(day)]
+            pos = ((part["ts"].to_numpy() - np.datetime64(ts_from, "ns")) // _HOUR).astype(int)
+            ok = (pos >= 0) & (pos < n)
+            pos = pos[ok]
+
+            old_doc = existing.get((key, pd.Timestamp(day)))
+            old_vals = old_doc.get("values", {}) if old_doc else {}
+            all_cols = list(dict.fromkeys(cols + list(old_vals)))
+
+            old = {c: (decode_values(old_vals[c], n).copy() if c in old_vals
+                       else np.full(n, np.nan, dtype=np.float32)) for c in all_cols}
+            new = {c: a.copy() for c, a in old.items()}
+            for c in cols:
+                v = part[c].to_numpy(dtype=float)[ok].astype(np.float32)
+                m = ~np.isnan(v)
+                new[c][pos[m]] = v[m]
+
+            # brojanje po satu: postojao (bar jedna kolona) / promijenjen
+            old_has = np.zeros(n, dtype=bool)
+            changed = np.zeros(n, dtype=bool)
+            for c in all_cols:
+                old_has |= ~np.isnan(old[c])
+                changed |= ~(np.isnan(old[c]) & np.isnan(new[c])) & (old[c] != new[c])
+            touched = np.zeros(n, dtype=bool)
+            touched[pos] = True
+            counts["inserted"] += int((touched & ~old_has).sum())
+            counts["updated"] += int((touched & old_has & changed).sum())
+            counts["unchanged"] += int((touched & old_has & ~changed).sum())
+
+            if diff and old_doc is not None and not changed.any():
+                continue
+            doc = _bucket_doc(key_field, key, day, ts_from, n, new)
+            ops.append(UpdateOne({key_field: key, "day": doc["day"]}, {"$set": doc}, upsert=True))
+
+    batch_size = max(1, int((write_opts or {}).get("batch_size") or Config.IMPORT_BATCH_SIZE))
+    with timer.stage("write"):
+        for i in range(0, len(ops), batch_size):
+            res = coll.bulk_write(ops[i:i + batch_size], ordered=False)
+            stats["batches"] += 1
+            stats["upserts"] += res.upserted_count
+            stats["modified"] += res.modified_count
+            stats["matched"] += res.matched_count
+
+    stats.update(counts)
+    return stats
@@ -0,0 +1,134 @@
+# catalog.py
+# Katalog pokrivenosti (kolekcija `series_catalog`): jedan dokument po kolekciji serije i ključu
+#
+#   {coll: "series_load_hourly", key: "N.Y.C.", from: <ts>, to: <ts>, count: 35064, last_import: <datetime>}
+#
+# Održava se inkrementalno pri svakom upisu (ingest.writer.write_hourly, /import/holidays):
+# jedan update_one po ključu ($min from, $max to, $inc ili $set count), pa je svaki dokument
+# uvijek konzistentan. /series/coverage i /series/coverage/summary čitaju samo katalog (O(ključeva)).
+#
+# Postojeće baze: katalog se gradi jednom (schema migracija 4), a ručno:
+#   python -m storage.catalog --rebuild                  → sve kolekcije serija + holidays
+#   python -m storage.catalog --rebuild --kinds load     → samo load (trenutni SERIES_BACKEND)
+
+import argparse
+import json
+from datetime import datetime, timezone
+
+import pandas as pd
+from pymongo import UpdateOne
+
+from .series import SERIES, collection_name, coverage_fields
+from .writehooks import register_write_hook
+
+CATALOG_COLL = "series_catalog"
+
+# kolekcija → (ključ, izrazi za $group: from, to, broj) za sve backend-e + holidays
+_SOURCES = {
+    collection_name(kind, backend): (spec["key"], coverage_fields(kind, backend))
+    for kind, spec in SERIES.items() for backend in ("documents", "timeseries", "buckets")
+}
+_SOURCES["holidays"] = ("Region", ("$Date", "$Date", 1))
+
+
+def catalog_source(name):
+    return _SOURCES.get(name)
+
+
+def _scan(db, name, keys=None):
+    """Agregacija pokrivenosti po ključu nad izvornom kolekcijom (opciono samo za date ključeve)."""
+    kf, (f_from, f_to, f_count) = _SOURCES[name]
+    pipeline = [{"$match": {kf: {"$in": list(keys)}}}] if keys is not None else []
+    pipeline.append({"$group": {"_id": f"${kf}", "from": {"$min": f_from},
+                                "to": {"$max": f_to}, "count": {"$sum": f_count}}})
+    return list(db[name].aggregate(pipeline, allowDiskUse=True))
+
+
+def update_catalog(coll, key_field, g, inserted=None, time_field="ts"):
+    """
+    Ažuriraj katalog nakon upisa frame-a g (kolone key_field, time_field) u kolekciju coll.
+    inserted: {ključ: broj NOVIH zapisa} (poznat iz diff-a) → $inc count.
+    Bez njega se count ključeva iz g ponovo prebrojava nad izvornom kolekcijom (samo ti ključevi, preko indeksa).
+    Vraća broj ažuriranih ključeva.
+    """
+    if catalog_source(coll.name) is None or g is None or g.empty:
+        return 0
+    now = datetime.now(timezone.utc)
+    ts = pd.to_datetime(g[time_field])
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    span = (pd.DataFrame({"key": g[key_field].astype(str).to_numpy(), "ts": ts.to_numpy()})
+              .groupby("key")["ts"].agg(["min", "max"]))
+
+    if inserted is not None:
+        ops = [
+            UpdateOne(
+                {"coll": coll.name, "key": k},
+                {"$min": {"from": r["min"].to_pydatetime()}, "$max": {"to": r["max"].to_pydatetime()},
+                 "$inc": {"count": int(inserted.get(k, 0))}, "$set": {"last_import": now}},
+                upsert=True,
+            )
+            for k, r in span.iterrows()
+        ]
+    else:
+        ops = [
+            UpdateOne(
+                {"coll": coll.name, "key": d["_id"]},
+                {"$set": {"from": d["from"], "to": d["to"], "count": int(d["count"]), "last_import": now}},
+                upsert=True,
+            )
+            for d in _scan(coll.database, coll.name, span.index.tolist())
+        ]
+    if ops:
+        coll.database[CATALOG_COLL].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+register_write_hook("catalog", lambda coll, key_field, g, inserted: update_catalog(coll, key_field, g, inserted),
+                    name="storage.catalog.update_catalog")
+
+
+def rebuild_catalog(db, names):
+    """Ponovo izgradi katalog za date kolekcije iz izvornih podataka (jedna agregacija po kolekciji)."""
+    out = {}
+    now = datetime.now(timezone.utc)
+    for name in names:
+        rows = _scan(db, name)
+        db[CATALOG_COLL].delete_many({"coll": name})
+        if rows:
+            db[CATALOG_COLL].insert_many([
+                {"coll": name, "key": d["_id"], "from": d["from"], "to": d["to"],
+                 "count": int(d["count"]), "last_import": now}
+                for d in rows
+            ])
+        out[name] = len(rows)
+    return out
+
+
+def catalog_entries(db, name, keys=None):
+    """Unosi kataloga za kolekciju (sortirano po ključu), opciono samo za date ključeve."""
+    q = {"coll": name}
+    if keys:
+        q["key"] = {"$in": list(keys)}
+    return list(db[CATALOG_COLL].find(q, {"_id": 0}).sort("key", 1))
+
+
+def main(argv=None):
+    from db import get_db
+
+    parser = argparse.ArgumentParser(description="Katalog pokrivenosti satnih serija.")
+    parser.add_argument("--rebuild", action="store_true", help="ponovo izgradi katalog iz podataka")
+    parser.add_argument("--kinds", nargs="+", default=list(SERIES) + ["holidays"],
+                        choices=list(SERIES) + ["holidays"])
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    names = [k if k == "holidays" else collection_name(k) for k in args.kinds]
+    if args.rebuild:
+        print(json.dumps({"rebuilt": rebuild_catalog(db, names)}))
+        return
+    print(json.dumps({n: len(catalog_entries(db, n)) for n in names}))
+
+
+if __name__ == "__main__":
+    main()
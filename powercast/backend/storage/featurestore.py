@@ -0,0 +1,179 @@
+# featurestore.py
+# Lokalni kolonski keš satnih serija na disku (Config.FEATURE_STORE_DIR), za trening koji
+# iznova čita iste godine load/weather podataka.
+#
+#   <FEATURE_STORE_DIR>/<backend>/<kind>/<ključ>/
+#       manifest.json                 {"2018-11": {"version": 3, "cols": ["load_mw"], "rows": 720}, ...}
+#       2018-11/ts.npy                int64 ns (NAIVE UTC)
+#       2018-11/load_mw.npy           float64
+#
+# Particija = (ključ, UTC mjesec). Svaki upis kroz write_hourly povećava verziju particije u Mongo-u
+# (storage.partitions); read_series_cached jednim upitom čita verzije i iz Mongo-a ponovo učitava
+# samo particije čija se verzija promijenila (ili nedostaju / nemaju traženu kolonu).
+# Ostale se čitaju sa diska preko np.load(mmap_mode="r").
+#
+#   python -m storage.featurestore --info
+#   python -m storage.featurestore --clear
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from .partitions import month_bounds, month_range, partition_versions
+from .series import read_series, series_backend, series_frame
+
+_MANIFEST = "manifest.json"
+
+
+def store_root():
+    return Path(Config.FEATURE_STORE_DIR) if Config.FEATURE_STORE_DIR else None
+
+
+def _key_dir(root, kind, key):
+    return root / series_backend() / kind / quote(str(key), safe="")
+
+
+def _load_manifest(kdir):
+    try:
+        with open(kdir / _MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomic_json(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".manifest-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _write_partition(kdir, month, ts, cols):
+    """Upiši particiju u privremeni folder pa ga zamijeni (čitalac nikad ne vidi pola particije)."""
+    tmp = Path(tempfile.mkdtemp(dir=kdir, prefix=f".{month}-"))
+    np.save(tmp / "ts.npy", ts.astype("datetime64[ns]").view("<i8"))
+    for c, v in cols.items():
+        np.save(tmp / f"{c}.npy", np.asarray(v, dtype=np.float64))
+    target = kdir / month
+    if target.exists():
+        shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+
+def _read_partition(kdir, month, fields):
+    pdir = kdir / month
+    ts = np.load(pdir / "ts.npy", mmap_mode="r").view("datetime64[ns]")
+    return ts, {c: np.load(pdir / f"{c}.npy", mmap_mode="r") for c in fields}
+
+
+def _stale_runs(months, stale):
+    """Uzastopni zastarjeli mjeseci → (prvi, posljednji) — jedan read_series po bloku."""
+    runs, start = [], None
+    for i, m in enumerate(months):
+        if m in stale and start is None:
+            start = i
+        if start is not None and (m not in stale or i == len(months) - 1):
+            end = i if m in stale else i - 1
+            runs.append((months[start], months[end]))
+            start = None
+    return runs
+
+
+def read_series_cached(db, kind, key, ts_from, ts_to, fields):
+    """
+    Isti ugovor kao read_series(..., fields, include_end=True), ali preko lokalnog keša particija.
+    Isključen keš (FEATURE_STORE_DIR prazan) → direktno read_series.
+    """
+    root = store_root()
+    if root is None or not fields:
+        return read_series(db, kind, key, ts_from, ts_to, fields=fields)
+
+    fields = list(fields)
+    t_from, t_to = pd.Timestamp(ts_from), pd.Timestamp(ts_to)
+    months = month_range(t_from, t_to)
+    kdir = _key_dir(root, kind, key)
+    kdir.mkdir(parents=True, exist_ok=True)
+
+    # 1) verzije iz Mongo-a (jedan upit) vs manifest
+    versions = partition_versions(db, kind, key, months)
+    manifest = _load_manifest(kdir)
+    stale = set()
+    for m in months:
+        entry = manifest.get(m)
+        if (entry is None or entry.get("version") != versions[m]
+                or not set(fields) <= set(entry.get("cols", []))
+                or not (kdir / m).is_dir()):
+            stale.add(m)
+
+    # 2) ponovo učitaj samo zastarjele particije (pune mjesece, uz kolone koje su već bile u kešu)
+    for first, last in _stale_runs(months, stale):
+        lo, _ = month_bounds(first)
+        _, hi = month_bounds(last)
+        cols = sorted(set(fields).union(*(manifest.get(m, {}).get("cols", []) for m in months if first <= m <= last)))
+        df = read_series(db, kind, key, lo, hi, fields=cols, include_end=False)
+        ts = df["ts"].to_numpy(dtype="datetime64[ns]") if not df.empty else np.array([], dtype="datetime64[ns]")
+        part = pd.Series(ts).dt.strftime("%Y-%m").to_numpy() if ts.size else np.array([], dtype=object)
+        for m in (mm for mm in months if first <= mm <= last):
+            sel = part == m
+            data = {c: (df[c].to_numpy(dtype=float)[sel] if c in df.columns else np.full(int(sel.sum()), np.nan))
+                    for c in cols}
+            _write_partition(kdir, m, ts[sel], data)
+            manifest[m] = {"version": versions[m], "cols": cols, "rows": int(sel.sum())}
+    if stale:
+        _atomic_json(kdir / _MANIFEST, manifest)
+
+    # 3) spoji particije (mmap) i odsijeci na [ts_from, ts_to]
+    ts_parts, col_parts = [], {c: [] for c in fields}
+    for m in months:
+        ts, cols = _read_partition(kdir, m, fields)
+        ts_parts.append(ts)
+        for c in fields:
+            col_parts[c].append(cols[c])
+    ts = np.concatenate(ts_parts) if ts_parts else np.array([], dtype="datetime64[ns]")
+    cols = {c: (np.concatenate(v) if v else np.array([], dtype=np.float64)) for c, v in col_parts.items()}
+    sel = (ts >= np.datetime64(t_from, "ns")) & (ts <= np.datetime64(t_to, "ns"))
+    return series_frame(ts[sel], {c: v[sel] for c, v in cols.items()})
+
+
+def store_info(root=None):
+    """Sažetak keša: broj particija i bajtova po backend/kind/ključ."""
+    root = root or store_root()
+    out = []
+    if root is None or not root.exists():
+        return out
+    for manifest in sorted(root.glob(f"*/*/*/{_MANIFEST}")):
+        kdir = manifest.parent
+        size = sum(p.stat().st_size for p in kdir.rglob("*.npy"))
+        backend, kind = kdir.parent.parent.name, kdir.parent.name
+        parts = _load_manifest(kdir)
+        out.append({"backend": backend, "kind": kind, "dir": kdir.name,
+                    "partitions": len(parts), "rows": sum(p.get("rows", 0) for p in parts.values()),
+                    "bytes": size})
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalni feature store satnih serija.")
+    parser.add_argument("--info", action="store_true", help="prikaži sadržaj keša")
+    parser.add_argument("--clear", action="store_true", help="obriši cijeli keš")
+    args = parser.parse_args(argv)
+
+    root = store_root()
+    if root is None:
+        print(json.dumps({"error": "FEATURE_STORE_DIR nije postavljen"}))
+        return
+    if args.clear and root.exists():
+        shutil.rmtree(root)
+    print(json.dumps({"root": str(root), "keys": store_info(root)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# gaps.py
+# Indeks kontinuiranih satnih nizova (run-ova) load serije po regionu (kolekcija `series_gaps`):
+#
+#   {coll: "series_load_hourly", key: "N.Y.C.", runs: [{from: <ts>, to: <ts>}, ...], hours: N,
+#    version: N, updated_at}
+#
+# run = maksimalan niz uzastopnih sati koji postoje u bazi (from/to uključivo, NAIVE UTC);
+# rupe su razmaci između susjednih run-ova. Indeks se održava pri svakom upisu
+# (ingest.writer.write_hourly spaja upisane sate u postojeće run-ove), pa trening i prognoza
+# provjeravaju prozore bez čitanja samih podataka.
+#
+#   python -m storage.gaps --rebuild     → izgradi indeks iz postojećih podataka (trenutni SERIES_BACKEND)
+
+import argparse
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from pymongo.errors import DuplicateKeyError
+
+from .series import SERIES, collection_name, read_series
+from .writehooks import register_write_hook
+
+GAPS_COLL = "series_gaps"
+_HOUR = np.timedelta64(1, "h")
+
+# load kolekcije svih backend-a → backend (indeks se vodi samo za load)
+_LOAD_COLLECTIONS = {collection_name("load", b): b for b in ("documents", "timeseries", "buckets")}
+
+
+def hour_runs(ts):
+    """NAIVE UTC satovi (bilo kojim redom, sa duplikatima) → (from, to) nizovi run-ova (datetime64[ns])."""
+    ts = np.unique(np.asarray(pd.to_datetime(ts).to_numpy(), dtype="datetime64[ns]"))
+    if ts.size == 0:
+        return ts, ts
+    brk = np.flatnonzero(np.diff(ts) != _HOUR)
+    starts = np.concatenate([ts[:1], ts[brk + 1]])
+    ends = np.concatenate([ts[brk], ts[-1:]])
+    return starts, ends
+
+
+def merge_runs(a, b):
+    """Unija dva skupa run-ova ((from, to) nizovi); run-ovi koji se dodiruju ili preklapaju se spajaju."""
+    starts = np.concatenate([a[0], b[0]])
+    ends = np.concatenate([a[1], b[1]])
+    if starts.size == 0:
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    # novi run počinje tamo gdje je početak dalje od (max kraj do sada + 1h)
+    reach = np.maximum.accumulate(ends)
+    new = np.concatenate([[True], starts[1:] > reach[:-1] + _HOUR])
+    idx = np.flatnonzero(new)
+    return starts[idx], np.maximum.reduceat(ends, idx)
+
+
+def _runs_from_doc(doc):
+    runs = (doc or {}).get("runs") or []
+    return (np.array([r["from"] for r in runs], dtype="datetime64[ns]"),
+            np.array([r["to"] for r in runs], dtype="datetime64[ns]"))
+
+
+def _runs_to_doc(runs):
+    return [{"from": pd.Timestamp(s).to_pydatetime(), "to": pd.Timestamp(e).to_pydatetime()}
+            for s, e in zip(*runs)]
+
+
+def _run_hours(runs):
+    return int(((runs[1] - runs[0]) // _HOUR + 1).sum()) if runs[0].size else 0
+
+
+def _save(db, name, key, runs, expected_version):
+    """Compare-and-set po verziji; False ako je neko drugi u međuvremenu promijenio dokument."""
+    doc = {"coll": name, "key": key, "runs": _runs_to_doc(runs), "hours": _run_hours(runs),
+           "version": expected_version + 1, "updated_at": datetime.now(timezone.utc)}
+    if expected_version == 0:
+        try:
+            db[GAPS_COLL].insert_one(doc)
+            return True
+        except DuplicateKeyError:
+            return False
+    res = db[GAPS_COLL].replace_one({"coll": name, "key": key, "version": expected_version}, doc)
+    return res.matched_count == 1
+
+
+def update_gap_index(coll, key_field, g, retries=5):
+    """Spoji sate iz upisanog frame-a g u run-ove svakog ključa. No-op za weather / prazan frame."""
+    if coll.name not in _LOAD_COLLECTIONS or g is None or g.empty:
+        return 0
+    db = coll.database
+    ts = pd.to_datetime(g["ts"])
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    frame = pd.DataFrame({"key": g[key_field].astype(str).to_numpy(), "ts": ts.to_numpy()})
+    for key, part in frame.groupby("key"):
+        new = hour_runs(part["ts"])
+        for _ in range(retries):
+            doc = db[GAPS_COLL].find_one({"coll": coll.name, "key": key})
+            runs = merge_runs(_runs_from_doc(doc), new)
+            if _save(db, coll.name, key, runs, int((doc or {}).get("version", 0))):
+                break
+    return frame["key"].nunique()
+
+
+register_write_hook("gaps", lambda coll, key_field, g, inserted: update_gap_index(coll, key_field, g),
+                    name="storage.gaps.update_gap_index")
+
+
+def rebuild_gap_index(db, names):
+    """Izgradi indeks iz podataka: ts svih sati po ključu (read_series) → run-ovi."""
+    out = {}
+    for name in names:
+        backend = _LOAD_COLLECTIONS[name]
+        kf = SERIES["load"]["key"]
+        db[GAPS_COLL].delete_many({"coll": name})
+        keys = sorted(db[name].distinct(kf))
+        for key in keys:
+            s = read_series(db, "load", key, "1970-01-01", "2100-01-01", fields=["load_mw"], backend=backend)
+            runs = hour_runs(s["ts"])
+            _save(db, name, key, runs, 0)
+        out[name] = len(keys)
+    return out
+
+
+def load_runs(db, key):
+    """Run-ovi regiona za trenutni backend; None ako region nema indeks (nije uvezen / nije izgrađen)."""
+    doc = db[GAPS_COLL].find_one({"coll": collection_name("load"), "key": key}, {"_id": 0, "runs": 1})
+    return _runs_from_doc(doc) if doc is not None else None
+
+
+def clip_runs(runs, ts_from=None, ts_to=None):
+    """Run-ovi presječeni sa [ts_from, ts_to] (uključivo)."""
+    starts, ends = runs
+    lo = np.datetime64(pd.Timestamp(ts_from), "ns") if ts_from is not None else None
+    hi = np.datetime64(pd.Timestamp(ts_to), "ns") if ts_to is not None else None
+    if lo is not None:
+        keep = ends >= lo
+        starts, ends = np.maximum(starts[keep], lo), ends[keep]
+    if hi is not None:
+        keep = starts <= hi
+        starts, ends = starts[keep], np.minimum(ends[keep], hi)
+    return starts, ends
+
+
+def gaps_between(runs):
+    """Rupe između susjednih run-ova: (from, to) nedostajućih sati, uključivo."""
+    starts, ends = runs
+    return ends[:-1] + _HOUR, starts[1:] - _HOUR
+
+
+def missing_hours(runs, ts_from, ts_to):
+    """Broj sati u [ts_from, ts_to) koji NISU pokriveni run-ovima."""
+    total = int((pd.Timestamp(ts_to) - pd.Timestamp(ts_from)) / pd.Timedelta(hours=1))
+    covered = clip_runs(runs, ts_from, pd.Timestamp(ts_to) - pd.Timedelta(hours=1))
+    return total - _run_hours(covered)
+
+
+def forecast_starts(runs, input_window):
+    """
+    Intervali validnih start_date za prognozu: [start - input_window h, start) mora biti u jednom run-u
+    → start ∈ [from + input_window h, to + 1h] za svaki run od bar input_window sati.
+    """
+    starts, ends = runs
+    lo = starts + input_window * _HOUR
+    hi = ends + _HOUR
+    ok = lo <= hi
+    return lo[ok], hi[ok]
+
+
+def sample_mask(ts, runs, input_window, horizon):
+    """
+    Za sekvence iz build_sequences / SlidingWindowDataset (uzorak k: sati [k, k + input_window + horizon) niza ts):
+    True ako nema izbačenih redova (raspon = T + H - 1 sati) i, uz indeks, cijeli prozor leži u jednom run-u.
+    runs=None → samo provjera raspona.
+    """
+    ts = np.asarray(pd.to_datetime(ts).to_numpy(), dtype="datetime64[ns]")
+    span = input_window + horizon
+    n = ts.shape[0] - span + 1
+    if n <= 0:
+        return np.zeros(0, dtype=bool)
+    first, last = ts[:n], ts[span - 1:]
+    ok = (last - first) == (span - 1) * _HOUR
+    if runs is None:
+        return ok
+    if not runs[0].size:
+        return np.zeros(n, dtype=bool)
+    run_first = np.searchsorted(runs[0], first, side="right") - 1
+    run_last = np.searchsorted(runs[0], last, side="right") - 1
+    return ok & (run_first >= 0) & (run_first == run_last) & (last <= runs[1][np.clip(run_last, 0, None)])
+
+
+def main(argv=None):
+    from db import get_db
+
+    parser = argparse.ArgumentParser(description="Indeks satnih run-ova / rupa load serije po regionu.")
+    parser.add_argument("--rebuild", action="store_true", help="ponovo izgradi indeks iz podataka")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    name = collection_name("load")
+    if args.rebuild:
+        print(json.dumps({"rebuilt": rebuild_gap_index(db, [name])}))
+        return
+    docs = db[GAPS_COLL].find({"coll": name}, {"_id": 0, "key": 1, "hours": 1, "runs": 1})
+    print(json.dumps({d["key"]: {"hours": d.get("hours"), "runs": len(d.get("runs", []))} for d in docs}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# jobowner.py
+# Vlasnik i heartbeat asinhronih job-ova (ingest.jobs → import_jobs, ml.train_jobs → train_jobs).
+#
+# Job se izvršava u pool-u niti procesa koji ga je upisao; ako taj proces padne ili se restartuje,
+# job bi zauvijek ostao queued/running (a trening red bi na kraju stalno vraćao 429). Zato:
+#   - job dokument nosi owner = {host, pid, boot} (boot = slučajan id procesa; pid se ponovo koristi)
+#   - pozadinska nit svakih JOB_HEARTBEAT_S sekundi osvježava heartbeat_at aktivnih job-ova procesa
+#   - recover_jobs označi aktivne job-ove mrtvog vlasnika kao failed ("interrupted"): odmah kad je
+#     vlasnik prethodni proces na istom hostu, inače kad heartbeat_at zastari (JOB_STALE_S)
+# recover_jobs se poziva pri startu aplikacije / kreiranju executor-a i periodično iz heartbeat niti.
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+
+_log = logging.getLogger(__name__)
+
+_owner = None
+_watched = {}  # ime kolekcije → (kolekcija, aktivni statusi, on_recovered)
+_lock = threading.Lock()
+_thread_pid = None
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _aware(dt):
+    # pymongo bez tz_aware vraća NAIVE UTC
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+def owner():
+    """{host, pid, boot} tekućeg procesa (novi boot nakon fork-a)."""
+    global _owner
+    if _owner is None or _owner["pid"] != os.getpid():
+        _owner = {"host": socket.gethostname(), "pid": os.getpid(), "boot": uuid.uuid4().hex}
+    return _owner
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        return True  # os.kill(pid, 0) na Windows-u šalje CTRL_C_EVENT; oslanjamo se na heartbeat
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError, TypeError, ValueError):
+        return True
+    return True
+
+
+def _owner_dead(doc, cutoff):
+    o = doc.get("owner") or {}
+    me = owner()
+    if o.get("boot") == me["boot"]:
+        return False
+    if o.get("host") == me["host"] and o.get("pid") is not None:
+        # isti pid a drugi boot → prethodni proces (restart kontejnera); nepostojeći pid → pao
+        if o["pid"] == me["pid"] or not _pid_alive(o["pid"]):
+            return True
+    last = doc.get("heartbeat_at") or doc.get("started_at") or doc.get("created_at")
+    return last is None or _aware(last) < cutoff
+
+
+def recover_jobs(coll, active):
+    """Aktivne job-ove mrtvih vlasnika označi kao failed (error "interrupted"). Vraća njihove dokumente."""
+    cutoff = _now() - timedelta(seconds=Config.JOB_STALE_S)
+    recovered = []
+    fields = {"owner": 1, "heartbeat_at": 1, "started_at": 1, "created_at": 1, "spool_path": 1}
+    for doc in coll.find({"status": {"$in": list(active)}}, fields):
+        if not _owner_dead(doc, cutoff):
+            continue
+        # filter i po heartbeat-u: job čiji je vlasnik u međuvremenu javio znak života se ne dira
+        res = coll.update_one(
+            {"_id": doc["_id"], "status": {"$in": list(active)}, "heartbeat_at": doc.get("heartbeat_at")},
+            {"$set": {"status": "failed", "finished_at": _now(),
+                      "error": "interrupted: the process running this job stopped"}},
+        )
+        if res.modified_count:
+            recovered.append(doc)
+    return recovered
+
+
+def heartbeat(coll, active):
+    coll.update_many({"owner.boot": owner()["boot"], "status": {"$in": list(active)}},
+                     {"$set": {"heartbeat_at": _now()}})
+
+
+def _loop():
+    while True:
+        time.sleep(max(1, Config.JOB_HEARTBEAT_S))
+        for name, (coll, active, on_recovered) in list(_watched.items()):
+            try:
+                heartbeat(coll, active)
+                for doc in recover_jobs(coll, active):
+                    if on_recovered is not None:
+                        on_recovered(doc)
+            except Exception:
+                # npr. Mongo nedostupan → zabilježi i pokušaj u sljedećem krugu (nit ne smije pasti)
+                _log.warning("Job heartbeat/recovery failed for %s", name, exc_info=True)
+
+
+def watch_jobs(coll, active, on_recovered=None):
+    """
+    Uključi heartbeat i oporavak za kolekciju job-ova (jednom po procesu, pri kreiranju executor-a).
+    Odmah oporavi zaostale job-ove; on_recovered(doc) se poziva za svaki oporavljeni job (i kasnije).
+    """
+    global _thread_pid
+    with _lock:
+        _watched[coll.name] = (coll, tuple(active), on_recovered)
+        if _thread_pid != os.getpid():
+            _thread_pid = os.getpid()
+            threading.Thread(target=_loop, name="job-heartbeat", daemon=True).start()
+    recovered = recover_jobs(coll, active)
+    if on_recovered is not None:
+        for doc in recovered:
+            on_recovered(doc)
+    return recovered
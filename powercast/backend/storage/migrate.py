@@ -0,0 +1,194 @@
+# migrate.py
+# Migracija satnih serija iz "documents" kolekcija u time-series ili bucket (region-dan) kolekcije
+# + poređenje zauzeća (storage / indeksi) i brzine range scan-a na istim podacima.
+#
+#   python -m storage.migrate                      → kopiraj load i weather u time-series, pa prikaži poređenje
+#   python -m storage.migrate --to buckets --kinds load --drop-target
+#   python -m storage.migrate --bench-only --bench-key N.Y.C. --bench-location "New York City, NY"
+#
+# Nakon uspješne migracije postavi SERIES_BACKEND=<timeseries|buckets> u .env i restartuj backend.
+
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from ingest.writer import StageTimer, write_hourly
+from .catalog import rebuild_catalog
+from .gaps import rebuild_gap_index
+from .partitions import touch_partitions
+from .series import (
+    SERIES, collection_name, create_bucket_indexes, create_timeseries_collection, key_field, read_series
+)
+
+_STAT_FIELDS = ("count", "size", "storageSize", "totalIndexSize")
+
+
+def copy_to_timeseries(db, kind, batch_size=10000, drop_target=False):
+    """Kopiraj sve dokumente serije iz documents kolekcije u time-series kolekciju (u batch-evima)."""
+    src = db[collection_name(kind, "documents")]
+    dst_name = collection_name(kind, "timeseries")
+    if drop_target:
+        db.drop_collection(dst_name)
+    dst = create_timeseries_collection(db, kind)
+    if dst.estimated_document_count() > 0:
+        raise RuntimeError(f"{dst_name} nije prazna; koristi --drop-target za ponovnu migraciju")
+
+    t0 = time.perf_counter()
+    kf = key_field(kind)
+    copied, batch = 0, []
+
+    def flush(batch):
+        dst.insert_many(batch, ordered=False)
+        # verzije particija: keš-evi drugih procesa (windowcache, feature store) vide kopirane mjesece kao promijenjene
+        touch_partitions(dst, kf, pd.DataFrame({kf: [d[kf] for d in batch], "ts": [d["ts"] for d in batch]}))
+        return len(batch)
+
+    for doc in src.find({}, {"_id": 0}).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            copied += flush(batch)
+            batch = []
+    if batch:
+        copied += flush(batch)
+
+    return {
+        "source": src.name,
+        "target": dst_name,
+        "copied": copied,
+        "source_count": src.estimated_document_count(),
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+def copy_to_buckets(db, kind, batch_size=10000, drop_target=False):
+    """
+    Kopiraj seriju u bucket kolekciju (jedan dokument po ključu i lokalnom danu).
+    Čita se ključ po ključ, u blokovima od batch_size sati; write_hourly spaja djelimične dane.
+    """
+    src = db[collection_name(kind, "documents")]
+    dst_name = collection_name(kind, "buckets")
+    if drop_target:
+        db.drop_collection(dst_name)
+    dst = create_bucket_indexes(db, kind)
+    if dst.estimated_document_count() > 0:
+        raise RuntimeError(f"{dst_name} nije prazna; koristi --drop-target za ponovnu migraciju")
+
+    kf = key_field(kind)
+    t0 = time.perf_counter()
+    timer = StageTimer()
+    copied, buckets = 0, 0
+    for key in sorted(src.distinct(kf)):
+        rows = []
+        cur = src.find({kf: key}, {"_id": 0}).sort("ts", 1).batch_size(batch_size)
+        for doc in cur:
+            rows.append(doc)
+            if len(rows) >= batch_size:
+                buckets += _write_bucket_rows(dst, kf, rows, timer)
+                copied += len(rows)
+                rows = []
+        if rows:
+            buckets += _write_bucket_rows(dst, kf, rows, timer)
+            copied += len(rows)
+
+    return {
+        "source": src.name,
+        "target": dst_name,
+        "copied": copied,
+        "source_count": src.estimated_document_count(),
+        "buckets": dst.estimated_document_count(),
+        "seconds": round(time.perf_counter() - t0, 2),
+        "timings_ms": timer.as_dict(),
+    }
+
+
+def _write_bucket_rows(dst, kf, rows, timer):
+    g = pd.DataFrame(rows)
+    value_cols = [c for c in g.columns if c not in (kf, "ts")]
+    stats = write_hourly(dst, g, kf, value_cols, diff=True, timer=timer)
+    return stats["upserts"]
+
+
+COPY = {"timeseries": copy_to_timeseries, "buckets": copy_to_buckets}
+
+
+def collection_stats(db, name):
+    """Zauzeće kolekcije (bajtovi) iz collStats; time-series kolekcije vraćaju i broj bucket-a."""
+    try:
+        st = db.command("collStats", name)
+    except Exception as e:
+        return {"error": str(e)}
+    out = {k: st.get(k) for k in _STAT_FIELDS}
+    if "timeseries" in st:
+        out["buckets"] = st["timeseries"].get("bucketCount")
+    return out
+
+
+def scan_benchmark(db, kind, backend, key, repeat=3):
+    """
+    Najbolje vrijeme (ms) čitanja cijele serije jednog ključa kroz read_series
+    (isti put kao ML reader-i), za zadati backend.
+    """
+    fields = {"load": ["load_mw"], "weather": ["temp", "humidity"]}[kind]
+    best, rows = None, 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        rows = len(read_series(db, kind, key, "1970-01-01", "2100-01-01", fields=fields, backend=backend))
+        dt = (time.perf_counter() - t) * 1000.0
+        best = dt if best is None else min(best, dt)
+    return {"rows": rows, "ms": round(best, 1)}
+
+
+def compare(db, kind, target="timeseries", bench_key=None, repeat=3):
+    """Storage i scan poređenje documents vs target backend za jednu seriju."""
+    docs = db[collection_name(kind, "documents")]
+    other = db[collection_name(kind, target)]
+    key = bench_key
+    if key is None:
+        first = docs.find_one({}, {key_field(kind): 1}, sort=[(key_field(kind), 1)])
+        key = first.get(key_field(kind)) if first else None
+
+    out = {
+        "documents": {"stats": collection_stats(db, docs.name)},
+        target: {"stats": collection_stats(db, other.name)},
+        "bench_key": key,
+    }
+    if key is not None:
+        out["documents"]["scan"] = scan_benchmark(db, kind, "documents", key, repeat)
+        out[target]["scan"] = scan_benchmark(db, kind, target, key, repeat)
+    return out
+
+
+def main(argv=None):
+    from db import get_db
+
+    parser = argparse.ArgumentParser(description="Migracija satnih serija u time-series / bucket kolekcije.")
+    parser.add_argument("--to", default="timeseries", choices=list(COPY), help="ciljni storage backend")
+    parser.add_argument("--kinds", nargs="+", default=list(SERIES), choices=list(SERIES))
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--drop-target", action="store_true", help="obriši postojeću ciljnu kolekciju prije kopiranja")
+    parser.add_argument("--bench-only", action="store_true", help="bez kopiranja, samo poređenje")
+    parser.add_argument("--bench-key", default=None, help="region za load scan benchmark (podrazumijevano prvi)")
+    parser.add_argument("--bench-location", default=None, help="lokacija za weather scan benchmark (podrazumijevano prva)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    report = {}
+    for kind in args.kinds:
+        entry = {}
+        if not args.bench_only:
+            entry["migration"] = COPY[args.to](db, kind, args.batch_size, args.drop_target)
+            # katalog pokrivenosti ciljne kolekcije (insert_many u time-series ne prolazi kroz write_hourly)
+            entry["catalog"] = rebuild_catalog(db, [collection_name(kind, args.to)])
+            if kind == "load":
+                entry["gaps"] = rebuild_gap_index(db, [collection_name(kind, args.to)])
+        bench_key = args.bench_key if kind == "load" else args.bench_location
+        entry["compare"] = compare(db, kind, args.to, bench_key, args.repeat)
+        report[kind] = entry
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# partitions.py
+# Verzije vremenskih particija satnih serija (kolekcija `series_partitions`):
+#   {kind: "load"|"weather", key: region/location, month: "YYYY-MM", version: N, updated_at}
+#
+# Svaki upis kroz ingest.writer.write_hourly povećava verziju (ključ, mjesec) particija koje je
+# stvarno promijenio. Lokalni keš-evi (feature store na disku, ...) porede svoju verziju sa ovom
+# i ponovo učitavaju iz Mongo-a samo promijenjene particije — radi i između procesa/servera.
+#
+# Kalendar praznika ima jednu verziju po regionu praznika: {kind: "holidays", key: region, month: "*"}
+# (povećava je /import/holidays, porede je keš-evi kalendara u ml.features).
+
+from datetime import datetime, timezone
+
+import pandas as pd
+from pymongo import UpdateOne
+
+from .series import SERIES
+from .writehooks import register_write_hook
+
+PARTITIONS_COLL = "series_partitions"
+HOLIDAYS_KIND = "holidays"
+_ALL_MONTHS = "*"
+
+# ime kolekcije (bilo kog backend-a) → kind
+_KIND_BY_COLLECTION = {
+    name: kind for kind, spec in SERIES.items() for b, name in spec.items() if b != "key"
+}
+
+
+def kind_for_collection(name):
+    return _KIND_BY_COLLECTION.get(name)
+
+
+def month_of(ts):
+    """Timestamp-ovi (NAIVE ili aware UTC) → "YYYY-MM" particija (UTC mjesec)."""
+    ts = pd.to_datetime(ts)
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    return ts.dt.strftime("%Y-%m")
+
+
+def month_range(ts_from, ts_to):
+    """Lista "YYYY-MM" particija koje pokrivaju [ts_from, ts_to]."""
+    periods = pd.period_range(pd.Timestamp(ts_from).to_period("M"), pd.Timestamp(ts_to).to_period("M"), freq="M")
+    return [str(p) for p in periods]
+
+
+def month_bounds(month):
+    """"YYYY-MM" → (početak, početak sljedećeg mjeseca) kao NAIVE UTC Timestamp."""
+    p = pd.Period(month, freq="M")
+    return p.start_time, (p + 1).start_time
+
+
+def touch_partitions(coll, key_field, g):
+    """
+    Povećaj verziju (ključ, mjesec) particija za redove iz g (kolone key_field, ts).
+    Poziva se nakon upisa; no-op za kolekcije koje nisu satne serije ili prazan frame.
+    Vraća broj dotaknutih particija.
+    """
+    kind = kind_for_collection(coll.name)
+    if kind is None or g is None or g.empty:
+        return 0
+    pairs = (
+        pd.DataFrame({"key": g[key_field].astype(str).to_numpy(), "month": month_of(g["ts"]).to_numpy()})
+          .drop_duplicates()
+    )
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"kind": kind, "key": k, "month": m},
+            {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for k, m in zip(pairs["key"].tolist(), pairs["month"].tolist())
+    ]
+    coll.database[PARTITIONS_COLL].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+register_write_hook("invalidate", lambda coll, key_field, g, inserted: touch_partitions(coll, key_field, g),
+                    name="storage.partitions.touch_partitions")
+
+
+def partition_versions(db, kind, key, months):
+    """{month: version} za dati ključ; particije bez zapisa imaju verziju 0."""
+    cur = db[PARTITIONS_COLL].find(
+        {"kind": kind, "key": key, "month": {"$in": list(months)}},
+        {"_id": 0, "month": 1, "version": 1},
+    )
+    found = {d["month"]: int(d.get("version", 0)) for d in cur}
+    return {m: found.get(m, 0) for m in months}
+
+
+def touch_holidays(db, region):
+    """Povećaj verziju kalendara praznika regiona (nakon upisa praznika)."""
+    db[PARTITIONS_COLL].update_one(
+        {"kind": HOLIDAYS_KIND, "key": region, "month": _ALL_MONTHS},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def holidays_version(db, region):
+    """Trenutna verzija kalendara praznika regiona (0 ako nikad nije uvezen)."""
+    return partition_versions(db, HOLIDAYS_KIND, region, [_ALL_MONTHS])[_ALL_MONTHS]
@@ -0,0 +1,106 @@
+# rawbson.py
+# Dekodiranje sirovih BSON batch-eva (find_raw_batches) direktno u NumPy kolone,
+# bez Python dict-a po satu i bez pd.DataFrame(list(cursor)).
+#
+# Satni dokumenti sa eksplicitnom projekcijom ({_id: 0, ts: 1, load_mw: 1}) imaju u pravilu
+# identičan raspored bajtova (isti redoslijed i tipovi polja, fiksna dužina), pa se cijeli batch
+# posmatra kao niz zapisa fiksne dužine: svaka kolona je jedan strided view (frombuffer),
+# a provjera da je raspored zaista isti za sve dokumente je vektorska.
+# Batch-evi koji ne ispunjavaju uslov (npr. weather sati kojima fali neka kolona) idu kroz
+# bson.decode_all — rezultat je isti, samo sporije.
+
+import numpy as np
+from bson import decode_all
+
+# BSON tip → NumPy dtype (little-endian) za vrijednosti koje čitamo
+_BSON_NUMERIC = {0x01: "<f8", 0x10: "<i4", 0x12: "<i8"}
+_BSON_DATETIME = 0x09
+_FIXED_SIZE = {0x01: 8, 0x09: 8, 0x10: 4, 0x12: 8}
+
+
+def _layout(doc):
+    """
+    Raspored elemenata prvog dokumenta: {ime: (početak elementa, offset vrijednosti, tip)}.
+    None ako dokument sadrži element promjenljive dužine (string, pod-dokument, ...).
+    """
+    out = {}
+    pos, end = 4, len(doc) - 1
+    while pos < end:
+        t = doc[pos]
+        name_end = doc.index(b"\x00", pos + 1)
+        size = _FIXED_SIZE.get(t)
+        if size is None:
+            return None
+        out[doc[pos + 1:name_end].decode()] = (pos, name_end + 1, t)
+        pos = name_end + 1 + size
+    return out
+
+
+def _decode_uniform(buf, fields, time_field):
+    """Brzi put: svi dokumenti u batch-u imaju isti raspored. Vraća None ako to ne važi."""
+    if len(buf) < 5:
+        return None
+    size = int.from_bytes(buf[:4], "little")
+    if size <= 5 or len(buf) % size:
+        return None
+    recs = np.frombuffer(buf, dtype=np.uint8).reshape(-1, size)
+    first = bytes(recs[0])
+
+    # svi dokumenti iste dužine?
+    sizes = recs[:, :4].copy().view("<i4").ravel()
+    if not (sizes == size).all():
+        return None
+
+    layout = _layout(first)
+    if layout is None or time_field not in layout or layout[time_field][2] != _BSON_DATETIME:
+        return None
+    # isti tip + ime svakog elementa na istom mjestu u svim dokumentima
+    for start, val_off, _ in layout.values():
+        if not (recs[:, start:val_off] == recs[0, start:val_off]).all():
+            return None
+
+    def column(name, dtype):
+        off = layout[name][1]
+        width = np.dtype(dtype).itemsize
+        return recs[:, off:off + width].copy().view(dtype).ravel()
+
+    ts = column(time_field, "<i8").astype("datetime64[ms]").astype("datetime64[ns]")
+    cols = {}
+    for c in fields:
+        if c in layout and layout[c][2] in _BSON_NUMERIC:
+            cols[c] = column(c, _BSON_NUMERIC[layout[c][2]]).astype(np.float64)
+        else:
+            cols[c] = np.full(ts.shape[0], np.nan)
+    return ts, cols
+
+
+def _num(v):
+    """Vrijednost polja → float; ne-brojčane (None, string, ...) → NaN, kao u brzom putu."""
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+
+
+def _decode_generic(buf, fields, time_field):
+    docs = decode_all(buf)
+    ts = np.array([d[time_field] for d in docs], dtype="datetime64[ns]")
+    cols = {c: np.array([_num(d.get(c)) for d in docs], dtype=np.float64) for c in fields}
+    return ts, cols
+
+
+def decode_raw_batches(batches, fields, time_field="ts"):
+    """
+    Niz sirovih BSON batch-eva (bytes) → (ts: datetime64[ns], {kolona: float64 niz}).
+    Polja kojih nema u dokumentu postaju NaN (kao kolona bez vrijednosti u pandas-u).
+    """
+    ts_parts, col_parts = [], {c: [] for c in fields}
+    for batch in batches:
+        buf = bytes(batch)
+        if not buf:
+            continue
+        res = _decode_uniform(buf, fields, time_field) or _decode_generic(buf, fields, time_field)
+        ts_parts.append(res[0])
+        for c in fields:
+            col_parts[c].append(res[1][c])
+
+    if not ts_parts:
+        return np.array([], dtype="datetime64[ns]"), {c: np.array([], dtype=np.float64) for c in fields}
+    return np.concatenate(ts_parts), {c: np.concatenate(v) for c, v in col_parts.items()}
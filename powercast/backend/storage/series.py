@@ -0,0 +1,157 @@
+# series.py
+# Repository za satne serije. Tri backend-a (Config.SERIES_BACKEND):
+#
+#   documents  (podrazumijevano) — jedan dokument po satu i ključu:
+#              series_load_hourly {region, ts, load_mw}, series_weather_hourly {location, ts, ...}
+#   timeseries — MongoDB time-series kolekcije (MongoDB ≥ 5.0; izmjena postojećih sati ≥ 7.0):
+#              series_load_ts / series_weather_ts, metaField = region/location, timeField = ts.
+#              Server interno pakuje sate istog ključa u kompresovane bucket-e → manji storage
+#              i indeks, a range scan čita bucket-e umjesto pojedinačnih satnih dokumenata.
+#   buckets    — jedan dokument po ključu i NY lokalnom danu sa float32 blob-om vrijednosti
+#              (series_load_daily / series_weather_daily; format u storage/buckets.py).
+#
+# Čitanje ide kroz read_series (vraća DataFrame ts + kolone, isti oblik za sve backend-e),
+# upis kroz ingest.writer.write_hourly (bira put upisa po kolekciji).
+# Prelazak: python -m storage.migrate --to timeseries|buckets, pa SERIES_BACKEND=<backend>.
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from .buckets import bucket_query_days, decode_buckets
+from .rawbson import decode_raw_batches
+
+SERIES = {
+    "load": {"key": "region", "documents": "series_load_hourly", "timeseries": "series_load_ts",
+             "buckets": "series_load_daily"},
+    "weather": {"key": "location", "documents": "series_weather_hourly", "timeseries": "series_weather_ts",
+                "buckets": "series_weather_daily"},
+}
+BACKENDS = ("documents", "timeseries", "buckets")
+
+# imena time-series / bucket kolekcija → ključ (writer po ovome bira put upisa)
+TIMESERIES_COLLECTIONS = {spec["timeseries"]: spec["key"] for spec in SERIES.values()}
+BUCKET_COLLECTIONS = {spec["buckets"]: spec["key"] for spec in SERIES.values()}
+
+
+def series_backend():
+    backend = (Config.SERIES_BACKEND or "documents").strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SERIES_BACKEND: {backend} (expected one of {BACKENDS})")
+    return backend
+
+
+def key_field(kind):
+    """Ključ serije: region (load) ili location (weather)."""
+    return SERIES[kind]["key"]
+
+
+def collection_name(kind, backend=None):
+    return SERIES[kind][backend or series_backend()]
+
+
+def series_collection(db, kind, backend=None):
+    """Kolekcija iz koje se čita / u koju se piše serija `kind` ("load" | "weather")."""
+    return db[collection_name(kind, backend)]
+
+
+def is_timeseries(coll):
+    return coll.name in TIMESERIES_COLLECTIONS
+
+
+def is_bucketed(coll):
+    return coll.name in BUCKET_COLLECTIONS
+
+
+def coverage_fields(kind, backend=None):
+    """
+    Izrazi za $group u coverage agregacijama: (from, to, broj sati).
+    Satni dokumenti: $ts / $ts / 1; bucket-i: $ts_first / $ts_last / $count.
+    """
+    if (backend or series_backend()) == "buckets":
+        return "$ts_first", "$ts_last", "$count"
+    return "$ts", "$ts", 1
+
+
+def read_series(db, kind, key, ts_from, ts_to, fields=None, include_end=True, backend=None):
+    """
+    Jedinstveni reader satne serije za jedan ključ u opsegu [ts_from, ts_to] (NAIVE UTC).
+    include_end=False → [ts_from, ts_to).
+    fields: eksplicitna lista kolona (projekcija na serveru); None → sve kolone vrijednosti.
+    backend=None → Config.SERIES_BACKEND.
+    Vraća DataFrame: ts (datetime64, NAIVE UTC, rastuće, bez duplikata) + kolone vrijednosti (float64).
+    Kolona bez ijedne vrijednosti u opsegu se izostavlja (isto kao pd.DataFrame(list(cursor))).
+    """
+    coll = series_collection(db, kind, backend)
+    kf = key_field(kind)
+    t_from = pd.Timestamp(ts_from).to_pydatetime()
+    t_to = pd.Timestamp(ts_to).to_pydatetime()
+
+    if is_bucketed(coll):
+        d_lo, d_hi = bucket_query_days(t_from, t_to)
+        cur = coll.find({kf: key, "day": {"$gte": d_lo, "$lte": d_hi}}, {"_id": 0}).sort("day", 1)
+        ts, cols = decode_buckets(cur, fields)
+        hi = ts <= np.datetime64(t_to, "ns") if include_end else ts < np.datetime64(t_to, "ns")
+        m = (ts >= np.datetime64(t_from, "ns")) & hi
+        return series_frame(ts[m], {c: v[m] for c, v in cols.items()})
+
+    q = {kf: key, "ts": {"$gte": t_from, ("$lte" if include_end else "$lt"): t_to}}
+    if fields:
+        # sirovi BSON batch-evi → NumPy kolone (bez dict-a po satu)
+        proj = {"_id": 0, "ts": 1, **{c: 1 for c in fields}}
+        ts, cols = decode_raw_batches(coll.find_raw_batches(q, proj).sort("ts", 1), fields)
+        return series_frame(ts, cols)
+
+    df = pd.DataFrame(list(coll.find(q, {"_id": 0, kf: 0}).sort("ts", 1)))
+    if df.empty:
+        return pd.DataFrame(columns=["ts"])
+    df["ts"] = pd.to_datetime(df["ts"])
+    return df.drop_duplicates(subset=["ts"]).reset_index(drop=True)
+
+
+def series_frame(ts, cols):
+    """
+    NumPy kolone → DataFrame (ts + kolone sa bar jednom vrijednošću), bez duplikata ts.
+    Isti oblik kao read_series; koriste ga i čitači van Mongo-a (storage.featurestore, ml.context).
+    """
+    cols = {c: v for c, v in cols.items() if not v.size or not np.isnan(v).all()}
+    df = pd.DataFrame({"ts": ts, **cols})
+    if ts.size > 1 and not (ts[1:] > ts[:-1]).all():
+        df = df.drop_duplicates(subset=["ts"]).sort_values("ts").reset_index(drop=True)
+    return df
+
+
+def create_timeseries_collection(db, kind, existing=None):
+    """
+    Kreiraj time-series kolekciju za seriju (ako ne postoji) + sekundarni indeks (meta, ts).
+    Mora postojati PRIJE prvog upisa — insert u nepostojeću kolekciju bi napravio običnu kolekciju.
+    """
+    name = collection_name(kind, "timeseries")
+    existing = db.list_collection_names() if existing is None else existing
+    if name not in existing:
+        db.create_collection(
+            name,
+            timeseries={"timeField": "ts", "metaField": key_field(kind), "granularity": "hours"},
+        )
+    db[name].create_index([(key_field(kind), 1), ("ts", 1)])
+    return db[name]
+
+
+def create_bucket_indexes(db, kind):
+    """Bucket kolekcija: unique (ključ, day) — i upis (upsert po danu) i čitanje opsega idu preko njega."""
+    coll = db[collection_name(kind, "buckets")]
+    coll.create_index([(key_field(kind), 1), ("day", 1)], unique=True)
+    return coll
+
+
+def ensure_series_backend(db):
+    """Poziva se jednom pri startu (create_app): osiguraj kolekcije / indekse izabranog backend-a."""
+    backend = series_backend()
+    if backend == "timeseries":
+        existing = db.list_collection_names()
+        for kind in SERIES:
+            create_timeseries_collection(db, kind, existing)
+    elif backend == "buckets":
+        for kind in SERIES:
+            create_bucket_indexes(db, kind)
+    return backend
@@ -0,0 +1,148 @@
+# windowcache.py
+# In-process LRU keš dekodiranih prozora satnih serija (rezultati read_series).
+#
+# Dijele ga prepare_inference_window (isti 168h prozor na svakom /forecast/run) i /series/actual
+# (dashboard-i traže iste opsege). Veličina je ograničena u BAJTOVIMA (Config.SERIES_CACHE_BYTES,
+# 0 = isključen), a ne brojem unosa — jedan višegodišnji opseg može biti veći od stotinu prozora.
+#
+# Svaki unos pamti verzije (ključ, mjesec) particija iz `series_partitions` (storage.partitions) koje
+# je njegov opseg pokrivao u trenutku čitanja; get ih ponovo provjerava jednim indeksiranim upitom,
+# pa upis iz bilo kog procesa (drugi gunicorn worker, python -m ingest.archive, storage.migrate)
+# čini unos zastarjelim. Upisi iz istog procesa (write_hourly → invalidate_frame) ga izbacuju odmah.
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import Config
+from .partitions import kind_for_collection, month_range, partition_versions
+from .series import key_field, read_series, series_backend
+from .writehooks import register_write_hook
+
+
+class WindowCache:
+    """
+    LRU mapa (backend, kind, ključ, od, do, include_end, kolone) → DataFrame, ograničena bajtovima.
+    Uz unos se čuvaju verzije particija iz vremena čitanja; get sa drugim verzijama → promašaj (stale).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # key → (df, nbytes, verzije particija)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.generation = 0  # raste sa svakom invalidacijom (zaštita od upisa tokom čitanja)
+        self.hits = self.misses = self.evictions = self.invalidations = self.stale = 0
+
+    @staticmethod
+    def _nbytes(df):
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def get(self, key, versions=None):
+        """versions = trenutne verzije particija opsega; unos sa drugačijim verzijama se izbacuje."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and versions is not None and entry[2] != versions:
+                self.bytes -= self._entries.pop(key)[1]
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, df, generation=None, versions=None):
+        """
+        generation = vrijednost prije čitanja; ako je u međuvremenu bilo upisa, rezultat se ne kešira.
+        versions = verzije particija pročitane PRIJE read_series (upis tokom čitanja → sljedeći get je stale).
+        """
+        size = self._nbytes(df)
+        if size > self.max_bytes:
+            return  # veći od cijelog keša — ne bi preživio ni sljedeći put
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (df, size, versions)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                _, (_, n, _) = self._entries.popitem(last=False)
+                self.bytes -= n
+                self.evictions += 1
+
+    def invalidate(self, kind, key, ts_min, ts_max):
+        """Izbaci unose (kind, ključ) čiji se opseg [od, do] preklapa sa [ts_min, ts_max]. Vraća broj."""
+        with self._lock:
+            self.generation += 1
+            drop = [k for k in self._entries
+                    if k[1] == kind and k[2] == key and k[3] <= ts_max and k[4] >= ts_min]
+            for k in drop:
+                self.bytes -= self._entries.pop(k)[1]
+            self.invalidations += len(drop)
+            return len(drop)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+            }
+
+
+CACHE = WindowCache(Config.SERIES_CACHE_BYTES)
+
+
+def cached_read_series(db, kind, key, ts_from, ts_to, fields, include_end=True):
+    """
+    read_series kroz LRU keš (isti ugovor). Vraća plitku kopiju — pozivalac može dodavati /
+    mijenjati kolone bez uticaja na keširani unos. Svaki poziv čita verzije particija opsega
+    (jedan mali upit nad series_partitions) da bi otkrio upise iz drugih procesa.
+    """
+    if CACHE.max_bytes <= 0:
+        return read_series(db, kind, key, ts_from, ts_to, fields=fields, include_end=include_end)
+
+    t_from, t_to = pd.Timestamp(ts_from), pd.Timestamp(ts_to)
+    ck = (series_backend(), kind, key, t_from, t_to, bool(include_end), tuple(fields or ()))
+    versions = partition_versions(db, kind, str(key), month_range(t_from, t_to))
+    df = CACHE.get(ck, versions)
+    if df is None:
+        gen = CACHE.generation
+        df = read_series(db, kind, key, t_from, t_to, fields=fields, include_end=include_end)
+        CACHE.put(ck, df, gen, versions)
+    return df.copy(deep=False)
+
+
+def invalidate_frame(coll, g):
+    """Poziva se nakon upisa satnog frame-a u kolekciju serije: invalidacija po ključu i opsegu sati."""
+    kind = kind_for_collection(coll.name)
+    if kind is None or g is None or g.empty:
+        return 0
+    kf = key_field(kind)
+    ts = pd.to_datetime(g["ts"])
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    span = pd.DataFrame({"key": g[kf].astype(str).to_numpy(), "ts": ts.to_numpy()}).groupby("key")["ts"].agg(["min", "max"])
+    return sum(CACHE.invalidate(kind, k, pd.Timestamp(r["min"]), pd.Timestamp(r["max"]))
+               for k, r in span.iterrows())
+
+
+register_write_hook("invalidate", lambda coll, key_field, g, inserted: invalidate_frame(coll, g),
+                    name="storage.windowcache.invalidate_frame")
@@ -0,0 +1,49 @@
+# writehooks.py
+# Registar post-write hook-ova satnih serija. ingest.writer.write_hourly nakon svakog upisa zove
+# run_write_hooks, a moduli koji drže metapodatke / keš-eve izvedene iz serija se sami registruju
+# pri importu:
+#   invalidate — verzije particija (storage.partitions), in-process LRU prozori (storage.windowcache),
+#                feature matrice (ml.featurematrix)
+#   catalog    — katalog pokrivenosti (storage.catalog)
+#   gaps       — indeks run-ova / rupa (storage.gaps)
+# Writer tako ne zavisi od slojeva iznad storage-a. Proces koji upisuje serije mora uvesti module
+# čije hook-ove želi (Flask app ih uvozi kroz rute, CLI-jevi eksplicitno — vidi ingest.archive).
+
+# faze se izvršavaju ovim redom (keš-evi se invalidiraju prije nego katalog / indeks pokažu nove sate),
+# a hook-ovi unutar faze redom registracije; faza = ime StageTimer faze u kojoj se hook mjeri
+STAGES = ("invalidate", "catalog", "gaps")
+
+_HOOKS = []  # (faza, ime, fn)
+
+
+def register_write_hook(stage, fn, name=None):
+    """
+    Registruj fn(coll, key_field, g, inserted) za fazu `stage` (jedna od STAGES). Ponovna registracija istog imena
+    (npr. reload modula) zamjenjuje postojeći hook umjesto da ga doda još jednom.
+    inserted: {ključ: broj novih sati} kad ga writer zna (diff), inače None.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown write hook stage: {stage} (expected one of {STAGES})")
+    name = name or f"{fn.__module__}.{fn.__qualname__}"
+    for i, (_, n, _) in enumerate(_HOOKS):
+        if n == name:
+            _HOOKS[i] = (stage, name, fn)
+            return fn
+    _HOOKS.append((stage, name, fn))
+    return fn
+
+
+def _ordered():
+    return sorted(_HOOKS, key=lambda h: STAGES.index(h[0]))  # stabilno: unutar faze redom registracije
+
+
+def write_hooks():
+    """Imena registrovanih hook-ova po redu izvršavanja (dijagnostika / testovi)."""
+    return [name for _, name, _ in _ordered()]
+
+
+def run_write_hooks(coll, key_field, g, timer, inserted=None):
+    """Pozovi sve hook-ove za upisani frame g; trajanje se sabira po fazi u timer-u."""
+    for stage, _, fn in _ordered():
+        with timer.stage(stage):
+            fn(coll, key_field, g, inserted)
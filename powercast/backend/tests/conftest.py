@@ -0,0 +1,7 @@
+# conftest.py
+# Backend moduli se uvoze kao top-level paketi (config, ingest, storage, ml) — kao kad se app pokreće iz ovog foldera.
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
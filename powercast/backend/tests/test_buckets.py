@@ -0,0 +1,124 @@
+# test_buckets.py
+# Bucket backend (storage.buckets) oko DST prelaza 2018: write_hourly → read_series(backend="buckets")
+# mora vratiti iste sate (23-satni 2018-03-11, 25-satni 2018-11-04), NaN ne briše postojeću vrijednost,
+# a brojači inserted/updated/unchanged su po satu.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from ingest.writer import write_hourly
+from storage.buckets import day_bounds, local_days
+from storage.series import read_series, series_collection
+
+REGION = "N.Y.C."
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["powercast_test"]
+
+
+def _load(ts_from, ts_to):
+    """Satni load (NAIVE UTC) sa vrijednošću = redni broj sata, da se pomak pozicije odmah vidi."""
+    ts = pd.date_range(ts_from, ts_to, freq="h")
+    return pd.DataFrame({"region": REGION, "ts": ts, "load_mw": np.arange(len(ts), dtype=float) + 1000.0})
+
+
+def _write(db, g, **kw):
+    return write_hourly(series_collection(db, "load", "buckets"), g, "region", ["load_mw"], **kw)
+
+
+def _read(db, ts_from, ts_to):
+    return read_series(db, "load", REGION, ts_from, ts_to, fields=["load_mw"], backend="buckets")
+
+
+# lokalni dan prije, dan prelaza, dan poslije (NAIVE UTC granice lokalnih ponoći)
+# + NAIVE UTC sat uz sam prelaz: prvi EDT sat (03:00) odnosno drugi 01:00 (EST)
+DST_DAYS = {
+    "spring_forward": ("2018-03-10 05:00", "2018-03-13 03:00", "2018-03-11", 23),
+    "fall_back": ("2018-11-03 04:00", "2018-11-06 04:00", "2018-11-04", 25),
+}
+DST_HOUR = {"spring_forward": "2018-03-11 07:00", "fall_back": "2018-11-04 06:00"}
+
+
+@pytest.mark.parametrize("case", sorted(DST_DAYS))
+def test_day_bounds_hours(case):
+    _, _, day, hours = DST_DAYS[case]
+    _, n = day_bounds([pd.Timestamp(day)])
+    assert int(n[0]) == hours
+
+
+@pytest.mark.parametrize("case", sorted(DST_DAYS))
+def test_roundtrip_across_dst(db, case):
+    ts_from, ts_to, day, hours = DST_DAYS[case]
+    g = _load(ts_from, ts_to)
+    stats = _write(db, g)
+    assert stats["inserted"] == len(g)
+    assert stats["upserts"] == 3  # jedan bucket po lokalnom danu
+
+    docs = {pd.Timestamp(d["day"]): d for d in series_collection(db, "load", "buckets").find()}
+    assert int(docs[pd.Timestamp(day)]["n"]) == hours
+    assert int(docs[pd.Timestamp(day)]["count"]) == hours
+    assert sum(int(d["count"]) for d in docs.values()) == len(g)
+    assert set(local_days(g["ts"]).unique()) == set(docs)
+
+    out = _read(db, ts_from, ts_to)
+    assert out["ts"].tolist() == g["ts"].tolist()
+    np.testing.assert_allclose(out["load_mw"].to_numpy(), g["load_mw"].to_numpy())
+
+
+def test_read_subrange_and_exclusive_end(db):
+    ts_from, ts_to, _, _ = DST_DAYS["fall_back"]
+    g = _load(ts_from, ts_to)
+    _write(db, g)
+
+    lo, hi = pd.Timestamp("2018-11-04 04:00"), pd.Timestamp("2018-11-04 08:00")
+    out = read_series(db, "load", REGION, lo, hi, fields=["load_mw"], include_end=False, backend="buckets")
+    want = g[(g["ts"] >= lo) & (g["ts"] < hi)]
+    assert out["ts"].tolist() == want["ts"].tolist()
+    np.testing.assert_allclose(out["load_mw"].to_numpy(), want["load_mw"].to_numpy())
+
+
+@pytest.mark.parametrize("case", sorted(DST_DAYS))
+def test_merge_keeps_values_and_counts_per_hour(db, case):
+    ts_from, ts_to, _, _ = DST_DAYS[case]
+    g = _load(ts_from, ts_to)
+    _write(db, g)
+
+    # ponovni uvoz: sve unchanged, nijedan bucket se ne šalje
+    stats = _write(db, g)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 0, len(g))
+    assert stats["upserts"] == 0 and stats["modified"] == 0
+
+    # sat uz prelaz promijenjen, sljedeći NaN (ne smije obrisati postojeću vrijednost), ostali isti
+    g2 = g.copy()
+    mid = int(np.flatnonzero(g2["ts"] == pd.Timestamp(DST_HOUR[case]))[0])
+    g2.loc[mid, "load_mw"] = -1.0
+    g2.loc[mid + 1, "load_mw"] = np.nan
+    stats = _write(db, g2)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 1, len(g) - 1)
+    assert stats["modified"] == 1
+
+    out = _read(db, ts_from, ts_to)
+    want = g["load_mw"].to_numpy().copy()
+    want[mid] = -1.0
+    assert out["ts"].tolist() == g["ts"].tolist()
+    np.testing.assert_allclose(out["load_mw"].to_numpy(), want)
+
+
+def test_partial_day_then_fill(db):
+    ts_from, ts_to, _, _ = DST_DAYS["fall_back"]
+    g = _load(ts_from, ts_to)
+    first, rest = g.iloc[:30], g.iloc[20:]
+
+    stats = _write(db, first)
+    assert stats["inserted"] == 30
+    stats = _write(db, rest)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (len(g) - 30, 0, 10)
+
+    out = _read(db, ts_from, ts_to)
+    assert out["ts"].tolist() == g["ts"].tolist()
+    np.testing.assert_allclose(out["load_mw"].to_numpy(), g["load_mw"].to_numpy())
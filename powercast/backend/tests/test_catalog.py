@@ -0,0 +1,67 @@
+# test_catalog.py
+# Inkrementalni katalog (storage.catalog.update_catalog, $inc put iz diff-a u write_hourly) nakon niza
+# uvoza mora biti isti kao katalog izgrađen iz podataka (rebuild_catalog).
+
+import numpy as np
+import pandas as pd
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from ingest.writer import write_hourly
+from storage.catalog import catalog_entries, rebuild_catalog
+from storage.series import collection_name
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["powercast_test"]
+
+
+def _weather(location, start, hours, temp=1.0, humidity=50.0):
+    ts = pd.date_range(start, periods=hours, freq="h")
+    return pd.DataFrame({"location": location, "ts": ts, "temp": temp, "humidity": humidity})
+
+
+def _imports():
+    """Preklapajući uvozi dva ključa: novi sati, ponovni uvoz, promjena, NaN, proširenje unazad."""
+    a = _weather("NYC", "2018-11-05 00:00", 48)
+    b = _weather("ALB", "2018-11-05 12:00", 24)
+    changed = _weather("NYC", "2018-11-06 00:00", 48, temp=2.0)   # 24 postojeća (promijenjena) + 24 nova
+    nan_rows = _weather("ALB", "2018-11-06 00:00", 24, temp=np.nan)  # 12 postojećih + 12 novih (samo humidity)
+    earlier = _weather("NYC", "2018-11-04 00:00", 30)              # 24 nova + 6 postojećih
+    both = pd.concat([a, b], ignore_index=True)
+    return [a, b, a, changed, nan_rows, earlier, both]
+
+
+def _snapshot(db, name):
+    return [{k: v for k, v in e.items() if k != "last_import"} for e in catalog_entries(db, name)]
+
+
+@pytest.mark.parametrize("backend", ["documents", "timeseries", "buckets"])
+@pytest.mark.parametrize("diff", [True, False])
+def test_incremental_catalog_matches_rebuild(db, backend, diff):
+    coll = db[collection_name("weather", backend)]
+    for g in _imports():
+        write_hourly(coll, g, "location", ["temp", "humidity"], diff=diff)
+
+    incremental = _snapshot(db, coll.name)
+    rebuild_catalog(db, [coll.name])
+    rebuilt = _snapshot(db, coll.name)
+
+    assert incremental == rebuilt
+    counts = {e["key"]: e["count"] for e in rebuilt}
+    assert counts == {"ALB": 36, "NYC": 96}
+
+
+def test_update_catalog_counts_only_new_hours(db):
+    coll = db[collection_name("weather", "documents")]
+    g = _weather("NYC", "2018-11-05 00:00", 24)
+    write_hourly(coll, g, "location", ["temp", "humidity"])
+    write_hourly(coll, g, "location", ["temp", "humidity"])
+    write_hourly(coll, _weather("NYC", "2018-11-05 00:00", 24, temp=3.0), "location", ["temp", "humidity"])
+
+    (entry,) = catalog_entries(db, coll.name)
+    assert entry["count"] == 24
+    assert entry["from"] == pd.Timestamp("2018-11-05 00:00").to_pydatetime()
+    assert entry["to"] == pd.Timestamp("2018-11-05 23:00").to_pydatetime()
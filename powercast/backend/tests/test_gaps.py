@@ -0,0 +1,115 @@
+# test_gaps.py
+# Čiste funkcije indeksa run-ova (storage.gaps): spajanje run-ova, broj nedostajućih sati,
+# validni start-ovi prognoze i maska trening uzoraka — granice (uključivo / isključivo) i prozori preko rupa.
+
+import numpy as np
+import pandas as pd
+
+from storage.gaps import forecast_starts, hour_runs, merge_runs, missing_hours, sample_mask
+
+T0 = pd.Timestamp("2018-01-01 00:00")
+
+
+def _t(h):
+    return np.datetime64(T0 + pd.Timedelta(hours=h), "ns")
+
+
+def _runs(*pairs):
+    """(from_h, to_h) parovi (sati od T0, uključivo) → run-ovi."""
+    return (np.array([_t(a) for a, _ in pairs], dtype="datetime64[ns]"),
+            np.array([_t(b) for _, b in pairs], dtype="datetime64[ns]"))
+
+
+def _hours(runs):
+    """Run-ovi → lista (from_h, to_h) radi čitljivih asserta."""
+    return [(int((s - _t(0)) // np.timedelta64(1, "h")), int((e - _t(0)) // np.timedelta64(1, "h")))
+            for s, e in zip(*runs)]
+
+
+def _ts(*hours):
+    return pd.Series([T0 + pd.Timedelta(hours=h) for h in hours])
+
+
+def test_hour_runs_unsorted_with_duplicates():
+    assert _hours(hour_runs(_ts(5, 1, 2, 2, 3, 7, 8))) == [(1, 3), (5, 5), (7, 8)]
+    assert _hours(hour_runs(_ts())) == []
+
+
+def test_merge_touching_runs():
+    # 0..4 i 5..9 se dodiruju (nema sata između) → jedan run
+    assert _hours(merge_runs(_runs((0, 4)), _runs((5, 9)))) == [(0, 9)]
+
+
+def test_merge_keeps_one_hour_gap():
+    assert _hours(merge_runs(_runs((0, 4)), _runs((6, 9)))) == [(0, 4), (6, 9)]
+
+
+def test_merge_overlapping_and_contained_runs():
+    a = _runs((0, 10), (20, 25))
+    b = _runs((3, 5), (8, 21), (30, 30))
+    assert _hours(merge_runs(a, b)) == [(0, 25), (30, 30)]
+    # redoslijed argumenata ne utiče na rezultat
+    assert _hours(merge_runs(b, a)) == [(0, 25), (30, 30)]
+
+
+def test_merge_long_run_swallows_later_starts():
+    # kraj prvog run-a pokriva sljedeće početke — reach se računa kumulativno, ne samo od prethodnog
+    assert _hours(merge_runs(_runs((0, 50), (10, 12)), _runs((20, 22), (51, 60)))) == [(0, 60)]
+
+
+def test_merge_empty():
+    empty = _runs()
+    assert _hours(merge_runs(empty, empty)) == []
+    assert _hours(merge_runs(empty, _runs((1, 2)))) == [(1, 2)]
+
+
+def test_missing_hours_half_open_bounds():
+    runs = _runs((0, 9), (15, 19))
+    # [0, 10) potpuno pokriven; ts_to je isključiv
+    assert missing_hours(runs, T0, T0 + pd.Timedelta(hours=10)) == 0
+    # [0, 11) → sat 10 fali
+    assert missing_hours(runs, T0, T0 + pd.Timedelta(hours=11)) == 1
+    # [5, 20) preko rupe 10..14
+    assert missing_hours(runs, T0 + pd.Timedelta(hours=5), T0 + pd.Timedelta(hours=20)) == 5
+    # opseg prije / poslije svih podataka
+    assert missing_hours(runs, T0 - pd.Timedelta(hours=3), T0) == 3
+    assert missing_hours(runs, T0 + pd.Timedelta(hours=20), T0 + pd.Timedelta(hours=24)) == 4
+
+
+def test_forecast_starts_bounds():
+    runs = _runs((0, 9), (15, 40))
+    lo, hi = forecast_starts(runs, input_window=10)
+    # run 0..9 ima tačno 10 sati → jedini start je sat 10 (prozor 0..9); run 15..40 → starts 25..41
+    assert _hours((lo, hi)) == [(10, 10), (25, 41)]
+
+
+def test_forecast_starts_skips_short_runs():
+    lo, hi = forecast_starts(_runs((0, 8), (20, 20)), input_window=10)
+    assert lo.size == 0 and hi.size == 0
+
+
+def test_sample_mask_window_crossing_gap():
+    # niz sa rupom 10..14 (redovi izbačeni): prozor T + H = 4
+    ts = _ts(*range(0, 10), *range(15, 20))
+    mask = sample_mask(ts, None, input_window=3, horizon=1)
+    assert mask.shape[0] == len(ts) - 4 + 1
+    # uzorci koji počinju na 0..6 leže u 0..9; 7, 8, 9 prelaze rupu; 15, 16 leže u 15..19
+    assert mask.tolist() == [True] * 7 + [False] * 3 + [True] * 2
+
+
+def test_sample_mask_with_runs_index():
+    # ts je kontinuiran (npr. dopunjen reindex-om), ali indeks kaže da sati 10..14 ne postoje u bazi
+    ts = _ts(*range(0, 20))
+    runs = _runs((0, 9), (15, 19))
+    mask = sample_mask(ts, runs, input_window=3, horizon=1)
+    starts_ok = [k for k, ok in enumerate(mask) if ok]
+    assert starts_ok == [0, 1, 2, 3, 4, 5, 6, 15, 16]
+
+
+def test_sample_mask_edge_cases():
+    ts = _ts(*range(0, 5))
+    assert sample_mask(ts, None, input_window=4, horizon=2).shape == (0,)
+    # tačno jedan uzorak koji pokriva cijeli run (oba kraja uključiva)
+    assert sample_mask(ts, _runs((0, 4)), input_window=4, horizon=1).tolist() == [True]
+    # prazan indeks → nijedan uzorak
+    assert not sample_mask(ts, _runs(), input_window=2, horizon=1).any()
@@ -0,0 +1,75 @@
+# test_rawbson.py
+# storage.rawbson (strided dekodiranje fiksnog rasporeda) naspram referentnog bson.decode_all.
+
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+import pytest
+
+from storage.rawbson import _decode_uniform, decode_raw_batches
+
+T0 = datetime(2018, 11, 4, 4)
+
+
+def _batch(docs):
+    return b"".join(bson.encode(d) for d in docs)
+
+
+def _reference(batches, fields):
+    """Spori put: decode_all po dokumentu, nedostajuće / ne-brojčane vrijednosti → NaN."""
+    docs = [d for b in batches for d in bson.decode_all(b)]
+    ts = np.array([np.datetime64(d["ts"], "ms") for d in docs], dtype="datetime64[ns]")
+    num = lambda v: float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+    return ts, {c: np.array([num(d.get(c)) for d in docs], dtype=np.float64) for c in fields}
+
+
+def _assert_same(got, ref):
+    assert np.array_equal(got[0], ref[0])
+    assert got[1].keys() == ref[1].keys()
+    for c in ref[1]:
+        np.testing.assert_array_equal(got[1][c], ref[1][c], err_msg=c)
+
+
+def _hours(n, start=T0):
+    return [start + timedelta(hours=i) for i in range(n)]
+
+
+CASES = {
+    "uniform_float": [_batch({"ts": t, "load_mw": 1000.5 + i} for i, t in enumerate(_hours(50)))],
+    "uniform_int32_int64": [_batch({"ts": t, "a": i - 7, "b": bson.Int64(2 ** 40 + i)}
+                                   for i, t in enumerate(_hours(20)))],
+    "pre_1970": [_batch({"ts": t, "load_mw": 1.0} for t in _hours(5, datetime(1969, 12, 31, 22)))],
+    "missing_field_some_docs": [_batch({"ts": t, "temp": 1.5, **({"humidity": 40.0} if i % 2 else {})}
+                                       for i, t in enumerate(_hours(10)))],
+    "null_and_string_values": [_batch([{"ts": T0, "temp": None}, {"ts": T0 + timedelta(hours=1), "temp": "x"},
+                                       {"ts": T0 + timedelta(hours=2), "temp": 3.0}])],
+    "field_order_differs": [_batch([{"ts": T0, "a": 1.0, "b": 2.0}, {"ts": T0 + timedelta(hours=1), "b": 3.0, "a": 4.0}])],
+    "several_batches": [_batch({"ts": t, "load_mw": float(i)} for i, t in enumerate(_hours(7))),
+                        b"",
+                        _batch([{"ts": T0 + timedelta(days=1), "load_mw": 5}])],
+}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_matches_decode_all(name):
+    fields = ["load_mw", "temp", "humidity", "a", "b"]
+    _assert_same(decode_raw_batches(CASES[name], fields), _reference(CASES[name], fields))
+
+
+def test_uniform_batch_takes_strided_path():
+    buf = CASES["uniform_float"][0]
+    res = _decode_uniform(buf, ["load_mw", "absent"], "ts")
+    assert res is not None
+    assert np.isnan(res[1]["absent"]).all()
+    _assert_same(res, _reference([buf], ["load_mw", "absent"]))
+
+
+def test_irregular_batches_fall_back():
+    for name in ("missing_field_some_docs", "null_and_string_values", "field_order_differs"):
+        assert _decode_uniform(CASES[name][0], ["a", "temp"], "ts") is None, name
+
+
+def test_empty():
+    ts, cols = decode_raw_batches([], ["load_mw"])
+    assert ts.dtype == np.dtype("datetime64[ns]") and ts.size == 0 and cols["load_mw"].size == 0
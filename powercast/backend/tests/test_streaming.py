@@ -0,0 +1,77 @@
+# test_streaming.py
+# Streaming LOAD import (ingest.streaming) sa redovima van redoslijeda: redovi za sat koji je već upisan
+# u ranijem flush-u moraju završiti u prosjeku tog sata (isti rezultat kao sortiran ulaz).
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from ingest.streaming import stream_load_csv
+from ingest.writer import StageTimer
+from storage.series import collection_name
+
+
+@pytest.fixture
+def coll():
+    return mongomock.MongoClient()["powercast_test"][collection_name("load", "documents")]
+
+
+def _frame(days=3):
+    """5-min NYISO redovi (EST, bez DST) za dva regiona; Load raste sa svakim redom."""
+    local = pd.date_range("2018-01-01 00:00", periods=days * 288, freq="5min")
+    rows = []
+    for name in ("CAPITL", "CENTRL"):
+        rows.append(pd.DataFrame({"local": local, "Name": name}))
+    df = pd.concat(rows, ignore_index=True).sort_values(["local", "Name"], kind="stable").reset_index(drop=True)
+    df["Load"] = np.arange(len(df), dtype=float) + 1000.0
+    return df
+
+
+def _csv(df):
+    out = pd.DataFrame({"Time Stamp": df["local"].dt.strftime("%m/%d/%Y %H:%M:%S"), "Time Zone": "EST",
+                        "Name": df["Name"], "PTID": 1, "Load": df["Load"]})
+    return io.BytesIO(out.to_csv(index=False).encode())
+
+
+def _expected(df):
+    ts = df["local"] + pd.Timedelta(hours=5)  # EST → UTC
+    g = df.assign(ts=ts.dt.floor("h")).groupby(["Name", "ts"])["Load"].mean()
+    return {(r, t.to_pydatetime()): v for (r, t), v in g.items()}
+
+
+def _stored(coll):
+    return {(d["region"], d["ts"]): d["load_mw"] for d in coll.find({}, {"_id": 0})}
+
+
+def test_sorted_input_has_no_late_rows(coll):
+    df = _frame()
+    summary = stream_load_csv(_csv(df), coll, StageTimer(), chunk_rows=100)
+    assert summary["late_rows"] == 0 and summary["late_hours"] == 0
+    assert _stored(coll) == pytest.approx(_expected(df))
+
+
+def test_out_of_order_chunks_reaggregate_late_hours(coll):
+    df = _frame()
+    day1 = df["local"] < pd.Timestamp("2018-01-02")
+    # pola sata CAPITL-a (ostatak tog sata je već upisan) i cijeli sat CENTRL-a (sat još ne postoji)
+    partial = day1 & (df["Name"] == "CAPITL") & (df["local"] >= pd.Timestamp("2018-01-01 10:00")) \
+        & (df["local"] < pd.Timestamp("2018-01-01 10:30"))
+    whole = day1 & (df["Name"] == "CENTRL") & (df["local"].dt.hour == 12)
+    moved = partial | whole
+    # zakašnjeli redovi dolaze poslije drugog dana, kad je prvi dan već upisan
+    day2_end = df.index[df["local"] < pd.Timestamp("2018-01-03")].max()
+    order = list(df.index[~moved & (df.index <= day2_end)]) + list(df.index[moved]) \
+        + list(df.index[~moved & (df.index > day2_end)])
+    shuffled = df.loc[order].reset_index(drop=True)
+
+    summary = stream_load_csv(_csv(shuffled), coll, StageTimer(), chunk_rows=100)
+
+    assert summary["late_rows"] == int(moved.sum())
+    assert summary["late_hours"] == 1  # samo CAPITL 10:00 je već bio upisan
+    assert _stored(coll) == pytest.approx(_expected(df))
+    assert summary["inserted"] == len(_expected(df))
+    assert summary["updated"] == 1
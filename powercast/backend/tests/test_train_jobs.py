@@ -0,0 +1,169 @@
+# test_train_jobs.py
+# ml.train_jobs na mongomock-u sa stub treningom: limit reda po (created_at, _id), otkazivanje job-a
+# u redu naspram job-a u radu i ETA iz JobProgress / _job_eta.
+
+import threading
+import time
+import types
+from datetime import timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("torch")
+
+from config import Config
+from ml import train_jobs
+from ml.train import TrainingCancelled
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(Config, "TRAIN_JOB_WORKERS", 1)
+    monkeypatch.setattr(train_jobs, "_executor", None)
+    monkeypatch.setattr(train_jobs, "_cancelled", set())
+    return mongomock.MongoClient()["powercast_test"]
+
+
+class StubTraining:
+    """train_lstm_on_regions zamjena: javi start pa čeka `release`, zatim javlja batch-eve (tu se vidi otkazivanje)."""
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, db, regions, date_from, date_to, hyper, progress=None):
+        self.calls.append(list(regions))
+        for r in regions:
+            progress(r, "start")
+            progress(r, "fit", epochs=1, batches=3)
+        self.release.wait(5)
+        for r in regions:
+            for b in range(1, 4):
+                progress(r, "batch", epoch=1, batch=b)
+            progress(r, "done", ok=True)
+        return [{"region": r} for r in regions]
+
+
+def _persist(db, results, hyper, date_from, date_to):
+    return results
+
+
+def _wait(pred, timeout=5.0):
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _status(db, job_id):
+    return db[train_jobs.TRAIN_JOBS_COLL].find_one({"_id": job_id})["status"]
+
+
+def _submit(db, regions=("N.Y.C.",)):
+    return train_jobs.submit_train_job(db, list(regions), "2018-01-01", "2018-02-01", {}, _persist)
+
+
+def test_queue_limit_counts_only_jobs_ahead(db, monkeypatch):
+    stub = StubTraining()
+    stub.release.set()
+    monkeypatch.setattr(train_jobs, "train_lstm_on_regions", stub)
+    monkeypatch.setattr(Config, "TRAIN_JOB_QUEUE_LIMIT", 2)
+    coll = db[train_jobs.TRAIN_JOBS_COLL]
+    now = train_jobs._now()
+    owner = train_jobs.owner()
+    # aktivni job-ovi tekućeg procesa: jedan stariji i jedan "kasniji" (created_at u budućnosti)
+    coll.insert_many([
+        {"_id": "older", "status": "running", "created_at": now - timedelta(minutes=1), "owner": owner,
+         "heartbeat_at": now},
+        {"_id": "later", "status": "queued", "created_at": now + timedelta(minutes=1), "owner": owner,
+         "heartbeat_at": now},
+    ])
+
+    # ispred novog job-a je samo "older" (1 < 2) → prolazi iako su već 2 aktivna
+    job_id = _submit(db)
+    assert _wait(lambda: _status(db, job_id) == "done")
+
+    # kasnije: ispred su older, later i job sa istim created_at a manjim _id → 3 ≥ 3, pun red;
+    # odbijeni job se ne ostavlja u kolekciji
+    coll.insert_one({"_id": "0" * 32, "status": "queued", "created_at": now + timedelta(minutes=2),
+                     "owner": owner, "heartbeat_at": now})
+    monkeypatch.setattr(train_jobs, "_now", lambda: now + timedelta(minutes=2))
+    monkeypatch.setattr(Config, "TRAIN_JOB_QUEUE_LIMIT", 3)
+    n_before = coll.count_documents({})
+    with pytest.raises(train_jobs.QueueFull):
+        _submit(db)
+    assert coll.count_documents({}) == n_before
+
+
+def test_cancel_queued_vs_running(db, monkeypatch):
+    stub = StubTraining()
+    monkeypatch.setattr(train_jobs, "train_lstm_on_regions", stub)
+
+    running = _submit(db, ["A"])
+    assert _wait(lambda: _status(db, running) == "running")
+    queued = _submit(db, ["B"])
+    assert _status(db, queued) == "queued"
+
+    # job u redu se otkazuje odmah i nikad ne počinje
+    assert train_jobs.cancel_job(db, queued) == "cancelled"
+    assert _status(db, queued) == "cancelled"
+
+    # job u radu dobija cancel_requested; trening staje na sljedećem javljanju napretka
+    assert train_jobs.cancel_job(db, running) == "running"
+    doc = db[train_jobs.TRAIN_JOBS_COLL].find_one({"_id": running})
+    assert doc["status"] == "running" and doc["cancel_requested"] is True
+    stub.release.set()
+    assert _wait(lambda: _status(db, running) == "cancelled")
+    assert _wait(lambda: queued not in train_jobs._cancelled and running not in train_jobs._cancelled)
+
+    time.sleep(0.1)  # executor je pokupio otkazani job iz reda → _run_job ga preskače
+    assert stub.calls == [["A"]]
+    assert _status(db, queued) == "cancelled"
+
+    # završen / nepostojeći job
+    assert train_jobs.cancel_job(db, running) == "cancelled"
+    assert train_jobs.cancel_job(db, "missing") is None
+
+
+def test_job_progress_eta(db, monkeypatch):
+    clock = {"t": 0.0}
+    monkeypatch.setattr(train_jobs, "time", types.SimpleNamespace(perf_counter=lambda: clock["t"]))
+    coll = db[train_jobs.TRAIN_JOBS_COLL]
+    coll.insert_one({"_id": "j1", "status": "running", "cancel_requested": False,
+                     "hyper": {"region_workers": 1},
+                     "progress": [{"region": "A", "status": "pending"}, {"region": "B", "status": "pending"}]})
+    progress = train_jobs.JobProgress("j1", ["A", "B"], db)
+
+    progress("A", "start")
+    clock["t"] = 1.0
+    progress("A", "fit", epochs=2, batches=10)
+    clock["t"] = 11.0
+    progress("A", "batch", epoch=1, batch=5, train_loss=0.5)
+
+    # 1/4 posla za 10 s od početka fit-a → još 30 s
+    doc = coll.find_one({"_id": "j1"})
+    a = doc["progress"][0]
+    assert a["status"] == "running" and a["elapsed_s"] == 11.0 and a["eta_s"] == 30.0
+    assert doc["progress"][1]["status"] == "pending"
+    # job: 30 s za A + B na čekanju (prosjek započetih: 11 + 30 s), jedan worker
+    assert train_jobs.get_job(db, "j1")["eta_s"] == 71.0
+
+    # batch-evi češći od _PROGRESS_EVERY_S se ne upisuju
+    clock["t"] = 11.1
+    progress("A", "batch", epoch=1, batch=6)
+    assert coll.find_one({"_id": "j1"})["progress"][0]["batch"] == 5
+
+    clock["t"] = 21.0
+    progress("A", "done", ok=True)
+    a = coll.find_one({"_id": "j1"})["progress"][0]
+    assert a["status"] == "done" and a["eta_s"] == 0.0
+
+
+def test_job_progress_raises_when_cancelled(db):
+    db[train_jobs.TRAIN_JOBS_COLL].insert_one({"_id": "j2", "status": "running", "cancel_requested": True,
+                                              "progress": [{"region": "A", "status": "pending"}]})
+    progress = train_jobs.JobProgress("j2", ["A"], db)
+    with pytest.raises(TrainingCancelled):
+        progress("A", "start")
@@ -0,0 +1,88 @@
+# test_tz.py
+# Brzi NYISO parseri (ingest.tz) naspram sporih referentnih puteva, na priloženim podacima
+# za mart (prelazak na EDT) i novembar (EST/EDT fall-back sat) 2018.
+
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytz import UTC
+
+from ingest.tz import NY_TZ, parse_nyiso_timestamps, to_utc_from_tz_column, to_utc_series_localized
+
+DATA = Path(__file__).resolve().parents[3] / "Training Data" / "NYS Load  Data"
+
+
+def _month(folder):
+    files = sorted((DATA / folder).glob("*.csv"))
+    if not files:
+        pytest.skip(f"nema priloženih podataka: {DATA / folder}")
+    return pd.concat([pd.read_csv(f, dtype={"Time Stamp": str, "Time Zone": str, "Name": str}) for f in files],
+                     ignore_index=True)
+
+
+@contextmanager
+def _quiet():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # dateutil fallback za pojedinačne vrijednosti
+        yield
+
+
+@pytest.fixture(scope="module", params=["20180301pal_csv", "20181101pal_csv"])
+def month(request):
+    return _month(request.param)
+
+
+def test_parse_nyiso_timestamps_matches_pandas(month):
+    ref = pd.to_datetime(month["Time Stamp"], format="%m/%d/%Y %H:%M:%S")
+    got = parse_nyiso_timestamps(month["Time Stamp"])
+    assert got.index.equals(ref.index)
+    assert (got.to_numpy() == ref.to_numpy()).all()
+
+
+def test_parse_nyiso_timestamps_irregular_values():
+    # vrijednosti van fiksnog formata (ili neispravni datumi u njemu) → isto što i pd.to_datetime(errors="coerce")
+    s = pd.Series(["03/11/2018 02:05:00", "02/30/2018 00:00:00", "13/01/2018 00:00:00",
+                   "2018-03-11 04:00", None, "not a date", "03/11/2018 24:00:00"])
+    with _quiet():
+        got = parse_nyiso_timestamps(s)
+    assert got.iloc[0] == pd.Timestamp("2018-03-11 02:05:00")
+    for v, g in zip(s, got):
+        with _quiet():
+            ref = pd.to_datetime(v, errors="coerce")
+        assert (pd.isna(g) and pd.isna(ref)) or g == ref, v
+
+
+def test_tz_column_matches_dst_inference():
+    # mart: stari put (sort + ambiguous="infer") radi nad cijelim mjesecom → identičan rezultat
+    mar = _month("20180301pal_csv")
+    ref = to_utc_series_localized(mar["Time Stamp"])
+    got = to_utc_from_tz_column(mar["Time Stamp"], mar["Time Zone"])
+    assert got.sort_index().equals(ref.sort_index())
+
+
+def test_tz_column_matches_explicit_localization_fall_back():
+    # novembar: "infer" ne može da razdvoji ponovljeni sat (5-min redovi se isprepliću nakon sortiranja),
+    # pa je referenca tz_localize sa eksplicitnom ambiguous maskom iz oznake zone (EDT = ljetnje vrijeme)
+    nov = _month("20181101pal_csv")
+    local = pd.to_datetime(nov["Time Stamp"], format="%m/%d/%Y %H:%M:%S")
+    ref = local.dt.tz_localize(NY_TZ, ambiguous=(nov["Time Zone"] == "EDT").to_numpy()).dt.tz_convert(UTC)
+    got = to_utc_from_tz_column(nov["Time Stamp"], nov["Time Zone"])
+    assert got.equals(ref)
+    with pytest.raises(Exception):
+        to_utc_series_localized(nov["Time Stamp"])
+
+
+def test_fall_back_hour_is_not_duplicated():
+    nov = _month("20181101pal_csv")
+    day = nov[nov["Time Stamp"].str.startswith("11/04/2018 01:")]
+    utc = to_utc_from_tz_column(day["Time Stamp"], day["Time Zone"])
+    # 01:xx EDT → 05:xx UTC, 01:xx EST → 06:xx UTC: ponovljeni lokalni sat daje dva različita UTC sata
+    hours = sorted(set(utc.dt.hour))
+    assert hours == [5, 6]
+    per_zone = pd.DataFrame({"name": day["Name"].to_numpy(), "ts": utc.to_numpy()})
+    assert not per_zone.duplicated().any()
+    assert np.array_equal(np.sort(utc[day["Time Zone"].to_numpy() == "EST"].dt.hour.unique()), [6])
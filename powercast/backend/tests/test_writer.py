@@ -0,0 +1,125 @@
+# test_writer.py
+# ingest.writer.write_hourly: diff prema postojećim vrijednostima i brojači inserted/updated/unchanged
+# (documents i time-series backend; time-series put ide kroz insert + zamjenu umjesto upsert-a)
+# i post-write hook-ovi (storage.writehooks).
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from ingest.writer import diff_against_existing, write_hourly
+from storage import writehooks
+from storage.series import collection_name
+
+BACKENDS = ["documents", "timeseries"]
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["powercast_test"]
+
+
+def _weather(temp, humidity, hours=3):
+    ts = pd.date_range("2018-11-05 05:00", periods=hours, freq="h")
+    return pd.DataFrame({"location": "NYC", "ts": ts, "temp": temp, "humidity": humidity})
+
+
+def _stored(coll):
+    docs = list(coll.find({}, {"_id": 0}).sort("ts", 1))
+    return pd.DataFrame(docs)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_first_write_inserts_everything(db, backend):
+    coll = db[collection_name("weather", backend)]
+    stats = write_hourly(coll, _weather([1.0, 2.0, 3.0], 50.0), "location", ["temp", "humidity"])
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (3, 0, 0)
+    assert coll.count_documents({}) == 3
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_reimport_same_frame_is_unchanged(db, backend):
+    coll = db[collection_name("weather", backend)]
+    g = _weather([1.0, 2.0, 3.0], 50.0)
+    write_hourly(coll, g, "location", ["temp", "humidity"])
+    before = _stored(coll)
+
+    stats = write_hourly(coll, g, "location", ["temp", "humidity"])
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 0, 3)
+    assert stats["upserts"] == 0
+    pd.testing.assert_frame_equal(_stored(coll), before)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_changed_value_is_updated(db, backend):
+    coll = db[collection_name("weather", backend)]
+    write_hourly(coll, _weather([1.0, 2.0, 3.0], 50.0), "location", ["temp", "humidity"])
+
+    stats = write_hourly(coll, _weather([1.0, 2.5, 3.0], 50.0), "location", ["temp", "humidity"])
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 1, 2)
+    out = _stored(coll)
+    assert out["temp"].tolist() == [1.0, 2.5, 3.0]
+    assert out["humidity"].tolist() == [50.0, 50.0, 50.0]
+    assert coll.count_documents({}) == 3
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_nan_does_not_overwrite_existing_value(db, backend):
+    coll = db[collection_name("weather", backend)]
+    write_hourly(coll, _weather([1.0, 2.0, 3.0], 50.0), "location", ["temp", "humidity"])
+
+    # samo NaN → nije promjena; NaN + promijenjena druga kolona → update, NaN kolona ostaje sačuvana
+    stats = write_hourly(coll, _weather([np.nan, np.nan, 3.0], [50.0, 60.0, 50.0]), "location",
+                         ["temp", "humidity"])
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 1, 2)
+    out = _stored(coll)
+    assert out["temp"].tolist() == [1.0, 2.0, 3.0]
+    assert out["humidity"].tolist() == [50.0, 60.0, 50.0]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_mixed_new_and_existing_hours(db, backend):
+    coll = db[collection_name("weather", backend)]
+    write_hourly(coll, _weather([1.0, 2.0], 50.0, hours=2), "location", ["temp", "humidity"])
+
+    stats = write_hourly(coll, _weather([1.0, 9.0, 3.0, 4.0], 50.0, hours=4), "location", ["temp", "humidity"])
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (2, 1, 1)
+    assert _stored(coll)["temp"].tolist() == [1.0, 9.0, 3.0, 4.0]
+
+
+def test_diff_returns_only_new_and_changed_rows(db):
+    coll = db[collection_name("weather", "documents")]
+    write_hourly(coll, _weather([1.0, 2.0, 3.0], 50.0), "location", ["temp", "humidity"])
+
+    g = _weather([1.0, 7.0, np.nan], 50.0, hours=3)
+    out, counts = diff_against_existing(coll, g, "location", ["temp", "humidity"], mark_new=True)
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 2}
+    assert out["temp"].tolist() == [7.0]
+    assert out["_new"].tolist() == [False]
+
+
+def test_writer_does_not_import_ml():
+    # post-write hook-ovi (feature matrice) se registruju iz ml-a, writer ga ne uvozi
+    backend = Path(__file__).resolve().parents[1]
+    code = "import sys, ingest.writer; sys.exit(int(any(m == 'ml' or m.startswith('ml.') for m in sys.modules)))"
+    assert subprocess.run([sys.executable, "-c", code], cwd=backend).returncode == 0
+
+
+def test_registered_hooks_receive_written_frame(db, monkeypatch):
+    monkeypatch.setattr(writehooks, "_HOOKS", list(writehooks._HOOKS))
+    calls = []
+    writehooks.register_write_hook("gaps", lambda coll, kf, g, inserted: calls.append((coll.name, len(g), inserted)),
+                                   name="tests.recorder")
+    assert writehooks.write_hooks()[-1] == "tests.recorder"
+
+    coll = db[collection_name("weather", "documents")]
+    write_hourly(coll, _weather([1.0, 2.0, 3.0], 50.0), "location", ["temp", "humidity"])
+    write_hourly(coll, _weather([1.0, 5.0, 3.0, 4.0], 50.0, hours=4), "location", ["temp", "humidity"])
+    # drugi upis: diff ostavlja promijenjeni i novi sat, inserted zna samo novi
+    assert calls == [(coll.name, 3, {"NYC": 3}), (coll.name, 2, {"NYC": 1})]